@@ -1,12 +1,38 @@
+import asyncio
 from abc import ABC, abstractmethod
-from contextlib import asynccontextmanager
-from typing import List, Optional
-
-from pydantic import BaseModel, Field, model_validator
-
+from contextlib import asynccontextmanager, nullcontext
+from typing import Deque, List, Optional
+
+from pydantic import BaseModel, Field, PrivateAttr, model_validator
+
+from app.agent.compaction import MemoryCompactor
+from app.agent.loop_detection import LoopDetector, LoopSignals
+from app.budget import Budget, budget_context, current_budget
+from app.cancellation import (
+    CancellationToken,
+    absorb_cancellation,
+    current_cancel_token,
+)
+from app.checkpoint import Checkpointer
 from app.llm import LLM
 from app.logger import logger
+from app.metrics import metrics
 from app.schema import AgentState, Memory, Message, ROLE_TYPE
+from app.stream import (
+    EventSink,
+    EventType,
+    emit_event,
+    event_sink_context,
+    get_event_sink,
+)
+from app.tracing import tracer
+from app.usage import (
+    UsageTotals,
+    current_usage_tags,
+    new_run_id,
+    usage_context,
+    usage_tracker,
+)
 
 
 class BaseAgent(BaseModel, ABC):
@@ -38,8 +64,49 @@ class BaseAgent(BaseModel, ABC):
     # Execution control
     max_steps: int = Field(default=10, description="Maximum steps before termination")
     current_step: int = Field(default=0, description="Current step in execution")
+    run_id: Optional[str] = Field(
+        default=None, description="Identifier of the current or last run"
+    )
+    budget: Optional[Budget] = Field(
+        default=None, description="Time, token and cost limits (defaults to the enclosing flow's)"
+    )
+    stop_reason: Optional[str] = Field(
+        default=None, description="Why the current or last run stopped"
+    )
+    cancel_token: Optional[CancellationToken] = Field(
+        default=None, description="Cancels the run from any thread (defaults to the enclosing flow's)"
+    )
+    step_timeout: Optional[float] = Field(
+        default=None, description="Longest a single step may run, in seconds"
+    )
+    event_sink: Optional[EventSink] = Field(
+        default=None, description="Sink for streamed tokens and progress events"
+    )
+    pooled: bool = Field(
+        default=False, description="Owned by an executor pool, which releases its resources"
+    )
+    step_cost: Optional[float] = Field(
+        default=None, description="Relative cost of a step, for routing (default: cost of its tools)"
+    )
 
     duplicate_threshold: int = 2
+    loop_detector: LoopDetector = Field(
+        default_factory=LoopDetector, description="Fingerprint index of replies"
+    )
+    max_stuck_steps: Optional[int] = Field(
+        default=None, description="Abort the run after this many stuck steps"
+    )
+    stuck_steps: int = Field(default=0, description="Stuck steps in the current run")
+
+    compactor: Optional[MemoryCompactor] = Field(
+        default=None, description="Summarises old history in the background"
+    )
+    checkpointer: Optional[Checkpointer] = Field(
+        default=None, description="Writes a checkpoint after every step"
+    )
+
+    # Next-step prompt as configured, before stuck-state hints were prepended
+    _initial_next_step_prompt: Optional[str] = PrivateAttr(default=None)
 
     class Config:
         arbitrary_types_allowed = True
@@ -52,6 +119,7 @@ class BaseAgent(BaseModel, ABC):
             self.llm = LLM(config_name=self.name.lower())
         if not isinstance(self.memory, Memory):
             self.memory = Memory()
+        self._initial_next_step_prompt = self.next_step_prompt
         return self
 
     @asynccontextmanager
@@ -128,27 +196,191 @@ class BaseAgent(BaseModel, ABC):
         if request:
             self.update_memory("user", request)
 
+        # Join the enclosing run (e.g. a flow) or start a new one
+        self.run_id = current_usage_tags().get("run_id") or new_run_id()
+        self.stuck_steps = 0
+        self.stop_reason = None
+        if self.checkpointer:
+            logger.info(f"💾 Checkpointing run {self.run_id}")
+
         results: List[str] = []
-        async with self.state_context(AgentState.RUNNING):
-            while (
-                self.current_step < self.max_steps and self.state != AgentState.FINISHED
-            ):
-                self.current_step += 1
-                logger.info(f"Executing step {self.current_step}/{self.max_steps}")
-                step_result = await self.step()
+        wound_down = False
+        token = self.cancel_token or current_cancel_token()
+        with usage_context(run_id=self.run_id, agent=self.name), event_sink_context(
+            self.event_sink or get_event_sink()
+        ), tracer.span(
+            "agent.run", agent=self.name, run_id=self.run_id
+        ) as run_span, metrics.step(
+            self.name, self.name
+        ) as step_metrics, budget_context(
+            self.budget or current_budget(), self.run_id
+        ) as budget, token.bind() if token else nullcontext():
+            async with self.state_context(AgentState.RUNNING):
+                try:
+                    while (
+                        self.current_step < self.max_steps
+                        and self.state != AgentState.FINISHED
+                    ):
+                        if token and token.cancelled:
+                            self._stop_for_cancel(token.reason, results)
+                            break
+                        if budget:
+                            reason = budget.exhausted_reason()
+                            if reason:
+                                self._stop_for_budget(reason, results)
+                                break
+                            prompt = None if wound_down else budget.wind_down_prompt()
+                            if prompt:
+                                logger.warning(f"⏳ Budget nearly used up, asking {self.name} to wrap up")
+                                self.update_memory("user", prompt)
+                                wound_down = True
+
+                        self.current_step += 1
+                        step_metrics.agent_steps += 1
+                        logger.info(f"Executing step {self.current_step}/{self.max_steps}")
+                        if self.compactor:
+                            self.compactor.apply(self.memory)
+                        with usage_context(step=self.current_step), tracer.span(
+                            "agent.step", agent=self.name, step=self.current_step
+                        ) as step_span:
+                            await emit_event(EventType.STEP_START)
+                            remaining = budget.remaining_time() if budget else None
+                            limits = [t for t in (self.step_timeout, remaining) if t is not None]
+                            timeout = min(limits) if limits else None
+                            try:
+                                async with asyncio.timeout(timeout):
+                                    step_result = await self.step()
+                            except TimeoutError:
+                                await self.on_step_cancelled()
+                                if timeout == remaining:
+                                    # The deadline, not the step timeout, expired
+                                    self._stop_for_budget(
+                                        budget.exhausted_reason() or "deadline reached", results
+                                    )
+                                    break
+                                logger.warning(
+                                    f"⏱️ Step {self.current_step} timed out after {timeout:g}s"
+                                )
+                                step_span.set(timed_out=True)
+                                step_result = f"Step timed out after {timeout:g}s"
+                            await emit_event(EventType.STEP_END, str(step_result))
+                        if self.compactor:
+                            # A pending summary survives the run and is applied on the next one
+                            self.compactor.maybe_schedule(self.memory)
+
+                        # Check for stuck state
+                        if self.is_stuck():
+                            self.handle_stuck_state()
+
+                        results.append(f"Step {self.current_step}: {step_result}")
+                        if self.checkpointer:
+                            state = self.checkpoint_state()
+                            # Kept so that resuming a finished run can report its outcome
+                            state["result"] = "\n".join(results)
+                            self.checkpointer.save(self.run_id, "agent", state)
+
+                        if self.max_stuck_steps and self.stuck_steps >= self.max_stuck_steps:
+                            logger.warning(
+                                f"Aborting run after {self.stuck_steps} stuck steps: {self.loop_signals}"
+                            )
+                            self.stop_reason = f"stuck in a loop ({self.stuck_steps} steps)"
+                            results.append(f"Terminated: Agent {self.stop_reason}")
+                            break
+
+                        if budget:
+                            reason = budget.exhausted_reason()
+                            if reason:
+                                self._stop_for_budget(reason, results)
+                                break
+                except asyncio.CancelledError:
+                    if not (token and token.cancelled):
+                        raise
+                    # Cancelled through the token: finish cleanly instead of propagating
+                    absorb_cancellation()
+                    await self.on_step_cancelled()
+                    await self.cleanup()
+                    self._stop_for_cancel(token.reason, results)
+
+                if self.current_step >= self.max_steps:
+                    self.current_step = 0
+                    self.state = AgentState.IDLE
+                    self.stop_reason = self.stop_reason or f"reached max steps ({self.max_steps})"
+                    results.append(f"Terminated: Reached max steps ({self.max_steps})")
+                elif self.state == AgentState.FINISHED and not self.stop_reason:
+                    self.stop_reason = "finished"
+            run_span.set(stop_reason=self.stop_reason)
+
+        # Inside a flow, the flow reports the step and its run
+        if current_usage_tags().get("plan_step") is None:
+            metrics.finish_run(self.run_id)
+        if self.checkpointer:
+            await self.checkpointer.flush()
+        return "\n".join(results) if results else "No steps executed"
 
-                # Check for stuck state
-                if self.is_stuck():
-                    self.handle_stuck_state()
+    def _stop_for_budget(self, reason: str, results: List[str]) -> None:
+        self.stop_reason = f"budget exhausted: {reason}"
+        logger.warning(f"🛑 Stopping {self.name}: {self.stop_reason}")
+        results.append(f"Terminated: Budget exhausted ({reason})")
 
-                results.append(f"Step {self.current_step}: {step_result}")
+    def _stop_for_cancel(self, reason: Optional[str], results: List[str]) -> None:
+        self.stop_reason = f"cancelled: {reason}"
+        logger.warning(f"🛑 Stopping {self.name}: {self.stop_reason}")
+        results.append(f"Terminated: Cancelled ({reason})")
 
-            if self.current_step >= self.max_steps:
-                self.current_step = 0
-                self.state = AgentState.IDLE
-                results.append(f"Terminated: Reached max steps ({self.max_steps})")
+    async def on_step_cancelled(self) -> None:
+        """Restore a consistent memory after a step was cancelled part-way."""
 
-        return "\n".join(results) if results else "No steps executed"
+    async def cleanup(self) -> None:
+        """Release processes, browser pages and other resources held by the agent."""
+
+    @property
+    def tool_names(self) -> List[str]:
+        """Names of the tools the agent can call."""
+        return []
+
+    async def warm_up(self) -> None:
+        """Start the agent's tools ahead of its first step."""
+
+    def reset(self) -> None:
+        """Forget the previous run's memory and state, keeping tools and resources."""
+        self.memory.clear()
+        self.state = AgentState.IDLE
+        self.current_step = 0
+        self.stuck_steps = 0
+        self.stop_reason = None
+        self.next_step_prompt = self._initial_next_step_prompt
+        self.loop_detector.reset()
+        if self.compactor:
+            self.compactor.cancel()
+
+    def usage(self) -> UsageTotals:
+        """Return aggregated token and latency usage for the current or last run."""
+        return usage_tracker.totals(self.run_id)
+
+    def checkpoint_state(self) -> dict:
+        """Capture the state needed to resume this agent after its last completed step."""
+        return {
+            "name": self.name,
+            "current_step": self.current_step,
+            "finished": self.state == AgentState.FINISHED,
+            "next_step_prompt": self.next_step_prompt,
+            "stuck_steps": self.stuck_steps,
+            "messages": self.memory.to_dict_list(),
+        }
+
+    def restore_checkpoint(self, state: dict) -> None:
+        """Restore state captured by `checkpoint_state`.
+
+        The agent is left ready to run, unless the checkpointed run had already
+        finished; it is then left FINISHED and must not be run again.
+        """
+        self.memory.clear()
+        self.memory.add_messages([Message(**message) for message in state["messages"]])
+        self.current_step = state.get("current_step", 0)
+        self.next_step_prompt = state.get("next_step_prompt", self.next_step_prompt)
+        self.stuck_steps = state.get("stuck_steps", 0)
+        self.state = AgentState.FINISHED if state.get("finished") else AgentState.IDLE
+        self.loop_detector.reset()
 
     @abstractmethod
     async def step(self) -> str:
@@ -158,36 +390,43 @@ class BaseAgent(BaseModel, ABC):
         """
 
     def handle_stuck_state(self):
-        """Handle stuck state by adding a prompt to change strategy"""
+        """Handle stuck state by adding a prompt to change strategy, once per run"""
         stuck_prompt = "\
         Observed duplicate responses. Consider new strategies and avoid repeating ineffective paths already attempted."
-        self.next_step_prompt = f"{stuck_prompt}\n{self.next_step_prompt}"
+        if (self.next_step_prompt or "").startswith(stuck_prompt):
+            logger.warning("Agent detected stuck state again.")
+            return
+        self.next_step_prompt = "\n".join(filter(None, [stuck_prompt, self.next_step_prompt]))
         logger.warning(f"Agent detected stuck state. Added prompt: {stuck_prompt}")
 
     def is_stuck(self) -> bool:
-        """Check if the agent is stuck in a loop by detecting duplicate content"""
-        if len(self.memory.messages) < 2:
-            return False
+        """Check if the agent is stuck in a loop by detecting repeated replies.
 
-        last_message = self.memory.messages[-1]
-        if not last_message.content:
-            return False
-
-        # Count identical content occurrences
-        duplicate_count = sum(
-            1
-            for msg in reversed(self.memory.messages[:-1])
-            if msg.role == "assistant" and msg.content == last_message.content
-        )
+        New assistant messages are indexed incrementally, so the check is O(1)
+        in the length of the history. Exact repeats, repeated tool calls (with
+        argument order normalised) and near-identical replies all count.
+        """
+        self.loop_detector.observe_new(self.memory.messages)
+        stuck = self.loop_detector.is_looping(self.duplicate_threshold)
+        if stuck:
+            self.stuck_steps += 1
+        return stuck
 
-        return duplicate_count >= self.duplicate_threshold
+    @property
+    def loop_signals(self) -> LoopSignals:
+        """Loop-detection signals for the latest assistant reply."""
+        return self.loop_detector.signals
 
     @property
-    def messages(self) -> List[Message]:
-        """Retrieve a list of messages from the agent's memory."""
+    def messages(self) -> Deque[Message]:
+        """Retrieve the messages from the agent's memory."""
         return self.memory.messages
 
     @messages.setter
     def messages(self, value: List[Message]):
-        """Set the list of messages in the agent's memory."""
-        self.memory.messages = value
+        """Replace the messages in the agent's memory."""
+        if value is self.memory.messages:
+            return
+        value = list(value)
+        self.memory.clear()
+        self.memory.add_messages(value)
@@ -0,0 +1,166 @@
+"""Background summarisation of the oldest part of an agent's memory."""
+import asyncio
+from typing import List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from app.config import CompactionSettings, config
+from app.llm import LLM
+from app.logger import logger
+from app.prompt.compaction import SUMMARY_MESSAGE_PREFIX, SUMMARY_SYSTEM_PROMPT
+from app.schema import Memory, Message, Role
+from app.usage import usage_context
+
+
+class CompactionStats(BaseModel):
+    """Counters describing what a compactor has done so far"""
+
+    scheduled: int = 0
+    applied: int = 0
+    discarded: int = 0  # summaries whose span was evicted before they finished
+    failed: int = 0
+    messages_compacted: int = 0
+    chars_before: int = 0
+    chars_after: int = 0
+
+
+class MemoryCompactor:
+    """
+    Summarises the oldest span of a memory while the agent keeps stepping.
+
+    Once memory holds more than `trigger_messages` messages, everything except
+    the `keep_recent` newest messages is sent to a cheap model in a background
+    task. The agent calls `apply` between steps; a finished summary then
+    replaces the span in one synchronous swap, so a step never sees a
+    half-compacted history. Spans never end between an assistant tool call and
+    its tool responses.
+    """
+
+    def __init__(
+        self,
+        llm: Optional[LLM] = None,
+        config_name: str = "summary",
+        trigger_messages: int = 40,
+        keep_recent: int = 12,
+        max_chars_per_message: int = 2000,
+    ):
+        # Falls back to the default model when no [llm.summary] section exists
+        self.llm = llm or LLM(config_name=config_name)
+        self.trigger_messages = trigger_messages
+        self.keep_recent = keep_recent
+        self.max_chars_per_message = max_chars_per_message
+        self.stats = CompactionStats()
+        self._task: Optional[asyncio.Task] = None
+        self._span: Optional[Tuple[int, int, int]] = None  # last id, count, chars
+
+    @classmethod
+    def from_config(cls, settings: Optional[CompactionSettings] = None) -> Optional["MemoryCompactor"]:
+        """The compactor selected by ``[compaction] enabled``, or None when it is off."""
+        settings = settings or config.compaction_config or CompactionSettings()
+        return cls.configured(settings) if settings.enabled else None
+
+    @classmethod
+    def configured(cls, settings: Optional[CompactionSettings] = None) -> "MemoryCompactor":
+        """A compactor with the configured model and limits, whether compaction is on or not."""
+        settings = settings or config.compaction_config or CompactionSettings()
+        return cls(
+            config_name=settings.model,
+            trigger_messages=settings.trigger_messages,
+            keep_recent=settings.keep_recent,
+            max_chars_per_message=settings.max_chars_per_message,
+        )
+
+    @property
+    def pending(self) -> bool:
+        """Whether a summary is being generated."""
+        return self._task is not None
+
+    def maybe_schedule(self, memory: Memory) -> bool:
+        """Start summarising the oldest span if memory has grown past the trigger."""
+        if self._task is not None or len(memory.messages) <= self.trigger_messages:
+            return False
+
+        span = self._select_span(memory)
+        if not span:
+            return False
+
+        ids = memory.ids()
+        self._span = (ids[len(span) - 1], len(span), sum(len(m.content or "") for m in span))
+        self._task = asyncio.create_task(self._summarize(span))
+        self.stats.scheduled += 1
+        logger.debug(f"Compacting {len(span)} oldest messages in the background")
+        return True
+
+    def apply(self, memory: Memory) -> bool:
+        """Swap a finished summary into memory. Never waits for the model."""
+        task = self._task
+        if task is None or not task.done():
+            return False
+        self._task = None
+        last_id, count, chars = self._span
+        self._span = None
+
+        if task.cancelled() or task.exception() is not None:
+            self.stats.failed += 1
+            if not task.cancelled():
+                logger.warning(f"Memory compaction failed: {task.exception()}")
+            return False
+
+        summary = Message.user_message(SUMMARY_MESSAGE_PREFIX + task.result())
+        if not memory.replace_oldest(last_id, summary):
+            self.stats.discarded += 1
+            return False
+
+        self.stats.applied += 1
+        self.stats.messages_compacted += count
+        self.stats.chars_before += chars
+        self.stats.chars_after += len(summary.content)
+        logger.info(f"🗜️ Compacted {count} messages into a {len(summary.content)}-char summary")
+        return True
+
+    async def flush(self, memory: Memory) -> bool:
+        """Wait for a pending summary and apply it."""
+        if self._task is not None:
+            await asyncio.wait([self._task])
+        return self.apply(memory)
+
+    def cancel(self) -> None:
+        """Abandon a pending summary."""
+        if self._task is not None:
+            self._task.cancel()
+        self._task = None
+        self._span = None
+
+    def _select_span(self, memory: Memory) -> List[Message]:
+        messages = memory.view()
+        end = len(messages) - self.keep_recent
+        # Extend the span over tool responses that belong to its last tool call
+        while 0 < end < len(messages) and messages[end].role == Role.TOOL:
+            end += 1
+        if end >= len(messages) or end < 2:
+            return []
+        return messages[:end]
+
+    def _render(self, messages: List[Message]) -> str:
+        limit = self.max_chars_per_message
+        lines = []
+        for message in messages:
+            content = message.content or ""
+            if len(content) > limit:
+                content = content[:limit] + " ...[truncated]"
+            if message.tool_calls:
+                calls = ", ".join(
+                    f"{call.function.name}({call.function.arguments})"
+                    for call in message.tool_calls
+                )
+                content = f"{content}\n[tool calls: {calls}]".strip()
+            lines.append(f"{message.role}: {content}")
+        return "\n\n".join(lines)
+
+    async def _summarize(self, messages: List[Message]) -> str:
+        with usage_context(call_role="compaction"):
+            return await self.llm.ask(
+                [Message.user_message(self._render(messages))],
+                system_msgs=[Message.system_message(SUMMARY_SYSTEM_PROMPT)],
+                stream=False,
+            )
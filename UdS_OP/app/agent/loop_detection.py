@@ -0,0 +1,183 @@
+"""Incremental loop detection over an agent's assistant messages."""
+import json
+import random
+import re
+import zlib
+from collections import Counter, deque
+from typing import Deque, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from app.schema import Message
+
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+class LoopSignals(BaseModel):
+    """Loop-detection signals for the most recently observed assistant message"""
+
+    exact_repeats: int = 0  # recent replies with identical normalised content
+    tool_call_repeats: int = 0  # recent replies with the same tool-call signature
+    near_duplicates: int = 0  # recent replies above the similarity threshold
+    max_similarity: float = 0.0  # highest estimated similarity to a recent reply
+
+
+class LoopDetector:
+    """
+    Fingerprint index of assistant replies.
+
+    Exact content and normalised tool-call signatures of the last `window`
+    replies are counted in hash tables, so repeat checks are O(1) and a reply
+    repeated long ago does not count against a later one. Near-duplicates are
+    found by comparing a MinHash sketch of word shingles against the sketches
+    of those replies, which keeps the similarity check at O(window * num_perm).
+    """
+
+    def __init__(
+        self,
+        window: int = 20,
+        num_perm: int = 32,
+        shingle_size: int = 3,
+        max_shingles: int = 1000,
+        similarity_threshold: float = 0.85,
+        seed: int = 1,
+    ):
+        self.window = window
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.max_shingles = max_shingles
+        self.similarity_threshold = similarity_threshold
+
+        rng = random.Random(seed)
+        self._perms: List[Tuple[int, int]] = [
+            (rng.randint(1, _MERSENNE_PRIME - 1), rng.randint(0, _MERSENNE_PRIME - 1))
+            for _ in range(num_perm)
+        ]
+        self._content_counts: Counter = Counter()
+        self._tool_call_counts: Counter = Counter()
+        # Content and tool-call keys of the replies in the window, oldest first
+        self._recent_keys: Deque[Tuple[Optional[int], Optional[int]]] = deque()
+        self._sketches: Deque[Tuple[int, ...]] = deque(maxlen=window)
+        self._last_observed: Optional[Message] = None
+        self.signals = LoopSignals()
+
+    def reset(self) -> None:
+        """Forget everything observed so far."""
+        self._content_counts.clear()
+        self._tool_call_counts.clear()
+        self._recent_keys.clear()
+        self._sketches.clear()
+        self._last_observed = None
+        self.signals = LoopSignals()
+
+    def observe_new(self, messages: List[Message]) -> LoopSignals:
+        """Observe assistant messages appended since the previous call.
+
+        Walks backwards from the end of `messages` until it reaches the last
+        message already seen, so each message is processed once.
+        """
+        self.signals = LoopSignals()
+        new: List[Message] = []
+        for message in reversed(messages):
+            if message is self._last_observed:
+                break
+            new.append(message)
+        if messages:
+            self._last_observed = messages[-1]
+
+        for message in reversed(new):
+            if message.role == "assistant":
+                self.observe(message)
+        return self.signals
+
+    def observe(self, message: Message) -> LoopSignals:
+        """Index an assistant message and compute its loop signals."""
+        signals = LoopSignals()
+
+        content = self._normalize(message.content or "")
+        content_key = zlib.crc32(content.encode()) if content else None
+        if content_key is not None:
+            signals.exact_repeats = self._content_counts[content_key]
+            self._content_counts[content_key] += 1
+
+        signature = self._tool_call_signature(message)
+        signature_key = zlib.crc32(signature.encode()) if signature else None
+        if signature_key is not None:
+            signals.tool_call_repeats = self._tool_call_counts[signature_key]
+            self._tool_call_counts[signature_key] += 1
+        self._remember(content_key, signature_key)
+
+        text = " ".join(filter(None, [content, signature]))
+        if text:
+            sketch = self._sketch(text)
+            for previous in self._sketches:
+                similarity = self._similarity(sketch, previous)
+                signals.max_similarity = max(signals.max_similarity, similarity)
+                if similarity >= self.similarity_threshold:
+                    signals.near_duplicates += 1
+            self._sketches.append(sketch)
+
+        self.signals = signals
+        return signals
+
+    def _remember(self, content_key: Optional[int], signature_key: Optional[int]) -> None:
+        """Add a reply's keys to the window, dropping the counts of the oldest reply."""
+        self._recent_keys.append((content_key, signature_key))
+        if len(self._recent_keys) <= self.window:
+            return
+        old_content, old_signature = self._recent_keys.popleft()
+        expired = ((self._content_counts, old_content), (self._tool_call_counts, old_signature))
+        for counts, key in expired:
+            if key is not None:
+                counts[key] -= 1
+                if not counts[key]:
+                    del counts[key]
+
+    def is_looping(self, threshold: int) -> bool:
+        """Check whether the latest reply repeats earlier ones `threshold` times."""
+        signals = self.signals
+        return (
+            signals.exact_repeats >= threshold
+            or signals.tool_call_repeats >= threshold
+            or signals.near_duplicates >= threshold
+        )
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return re.sub(r"\s+", " ", text).strip().lower()
+
+    @staticmethod
+    def _tool_call_signature(message: Message) -> str:
+        """Build an order-independent signature of the message's tool calls."""
+        if not message.tool_calls:
+            return ""
+        calls = []
+        for call in message.tool_calls:
+            try:
+                args = json.dumps(json.loads(call.function.arguments or "{}"), sort_keys=True)
+            except (TypeError, ValueError):
+                args = (call.function.arguments or "").strip()
+            calls.append(f"{call.function.name}({args})")
+        return ";".join(sorted(calls))
+
+    def _sketch(self, text: str) -> Tuple[int, ...]:
+        words = text.split()
+        size = self.shingle_size
+        if len(words) <= size:
+            shingles = {" ".join(words)}
+        else:
+            shingles = {
+                " ".join(words[i : i + size])
+                for i in range(min(len(words) - size + 1, self.max_shingles))
+            }
+        hashes = [zlib.crc32(shingle.encode()) for shingle in shingles]
+        return tuple(
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self._perms
+        )
+
+    @staticmethod
+    def _similarity(left: Tuple[int, ...], right: Tuple[int, ...]) -> float:
+        return sum(1 for x, y in zip(left, right) if x == y) / len(left)
@@ -1,13 +1,20 @@
-import time
+import copy
+import json
+import uuid
 from typing import Dict, List, Optional
 
-from pydantic import Field, model_validator
+from pydantic import Field, PrivateAttr, model_validator
 
 from app.agent.toolcall import ToolCallAgent
+from app.config import PlanningSettings, config
+from app.exceptions import ToolError
 from app.logger import logger
+from app.plan_library import PlanLibrary, PlanMatch, plan_library
 from app.prompt.planning import NEXT_STEP_PROMPT, PLANNING_SYSTEM_PROMPT
-from app.schema import Message, TOOL_CHOICE_TYPE, ToolCall, ToolChoice
+from app.schema import Function, Message, TOOL_CHOICE_TYPE, ToolCall, ToolChoice
 from app.tool import PlanningTool, Terminate, ToolCollection
+from app.tool.planning import PlanContext
+from app.usage import current_usage_tags, new_run_id, usage_context
 
 
 class PlanningAgent(ToolCallAgent):
@@ -39,24 +46,48 @@ class PlanningAgent(ToolCallAgent):
 
     max_steps: int = 20
 
+    # Reuse plans of earlier successful runs for similar requests
+    plan_library: Optional[PlanLibrary] = Field(
+        default_factory=lambda: plan_library if plan_library.enabled else None
+    )
+    _plan_match: Optional[PlanMatch] = PrivateAttr(default=None)
+
+    # Add the whole plan to memory once, then only status changes each step
+    compact_plan_context: bool = Field(
+        default_factory=lambda: (config.planning_config or PlanningSettings()).compact_context
+    )
+    _plan_context: Optional[PlanContext] = PrivateAttr(default=None)
+
     @model_validator(mode="after")
     def initialize_plan_and_verify_tools(self) -> "PlanningAgent":
         """Initialize the agent with a default plan ID and validate required tools."""
-        self.active_plan_id = f"plan_{int(time.time())}"
+        self.active_plan_id = f"plan_{uuid.uuid4().hex}"
 
         if "planning" not in self.available_tools.tool_map:
             self.available_tools.add_tool(PlanningTool())
 
         return self
 
+    async def volatile_messages(self) -> List[Message]:
+        """Send the plan status after the history so the prefix stays cacheable."""
+        if not self.active_plan_id:
+            return await super().volatile_messages()
+        return [
+            Message.user_message(
+                f"CURRENT PLAN STATUS:\n{await self.get_plan()}\n\n{self.next_step_prompt}"
+            )
+        ]
+
     async def think(self) -> bool:
         """Decide the next action based on plan status."""
-        prompt = (
-            f"CURRENT PLAN STATUS:\n{await self.get_plan()}\n\n{self.next_step_prompt}"
-            if self.active_plan_id
-            else self.next_step_prompt
-        )
-        self.messages.append(Message.user_message(prompt))
+        if not self.stable_prefix:
+            if not self.active_plan_id:
+                prompt = self.next_step_prompt
+            elif self.compact_plan_context:
+                prompt = f"PLAN STATUS:\n{self._get_plan_context()}\n\n{self.next_step_prompt}"
+            else:
+                prompt = f"CURRENT PLAN STATUS:\n{await self.get_plan()}\n\n{self.next_step_prompt}"
+            self.memory.add_message(Message.user_message(prompt))
 
         # Get the current step index before thinking
         self.current_step_index = await self._get_current_step_index()
@@ -115,9 +146,67 @@ class PlanningAgent(ToolCallAgent):
 
     async def run(self, request: Optional[str] = None) -> str:
         """Run the agent with an optional initial request."""
-        if request:
-            await self.create_initial_plan(request)
-        return await super().run()
+        # Start the run before planning so the planning call is accounted to it
+        run_id = current_usage_tags().get("run_id") or new_run_id()
+        with usage_context(run_id=run_id):
+            if request:
+                await self.create_initial_plan(request)
+            result = await super().run()
+        if request and self.plan_library:
+            self._record_plan_outcome(request)
+        return result
+
+    def _record_plan_outcome(self, request: str) -> None:
+        """Store a fully completed plan, or count a failed reuse against its source."""
+        if (self.stop_reason or "").startswith(("budget exhausted", "cancelled")):
+            return
+        try:
+            plan = self.planning_tool.get_plan_data(self.active_plan_id)
+            if not plan:
+                return
+            if all(status == "completed" for status in plan["step_statuses"]):
+                self.plan_library.record_success(
+                    request, plan["title"], plan["steps"], self._plan_match
+                )
+            elif self._plan_match and (
+                "blocked" in plan["step_statuses"]
+                or not (self.stop_reason or "").startswith("finished")
+            ):
+                self.plan_library.record_failure(self._plan_match)
+        except Exception as e:
+            logger.warning(f"Failed to update the plan library: {e}")
+
+    def checkpoint_state(self) -> dict:
+        state = super().checkpoint_state()
+        state["active_plan_id"] = self.active_plan_id
+        state["current_step_index"] = self.current_step_index
+        state["step_execution_tracker"] = copy.deepcopy(self.step_execution_tracker)
+        return state
+
+    def restore_checkpoint(self, state: dict) -> None:
+        super().restore_checkpoint(state)
+        self.active_plan_id = state.get("active_plan_id", self.active_plan_id)
+        self.current_step_index = state.get("current_step_index")
+        self.step_execution_tracker = state.get("step_execution_tracker", {})
+
+    def _get_plan_context(self) -> str:
+        """The whole plan the first time, then the changes since the previous step."""
+        context = self._plan_context
+        if context is None or context.plan_id != self.active_plan_id:
+            context = self._plan_context = PlanContext(self.planning_tool, self.active_plan_id)
+        elif not context.seen_by(self.memory.messages):
+            context.reset()
+        return context.render()
+
+    def reset(self) -> None:
+        super().reset()
+        self.step_execution_tracker = {}
+        self.current_step_index = None
+        self._plan_context = None
+
+    @property
+    def planning_tool(self) -> PlanningTool:
+        return self.available_tools.get_tool("planning")
 
     async def update_plan_status(self, tool_call_id: str) -> None:
         """
@@ -140,15 +229,7 @@ class PlanningAgent(ToolCallAgent):
 
         try:
             # Mark the step as completed
-            await self.available_tools.execute(
-                name="planning",
-                tool_input={
-                    "command": "mark_step",
-                    "plan_id": self.active_plan_id,
-                    "step_index": step_index,
-                    "step_status": "completed",
-                },
-            )
+            self.planning_tool.set_step_status(self.active_plan_id, step_index, "completed")
             logger.info(
                 f"Marked step {step_index} as completed in plan {self.active_plan_id}"
             )
@@ -157,46 +238,18 @@ class PlanningAgent(ToolCallAgent):
 
     async def _get_current_step_index(self) -> Optional[int]:
         """
-        Parse the current plan to identify the first non-completed step's index.
+        Mark the first non-completed step of the active plan as in progress and return its index.
         Returns None if no active step is found.
         """
-        if not self.active_plan_id:
+        if not self.planning_tool.has_plan(self.active_plan_id):
             return None
 
-        plan = await self.get_plan()
-
         try:
-            plan_lines = plan.splitlines()
-            steps_index = -1
-
-            # Find the index of the "Steps:" line
-            for i, line in enumerate(plan_lines):
-                if line.strip() == "Steps:":
-                    steps_index = i
-                    break
-
-            if steps_index == -1:
-                return None
-
-            # Find the first non-completed step
-            for i, line in enumerate(plan_lines[steps_index + 1 :], start=0):
-                if "[ ]" in line or "[→]" in line:  # not_started or in_progress
-                    # Mark current step as in_progress
-                    await self.available_tools.execute(
-                        name="planning",
-                        tool_input={
-                            "command": "mark_step",
-                            "plan_id": self.active_plan_id,
-                            "step_index": i,
-                            "step_status": "in_progress",
-                        },
-                    )
-                    return i
-
-            return None  # No active step found
+            step = self.planning_tool.start_next_step(self.active_plan_id)
         except Exception as e:
             logger.warning(f"Error finding current step index: {e}")
             return None
+        return step[0] if step else None
 
     async def create_initial_plan(self, request: str) -> None:
         """Create an initial plan based on the request."""
@@ -208,20 +261,38 @@ class PlanningAgent(ToolCallAgent):
             )
         ]
         self.memory.add_messages(messages)
-        response = await self.llm.ask_tool(
-            messages=messages,
-            system_msgs=[Message.system_message(self.system_prompt)],
-            tools=self.available_tools.to_params(),
-            tool_choice=ToolChoice.REQUIRED,
-        )
-        assistant_msg = Message.from_tool_calls(
-            content=response.content, tool_calls=response.tool_calls
-        )
+
+        self._plan_match = self.plan_library.lookup(request) if self.plan_library else None
+        if self._plan_match:
+            # Replay the stored plan as if the model had proposed it
+            args = {
+                "command": "create",
+                "plan_id": self.active_plan_id,
+                "title": self._plan_match.title,
+                "steps": self._plan_match.steps,
+            }
+            content = "Reusing a plan that worked for a similar request."
+            tool_calls = [
+                ToolCall(
+                    id=f"call_plan_{self._plan_match.entry_id}",
+                    function=Function(name="planning", arguments=json.dumps(args)),
+                )
+            ]
+        else:
+            with usage_context(agent=self.name, call_role="plan"):
+                response = await self.llm.ask_tool(
+                    messages=messages,
+                    system_msgs=[Message.system_message(self.system_prompt)],
+                    tools=self.available_tools.to_params(),
+                    tool_choice=ToolChoice.REQUIRED,
+                )
+            content, tool_calls = response.content, response.tool_calls
+        assistant_msg = Message.from_tool_calls(content=content, tool_calls=tool_calls)
 
         self.memory.add_message(assistant_msg)
 
         plan_created = False
-        for tool_call in response.tool_calls:
+        for tool_call in tool_calls:
             if tool_call.function.name == "planning":
                 result = await self.execute_tool(tool_call)
                 logger.info(
@@ -235,7 +306,10 @@ class PlanningAgent(ToolCallAgent):
                     name=tool_call.function.name,
                 )
                 self.memory.add_message(tool_msg)
-                plan_created = True
+                plan_created = self.planning_tool.current_plan_id == self.active_plan_id
+                if not plan_created and self.planning_tool.has_plan(self.active_plan_id):
+                    # Another run's plan holds this ID in a shared store
+                    raise ToolError(f"Plan ID {self.active_plan_id} is already taken")
                 break
 
         if not plan_created:
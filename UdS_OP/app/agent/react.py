@@ -1,3 +1,4 @@
+import asyncio
 from abc import ABC, abstractmethod
 from typing import Optional
 
@@ -5,7 +6,9 @@ from pydantic import Field
 
 from app.agent.base import BaseAgent
 from app.llm import LLM
+from app.logger import logger
 from app.schema import AgentState, Memory
+from app.tracing import tracer
 
 
 class ReActAgent(BaseAgent, ABC):
@@ -22,6 +25,8 @@ class ReActAgent(BaseAgent, ABC):
     max_steps: int = 10
     current_step: int = 0
 
+    think_timeout: Optional[float] = None  # seconds the LLM may take to decide
+
     @abstractmethod
     async def think(self) -> bool:
         """Process current state and decide next action"""
@@ -32,7 +37,17 @@ class ReActAgent(BaseAgent, ABC):
 
     async def step(self) -> str:
         """Execute a single step: think and act."""
-        should_act = await self.think()
+        with tracer.span("agent.think", agent=self.name) as span:
+            try:
+                async with asyncio.timeout(self.think_timeout):
+                    should_act = await self.think()
+            except TimeoutError:
+                # A hung LLM call costs one step rather than every retry's full timeout
+                logger.warning(f"⏱️ {self.name} did not decide within {self.think_timeout:g}s")
+                span.set(timed_out=True)
+                return f"Thinking timed out after {self.think_timeout:g}s"
+            span.set(should_act=should_act)
         if not should_act:
             return "Thinking complete - no action needed"
-        return await self.act()
+        with tracer.span("agent.act", agent=self.name):
+            return await self.act()
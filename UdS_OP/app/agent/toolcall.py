@@ -1,14 +1,19 @@
+import asyncio
 import json
 
 from typing import Any, List, Literal, Optional, Union
 
 from pydantic import Field
 
+from app.agent.compaction import MemoryCompactor
 from app.agent.react import ReActAgent
+from app.artifacts import artifact_store
 from app.logger import logger
 from app.prompt.toolcall import NEXT_STEP_PROMPT, SYSTEM_PROMPT
 from app.schema import AgentState, Message, ToolCall, TOOL_CHOICE_TYPE, ToolChoice
+from app.stream import EventType, emit_event
 from app.tool import CreateChatCompletion, Terminate, ToolCollection
+from app.usage import usage_context
 
 
 TOOL_CALL_REQUIRED = "Tool calls required but none provided"
@@ -33,23 +38,41 @@ class ToolCallAgent(ReActAgent):
 
     max_steps: int = 30
     max_observe: Optional[Union[int, bool]] = None
+    tool_timeout: Optional[float] = None  # seconds a single tool call may run
+
+    # Keep system prompt, tools and history byte-stable for provider prompt caching
+    stable_prefix: bool = False
+
+    # Summarise old history in the background when [compaction] is enabled
+    compactor: Optional[MemoryCompactor] = Field(default_factory=MemoryCompactor.from_config)
+
+    async def volatile_messages(self) -> List[Message]:
+        """Per-step context that is sent after the history instead of stored in it."""
+        if self.next_step_prompt:
+            return [Message.user_message(self.next_step_prompt)]
+        return []
 
     async def think(self) -> bool:
         """Process current state and decide next actions using tools"""
-        if self.next_step_prompt:
-            user_msg = Message.user_message(self.next_step_prompt)
-            self.messages += [user_msg]
+        if self.stable_prefix:
+            # Volatile context goes at the tail so the cached prefix is reused
+            messages = self.memory.to_dict_list() + await self.volatile_messages()
+        else:
+            if self.next_step_prompt:
+                self.memory.add_message(Message.user_message(self.next_step_prompt))
+            messages = self.memory.to_dict_list()
 
         # Get response with tool options
         try:
-            response = await self.llm.ask_tool(
-                messages=self.messages,
-                system_msgs=[Message.system_message(self.system_prompt)]
-                if self.system_prompt
-                else None,
-                tools=self.available_tools.to_params(),
-                tool_choice=self.tool_choices,
-            )
+            with usage_context(call_role="think"):
+                response = await self.llm.ask_tool(
+                    messages=messages,
+                    system_msgs=[Message.system_message(self.system_prompt)]
+                    if self.system_prompt
+                    else None,
+                    tools=self.available_tools.to_params(),
+                    tool_choice=self.tool_choices,
+                )
             
             # Ensure tool_calls is not None before assignment
             self.tool_calls = response.tool_calls or []
@@ -114,12 +137,17 @@ class ToolCallAgent(ReActAgent):
         for command in self.tool_calls:
             result = await self.execute_tool(command)
 
-            if self.max_observe:
-                result = result[: self.max_observe]
+            # Long observations are stored as artifacts; memory keeps a preview and handle
+            result = await artifact_store.aoffload(
+                result,
+                source=command.function.name,
+                limit=self.max_observe or None,
+            )
 
             logger.info(
                 f"🎯 Tool '{command.function.name}' completed its mission! Result: {result}"
             )
+            await emit_event(EventType.TOOL_RESULT, result, tool=command.function.name)
 
             # Add tool response to memory
             tool_msg = Message.tool_message(
@@ -145,7 +173,16 @@ class ToolCallAgent(ReActAgent):
 
             # Execute the tool
             logger.info(f"🔧 Activating tool: '{name}'...")
-            result = await self.available_tools.execute(name=name, tool_input=args)
+            scope = asyncio.timeout(self.tool_timeout)
+            try:
+                async with scope:
+                    result = await self.available_tools.execute(name=name, tool_input=args)
+            except TimeoutError:
+                if not scope.expired():
+                    raise
+                error_msg = f"Tool '{name}' timed out after {self.tool_timeout:g}s"
+                logger.error(f"⏱️ {error_msg}")
+                return f"Error: {error_msg}"
 
             # Format result for display
             observation = (
@@ -169,6 +206,61 @@ class ToolCallAgent(ReActAgent):
             logger.error(error_msg)
             return f"Error: {error_msg}"
 
+    async def on_step_cancelled(self) -> None:
+        """Answer tool calls left without a response, so the history stays valid."""
+        answered, pending = set(), []
+        for message in reversed(self.memory.messages):
+            if message.role == "tool":
+                answered.add(message.tool_call_id)
+            elif message.role == "assistant":
+                pending = [c for c in message.tool_calls or [] if c.id not in answered]
+                break
+        for call in pending:
+            self.memory.add_message(
+                Message.tool_message(
+                    content="Cancelled before the tool finished",
+                    tool_call_id=call.id,
+                    name=call.function.name,
+                )
+            )
+
+    async def cleanup(self) -> None:
+        """Stop subprocesses and close browser pages opened by the tools."""
+        await self.available_tools.cleanup()
+
+    @property
+    def tool_names(self) -> List[str]:
+        return list(self.available_tools.tool_map)
+
+    async def warm_up(self) -> None:
+        await self.available_tools.warm_up()
+
+    def reset(self) -> None:
+        super().reset()
+        self.tool_calls = []
+
+    def checkpoint_state(self) -> dict:
+        state = super().checkpoint_state()
+        # Tool calls may be provider objects rather than ToolCall instances
+        state["tool_calls"] = [
+            {
+                "id": call.id,
+                "type": "function",
+                "function": {
+                    "name": call.function.name,
+                    "arguments": call.function.arguments,
+                },
+            }
+            for call in self.tool_calls
+        ]
+        state["tools"] = self.available_tools.checkpoint_state()
+        return state
+
+    def restore_checkpoint(self, state: dict) -> None:
+        super().restore_checkpoint(state)
+        self.tool_calls = [ToolCall(**call) for call in state.get("tool_calls", [])]
+        self.available_tools.restore_checkpoint(state.get("tools", {}))
+
     async def _handle_special_tool(self, name: str, result: Any, **kwargs):
         """Handle special tool execution and state changes"""
         if not self._is_special_tool(name):
@@ -5,6 +5,7 @@ from pydantic import Field
 from app.agent.toolcall import ToolCallAgent
 from app.prompt.udsop import NEXT_STEP_PROMPT, SYSTEM_PROMPT
 from app.tool import Terminate, ToolCollection
+from app.tool.artifact_reader import ArtifactReader
 from app.tool.browser_use_tool import BrowserUseTool
 from app.tool.file_saver import FileSaver
 from app.tool.web_search import WebSearch
@@ -35,10 +36,17 @@ class udsop(ToolCallAgent):
     # Add general-purpose tools to the tool collection
     available_tools: ToolCollection = Field(
         default_factory=lambda: ToolCollection(
-            PythonExecute(), WebSearch(), BrowserUseTool(), FileSaver(), Terminate()
+            PythonExecute(),
+            WebSearch(),
+            BrowserUseTool(),
+            FileSaver(),
+            ArtifactReader(),
+            Terminate(),
         )
     )
 
     async def _handle_special_tool(self, name: str, result: Any, **kwargs):
-        await self.available_tools.get_tool(BrowserUseTool().name).cleanup()
+        # A pooled agent keeps its browser open for the next step
+        if not self.pooled:
+            await self.available_tools.get_tool(BrowserUseTool().name).cleanup()
         await super()._handle_special_tool(name, result, **kwargs)
@@ -0,0 +1,242 @@
+"""Content-addressed on-disk store for large tool outputs."""
+import asyncio
+import gzip
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+from pydantic import BaseModel, Field
+
+from app.config import PROJECT_ROOT, ArtifactSettings, config
+from app.logger import logger
+
+
+ARTIFACT_READER_NAME = "read_artifact"
+
+
+class ArtifactError(Exception):
+    """Raised when an artifact cannot be stored or read."""
+
+
+class Artifact(BaseModel):
+    """Metadata of a stored artifact"""
+
+    id: str
+    mime: str = "text/plain"
+    size: int = Field(0, description="Uncompressed size in bytes")
+    stored_size: int = Field(0, description="Compressed size on disk in bytes")
+    source: Optional[str] = Field(None, description="Tool or action that produced it")
+    created: float = Field(default_factory=time.time)
+    last_used: float = Field(default_factory=time.time)
+
+    @property
+    def is_text(self) -> bool:
+        return self.mime.startswith("text/") or self.mime == "application/json"
+
+
+class ArtifactStore:
+    """Process-wide artifact store.
+
+    Artifacts are addressed by a hash of their content, so storing the same
+    output twice costs nothing. Each one is kept gzip-compressed next to a small
+    JSON metadata file. When the compressed total exceeds the quota, the least
+    recently used artifacts are evicted.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._index = None
+                    cls._instance._total_bytes = 0
+        return cls._instance
+
+    @property
+    def settings(self) -> ArtifactSettings:
+        return config.artifact_config or ArtifactSettings()
+
+    @property
+    def directory(self) -> Path:
+        directory = self.settings.directory
+        return Path(directory) if directory else PROJECT_ROOT / "artifacts"
+
+    def _load_index(self) -> Dict[str, Artifact]:
+        if self._index is None:
+            index: Dict[str, Artifact] = {}
+            directory = self.directory
+            if directory.exists():
+                for meta_path in directory.glob("*.json"):
+                    try:
+                        artifact = Artifact.model_validate_json(meta_path.read_text())
+                    except (OSError, ValueError):
+                        continue
+                    data_path = directory / f"{artifact.id}.gz"
+                    if data_path.exists():
+                        # Reads touch the data file, so its mtime is the last use
+                        artifact.last_used = data_path.stat().st_mtime
+                        index[artifact.id] = artifact
+            self._index = index
+            self._total_bytes = sum(a.stored_size for a in index.values())
+        return self._index
+
+    def _paths(self, artifact_id: str):
+        directory = self.directory
+        return directory / f"{artifact_id}.gz", directory / f"{artifact_id}.json"
+
+    def put(
+        self,
+        data: Union[str, bytes],
+        mime: str = "text/plain",
+        source: Optional[str] = None,
+    ) -> Artifact:
+        """Store content and return its metadata. Identical content is stored once."""
+        raw = data.encode("utf-8") if isinstance(data, str) else data
+        if len(raw) > self.settings.max_artifact_bytes:
+            raise ArtifactError(
+                f"Artifact of {len(raw)} bytes exceeds the {self.settings.max_artifact_bytes}-byte limit"
+            )
+        artifact_id = hashlib.sha256(raw).hexdigest()[:24]
+
+        with self._lock:
+            index = self._load_index()
+            existing = index.get(artifact_id)
+            if existing is not None:
+                self._touch(existing)
+                return existing
+
+            # Already-compressed media only gets a cheap pass
+            level = 6 if mime.startswith("text/") or mime == "application/json" else 1
+            compressed = gzip.compress(raw, compresslevel=level, mtime=0)
+            artifact = Artifact(
+                id=artifact_id,
+                mime=mime,
+                size=len(raw),
+                stored_size=len(compressed),
+                source=source,
+            )
+            data_path, meta_path = self._paths(artifact_id)
+            try:
+                data_path.parent.mkdir(parents=True, exist_ok=True)
+                data_path.write_bytes(compressed)
+                meta_path.write_text(artifact.model_dump_json())
+            except OSError as e:
+                raise ArtifactError(f"Failed to write artifact: {e}") from e
+
+            index[artifact_id] = artifact
+            self._total_bytes += artifact.stored_size
+            self._enforce_quota(keep=artifact_id)
+        return artifact
+
+    def get(self, artifact_id: str) -> bytes:
+        """Return the content of an artifact."""
+        artifact = self.info(artifact_id)
+        if artifact is None:
+            raise ArtifactError(f"Unknown or evicted artifact: {artifact_id}")
+        data_path, _ = self._paths(artifact.id)
+        try:
+            data = gzip.decompress(data_path.read_bytes())
+        except OSError as e:
+            raise ArtifactError(f"Failed to read artifact {artifact_id}: {e}") from e
+        with self._lock:
+            self._touch(artifact)
+        return data
+
+    def get_text(self, artifact_id: str) -> str:
+        """Return the content of a text artifact."""
+        return self.get(artifact_id).decode("utf-8", errors="replace")
+
+    def info(self, artifact_id: str) -> Optional[Artifact]:
+        """Return artifact metadata, accepting the ``artifact:`` handle prefix."""
+        artifact_id = artifact_id.strip().removeprefix("artifact:")
+        with self._lock:
+            return self._load_index().get(artifact_id)
+
+    def offload(
+        self, text: str, source: Optional[str] = None, limit: Optional[int] = None
+    ) -> str:
+        """Keep short text inline; store long text and return a preview plus handle.
+
+        Args:
+            text: Tool output to check.
+            source: Name of the tool or action that produced the text.
+            limit: Inline size limit in characters. Defaults to ``inline_limit``.
+
+        Returns:
+            str: The original text, or a preview followed by a handle that the
+            `read_artifact` tool can expand.
+        """
+        settings = self.settings
+        limit = limit or settings.inline_limit
+        if len(text) <= limit:
+            return text
+        if not settings.enabled:
+            return text[:limit]
+
+        try:
+            artifact = self.put(text, source=source)
+        except ArtifactError as e:
+            logger.warning(f"{e}; truncating output instead")
+            return text[:limit]
+
+        preview = text[: min(settings.preview_chars, limit)]
+        return (
+            f"{preview}\n...\n[Output truncated: {len(text)} characters in total, "
+            f"stored as artifact:{artifact.id}. Use `{ARTIFACT_READER_NAME}` to page "
+            f"through or grep the full output.]"
+        )
+
+    async def aoffload(
+        self, text: str, source: Optional[str] = None, limit: Optional[int] = None
+    ) -> str:
+        """Like `offload`, with compression and disk writes kept off the event loop."""
+        if len(text) <= (limit or self.settings.inline_limit):
+            return text
+        return await asyncio.to_thread(self.offload, text, source, limit)
+
+    def usage(self) -> Dict[str, int]:
+        """Return the number of artifacts and their compressed size."""
+        with self._lock:
+            index = self._load_index()
+            return {"artifacts": len(index), "stored_bytes": self._total_bytes}
+
+    def _touch(self, artifact: Artifact) -> None:
+        artifact.last_used = time.time()
+        data_path, _ = self._paths(artifact.id)
+        try:
+            os.utime(data_path)
+        except OSError:
+            pass
+
+    def _enforce_quota(self, keep: Optional[str] = None) -> None:
+        quota = self.settings.max_total_bytes
+        if self._total_bytes <= quota:
+            return
+        for artifact in sorted(self._index.values(), key=lambda a: a.last_used):
+            if self._total_bytes <= quota:
+                break
+            if artifact.id == keep:
+                continue
+            self._remove(artifact)
+
+    def _remove(self, artifact: Artifact) -> None:
+        for path in self._paths(artifact.id):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Failed to evict artifact {artifact.id}: {e}")
+                return
+        self._index.pop(artifact.id, None)
+        self._total_bytes -= artifact.stored_size
+        logger.debug(f"Evicted artifact {artifact.id} ({artifact.stored_size} bytes)")
+
+
+artifact_store = ArtifactStore()
@@ -0,0 +1,264 @@
+"""Run many tasks from a JSONL file through concurrent agent sessions in one event loop."""
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Union
+
+from pydantic import BaseModel
+
+from app.agent.base import BaseAgent
+from app.cancellation import CancellationToken, absorb_cancellation
+from app.exceptions import FlowRejected
+from app.flow.scheduler import FlowScheduler
+from app.logger import logger
+from app.usage import new_run_id, usage_context, usage_tracker
+
+
+ID_FIELDS = ("id", "task_id", "request_id")
+PROMPT_FIELDS = ("prompt", "task", "body", "request")
+
+
+class BatchTask(BaseModel):
+    """One task read from the input file."""
+
+    id: str
+    prompt: str
+    line: int
+    priority: int = 0
+    weight: float = 1.0
+    slo: Optional[float] = None
+
+
+class BatchProgress(BaseModel):
+    """Counters for the progress report."""
+
+    total: int = 0
+    skipped: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    cancelled: int = 0
+    rejected: int = 0
+    running: int = 0
+    tokens: int = 0
+    cost: float = 0.0
+    started_at: float = 0.0
+
+    @property
+    def finished(self) -> int:
+        return self.succeeded + self.failed + self.cancelled + self.rejected
+
+    def report(self) -> str:
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        todo = self.total - self.skipped
+        rate = self.finished / elapsed
+        eta = f", ETA {(todo - self.finished) / rate:.0f}s" if rate and todo > self.finished else ""
+        return (
+            f"{self.finished}/{todo} tasks done ({self.succeeded} ok, {self.failed} failed, "
+            f"{self.cancelled} cancelled, {self.rejected} rejected, {self.running} running), "
+            f"{rate * 60:.1f} tasks/min, "
+            f"{self.tokens} tokens, cost {self.cost:.4f}{eta}"
+        )
+
+
+def load_tasks(path: Union[str, Path]) -> List[BatchTask]:
+    """Read tasks from a JSONL file.
+
+    Each line is a JSON object with an id (``id``, ``task_id`` or
+    ``request_id``) and a prompt (``prompt``, ``task``, ``body`` or
+    ``request``; a ``title`` is prepended when present). Lines without an id
+    are numbered; a bare JSON string is taken as the prompt. Optional
+    ``priority``, ``weight`` and ``slo`` fields are passed to the scheduler.
+    """
+    tasks, seen = [], set()
+    with Path(path).open(encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {"prompt": record}
+            prompt = next((record[k] for k in PROMPT_FIELDS if record.get(k)), None)
+            if not prompt:
+                logger.warning(f"Skipping line {number} of {path}: no prompt")
+                continue
+            if record.get("title"):
+                prompt = f"{record['title']}\n\n{prompt}"
+            task_id = str(next((record[k] for k in ID_FIELDS if record.get(k)), number))
+            if task_id in seen:
+                raise ValueError(f"Duplicate task id {task_id!r} on line {number} of {path}")
+            seen.add(task_id)
+            scheduling = {
+                k: record[k] for k in ("priority", "weight", "slo") if record.get(k) is not None
+            }
+            tasks.append(BatchTask(id=task_id, prompt=prompt, line=number, **scheduling))
+    return tasks
+
+
+def finished_task_ids(path: Union[str, Path], retry_failed: bool = False) -> Set[str]:
+    """Ids of tasks that already have a result in an output file."""
+    path = Path(path)
+    if not path.exists():
+        return set()
+    done = set()
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a line cut short by a crash
+            status = record.get("status")
+            if status == "ok" or (status == "error" and not retry_failed):
+                done.add(str(record.get("id")))
+    return done
+
+
+class BatchRunner:
+    """
+    Runs tasks through up to `concurrency` agent sessions at once.
+
+    Each task gets a fresh agent from `agent_factory` and its own run id, so
+    usage and checkpoints are kept apart. Results are appended to the output
+    file as tasks finish, one JSON object per line with the status, result,
+    stop reason, usage and timings. With `resume`, tasks that already have an
+    ``ok`` (or, unless `retry_failed`, an ``error``) line are skipped, so an
+    interrupted batch continues where it stopped. Cancelled tasks are written
+    with status ``cancelled`` and rerun on resume.
+
+    With a `scheduler`, every task is submitted to it with the task's
+    priority, weight and SLO, so the sessions share LLM and tool slots
+    fairly and overload is shed by priority. Tasks the scheduler refuses are
+    written with status ``rejected`` and rerun on resume.
+    """
+
+    def __init__(
+        self,
+        agent_factory: Callable[[], BaseAgent],
+        output: Union[str, Path],
+        concurrency: int = 4,
+        resume: bool = False,
+        retry_failed: bool = False,
+        progress_interval: float = 10.0,
+        scheduler: Optional[FlowScheduler] = None,
+    ):
+        self.agent_factory = agent_factory
+        self.output = Path(output)
+        self.concurrency = max(concurrency, 1)
+        self.resume = resume
+        self.retry_failed = retry_failed
+        self.progress_interval = progress_interval
+        self.scheduler = scheduler
+        self.progress = BatchProgress()
+        self.cancel_token = CancellationToken()
+
+    def cancel(self, reason: str = "batch cancelled") -> None:
+        """Stop the running tasks and do not start new ones; safe from any thread."""
+        self.cancel_token.cancel(reason)
+
+    async def run(self, tasks: List[BatchTask]) -> BatchProgress:
+        """Run the tasks and return the final counters."""
+        done = finished_task_ids(self.output, self.retry_failed) if self.resume else set()
+        pending = [task for task in tasks if task.id not in done]
+        self.progress = BatchProgress(
+            total=len(tasks), skipped=len(tasks) - len(pending), started_at=time.monotonic()
+        )
+        if self.progress.skipped:
+            logger.info(f"⏭️ Skipping {self.progress.skipped} tasks already in {self.output}")
+        logger.info(
+            f"📦 Running {len(pending)} tasks with {self.concurrency} concurrent sessions"
+        )
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for task in pending:
+            queue.put_nowait(task)
+
+        self.output.parent.mkdir(parents=True, exist_ok=True)
+        with self.output.open("a" if self.resume else "w", encoding="utf-8") as out:
+            reporter = asyncio.create_task(self._report_progress())
+            try:
+                async with asyncio.TaskGroup() as group:
+                    for _ in range(min(self.concurrency, len(pending))):
+                        group.create_task(self._worker(queue, out))
+            finally:
+                reporter.cancel()
+
+        logger.info(f"🏁 Batch finished: {self.progress.report()}")
+        if self.scheduler is not None:
+            report = self.scheduler.slo_report()
+            logger.info(
+                f"🚦 Scheduler: p50 {report.p50_latency:.1f}s, p95 {report.p95_latency:.1f}s, "
+                f"mean queue wait {report.mean_queue_wait:.1f}s, "
+                f"SLO met {report.slo_met}/{report.with_slo}, {report.rejected} rejected"
+            )
+        return self.progress
+
+    async def _worker(self, queue: asyncio.Queue, out) -> None:
+        with self.cancel_token.bind():
+            while not queue.empty() and not self.cancel_token.cancelled:
+                record = await self._run_task(queue.get_nowait())
+                out.write(json.dumps(record, default=str) + "\n")
+                out.flush()
+
+    async def _run_task(self, task: BatchTask) -> Dict[str, Any]:
+        run_id = new_run_id()
+        record: Dict[str, Any] = {"id": task.id, "run_id": run_id, "started_at": time.time()}
+        start = time.perf_counter()
+        self.progress.running += 1
+        agent = None
+        try:
+            agent = self.agent_factory()
+            with usage_context(run_id=run_id):
+                if self.scheduler is None:
+                    result = await agent.run(task.prompt)
+                else:
+                    result = await self.scheduler.submit(
+                        agent,
+                        task.prompt,
+                        priority=task.priority,
+                        weight=task.weight,
+                        slo=task.slo,
+                        name=task.id,
+                    )
+            cancelled = (agent.stop_reason or "").startswith("cancelled")
+            record.update(status="cancelled" if cancelled else "ok", result=result)
+        except asyncio.CancelledError:
+            if not self.cancel_token.cancelled:
+                raise
+            # Cancelled before the agent ran, e.g. while queued in the scheduler
+            absorb_cancellation()
+            record.update(status="cancelled", error=f"Cancelled ({self.cancel_token.reason})")
+        except FlowRejected as e:
+            logger.warning(f"Task {task.id} rejected: {e}")
+            record.update(status="rejected", error=str(e))
+        except Exception as e:
+            logger.error(f"Task {task.id} failed: {e}")
+            record.update(status="error", error=f"{type(e).__name__}: {e}")
+        finally:
+            self.progress.running -= 1
+            if agent is not None:
+                await agent.cleanup()
+
+        usage = usage_tracker.totals(run_id)
+        record.update(
+            stop_reason=agent.stop_reason if agent else None,
+            steps=agent.current_step if agent else 0,
+            duration=round(time.perf_counter() - start, 3),
+            usage=usage.model_dump(),
+        )
+        self.progress.tokens += usage.total_tokens
+        self.progress.cost += usage.cost
+        if record["status"] == "ok":
+            self.progress.succeeded += 1
+        elif record["status"] == "error":
+            self.progress.failed += 1
+        elif record["status"] == "rejected":
+            self.progress.rejected += 1
+        else:
+            self.progress.cancelled += 1
+        return record
+
+    async def _report_progress(self) -> None:
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            logger.info(f"📊 {self.progress.report()}")
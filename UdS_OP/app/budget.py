@@ -0,0 +1,137 @@
+"""Wall-clock, token, cost and per-tool time budgets shared by flows, agents and tools."""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Tuple
+
+from pydantic import BaseModel, Field, PrivateAttr
+
+from app.usage import UsageTotals, usage_tracker
+
+
+WIND_DOWN_PROMPT = (
+    "You have used {percent}% of your {resource} budget for this task. Stop starting "
+    "new work: wrap up what you have, report your results and finish with the "
+    "`terminate` tool."
+)
+
+
+class Budget(BaseModel):
+    """
+    Limits for a run. Unset limits are not enforced.
+
+    A budget is started by every run of the outermost flow or agent that runs
+    with it, and measures time, tokens and cost of that run only, so a reused
+    agent gets its full budget each time. Nested agents and tools see the same
+    budget through `current_budget`, so limits set on a flow apply to every
+    executor it calls.
+    """
+
+    deadline: Optional[float] = Field(None, description="Wall-clock limit in seconds")
+    max_tokens: Optional[int] = Field(None, description="Prompt plus completion tokens")
+    max_cost: Optional[float] = Field(None, description="Estimated cost of LLM calls")
+    tool_timeout: Optional[float] = Field(
+        None, description="Longest a single tool call may run, in seconds"
+    )
+    wind_down_at: float = Field(
+        0.8, description="Fraction of any limit at which agents are asked to wrap up"
+    )
+
+    _started_at: Optional[float] = PrivateAttr(default=None)
+    _run_id: Optional[str] = PrivateAttr(default=None)
+    _spent_before: UsageTotals = PrivateAttr(default_factory=UsageTotals)
+
+    def start(self, run_id: Optional[str]) -> None:
+        """Restart the clock and count the usage of `run_id` from now on."""
+        self._started_at = time.monotonic()
+        self._run_id = run_id
+        self._spent_before = usage_tracker.totals(run_id) if run_id else UsageTotals()
+
+    @property
+    def started(self) -> bool:
+        return self._started_at is not None
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self._started_at if self.started else 0.0
+
+    def remaining_time(self) -> Optional[float]:
+        """Seconds until the deadline, or None without one."""
+        if self.deadline is None:
+            return None
+        return max(self.deadline - self.elapsed(), 0.0)
+
+    def tool_time_limit(self) -> Optional[float]:
+        """Time a tool call may take: the tool timeout capped by the deadline."""
+        limits = [t for t in (self.tool_timeout, self.remaining_time()) if t is not None]
+        return min(limits) if limits else None
+
+    def usage(self) -> UsageTotals:
+        """Usage of the run since the budget was started."""
+        if not self._run_id:
+            return UsageTotals()
+        totals = usage_tracker.totals(self._run_id).model_dump()
+        before = self._spent_before.model_dump()
+        return UsageTotals(**{field: totals[field] - before[field] for field in totals})
+
+    def pressure(self) -> Tuple[float, Optional[str]]:
+        """Return the most used fraction of any limit and the resource it belongs to."""
+        fractions = []
+        if self.deadline:
+            fractions.append((self.elapsed() / self.deadline, "time"))
+        if self.max_tokens or self.max_cost:
+            usage = self.usage()
+            if self.max_tokens:
+                fractions.append((usage.total_tokens / self.max_tokens, "token"))
+            if self.max_cost:
+                fractions.append((usage.cost / self.max_cost, "cost"))
+        if not fractions:
+            return 0.0, None
+        return max(fractions)
+
+    def exhausted_reason(self) -> Optional[str]:
+        """Describe the exhausted limit, or None while within budget."""
+        if not self.started:
+            return None
+        if self.deadline is not None and self.elapsed() >= self.deadline:
+            return f"deadline of {self.deadline:g}s reached"
+        if self.max_tokens or self.max_cost:
+            usage = self.usage()
+            if self.max_tokens and usage.total_tokens >= self.max_tokens:
+                return f"token cap reached ({usage.total_tokens}/{self.max_tokens})"
+            if self.max_cost and usage.cost >= self.max_cost:
+                return f"cost cap reached ({usage.cost:.4f}/{self.max_cost:g})"
+        return None
+
+    def wind_down_prompt(self) -> Optional[str]:
+        """Prompt asking the agent to finish, once any limit passes `wind_down_at`."""
+        fraction, resource = self.pressure()
+        if resource is None or fraction < self.wind_down_at:
+            return None
+        return WIND_DOWN_PROMPT.format(percent=min(int(fraction * 100), 100), resource=resource)
+
+
+_current_budget: ContextVar[Optional[Budget]] = ContextVar("budget", default=None)
+
+
+def current_budget() -> Optional[Budget]:
+    """Return the budget governing the current context."""
+    return _current_budget.get()
+
+
+@contextmanager
+def budget_context(budget: Optional[Budget], run_id: Optional[str] = None):
+    """Apply `budget` to everything run inside the block.
+
+    The budget is started for the block unless it already governs the
+    enclosing context, as it does for the executors of a flow.
+    """
+    if budget is None:
+        yield None
+        return
+    if current_budget() is not budget:
+        budget.start(run_id)
+    token = _current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _current_budget.reset(token)
@@ -0,0 +1,88 @@
+"""Cooperative cancellation of agent and flow runs, safe to trigger from any thread."""
+import asyncio
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+
+class CancellationToken:
+    """
+    Signal that stops a run at its next await, within one event-loop iteration.
+
+    A run binds the token to the task executing it. `cancel` may then be
+    called from any thread (a UI callback, a server handler, a signal
+    handler): it cancels every bound task through its loop, so a step blocked
+    on a slow LLM call or a hung tool is interrupted immediately instead of
+    at the next step boundary. Runs catch the resulting `CancelledError`,
+    release their tools and report ``stop_reason = "cancelled: <reason>"``.
+
+    Nested runs (a flow and the executor agents it calls) share the token
+    through `current_cancel_token`.
+    """
+
+    def __init__(self):
+        self._reason: Optional[str] = None
+        self._tasks: Dict[asyncio.Task, asyncio.AbstractEventLoop] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._reason is not None
+
+    @property
+    def reason(self) -> Optional[str]:
+        return self._reason
+
+    def cancel(self, reason: str = "cancelled by user") -> bool:
+        """Cancel the run; returns False if it was already cancelled."""
+        with self._lock:
+            if self._reason is not None:
+                return False
+            self._reason = reason
+            tasks = list(self._tasks.items())
+        for task, loop in tasks:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(self._cancel_task, task)
+        return True
+
+    def _cancel_task(self, task: asyncio.Task) -> None:
+        # The run may have finished between `cancel` and this callback
+        with self._lock:
+            bound = task in self._tasks
+        if bound and not task.done():
+            task.cancel(self._reason)
+
+    @contextmanager
+    def bind(self):
+        """Bind the token to the current task and make it the current token."""
+        task = asyncio.current_task()
+        with self._lock:
+            owner = task not in self._tasks
+            if owner:
+                self._tasks[task] = asyncio.get_running_loop()
+        context_token = _current_token.set(self)
+        try:
+            yield self
+        finally:
+            _current_token.reset(context_token)
+            if owner:
+                with self._lock:
+                    self._tasks.pop(task, None)
+
+
+_current_token: ContextVar[Optional[CancellationToken]] = ContextVar(
+    "cancellation_token", default=None
+)
+
+
+def current_cancel_token() -> Optional[CancellationToken]:
+    """Return the cancellation token of the run in the current context."""
+    return _current_token.get()
+
+
+def absorb_cancellation() -> None:
+    """Clear the token's cancel request from the current task so cleanup can await."""
+    task = asyncio.current_task()
+    if task is not None and task.cancelling():
+        task.uncancel()
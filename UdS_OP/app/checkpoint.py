@@ -0,0 +1,100 @@
+"""Periodic on-disk checkpoints of agent and flow runs, for resuming after a crash."""
+import asyncio
+import gzip
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from app.config import PROJECT_ROOT
+from app.logger import logger
+
+
+CHECKPOINT_VERSION = 1
+
+
+class Checkpointer:
+    """
+    Writes the latest snapshot of each run to ``<directory>/<run_id>.json.gz``.
+
+    `save` only queues a snapshot; JSON encoding, compression and the write
+    happen in a worker thread. If snapshots arrive faster than they can be
+    written, only the newest one per run is kept. Files are replaced
+    atomically, so a crash mid-write leaves the previous checkpoint intact.
+
+    Snapshots must not be mutated after they are queued. Callers copy mutable
+    state when building them; cached message dicts are immutable and are
+    shared as-is.
+    """
+
+    def __init__(self, directory: Optional[Union[str, Path]] = None):
+        self.directory = Path(directory) if directory else PROJECT_ROOT / "checkpoints"
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._writer: Optional[asyncio.Task] = None
+
+    def path(self, run_id: str) -> Path:
+        return self.directory / f"{run_id}.json.gz"
+
+    def save(self, run_id: str, kind: str, state: Dict[str, Any]) -> None:
+        """Queue a snapshot of a run for writing in the background."""
+        self._pending[run_id] = {
+            "version": CHECKPOINT_VERSION,
+            "kind": kind,
+            "run_id": run_id,
+            "saved_at": time.time(),
+            "state": state,
+        }
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._drain())
+
+    async def flush(self) -> None:
+        """Wait until every queued snapshot has been written."""
+        if self._writer is not None:
+            await asyncio.shield(self._writer)
+
+    async def _drain(self) -> None:
+        while self._pending:
+            run_id = next(iter(self._pending))
+            snapshot = self._pending.pop(run_id)
+            try:
+                await asyncio.to_thread(self._write, run_id, snapshot)
+            except OSError as e:
+                logger.warning(f"Failed to write checkpoint for run {run_id}: {e}")
+
+    def _write(self, run_id: str, snapshot: Dict[str, Any]) -> None:
+        data = gzip.compress(
+            json.dumps(snapshot, separators=(",", ":")).encode("utf-8"),
+            compresslevel=5,
+            mtime=0,
+        )
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path(run_id)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+    def load(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Load the latest checkpoint of a run, or None if there is none."""
+        path = self.path(run_id)
+        if not path.exists():
+            return None
+        snapshot = json.loads(gzip.decompress(path.read_bytes()))
+        if snapshot.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(
+                f"Unsupported checkpoint version {snapshot.get('version')} for run {run_id}"
+            )
+        return snapshot
+
+    def list_runs(self) -> List[str]:
+        """Return the ids of runs with a checkpoint, most recent first."""
+        if not self.directory.exists():
+            return []
+        paths = sorted(
+            self.directory.glob("*.json.gz"), key=lambda p: p.stat().st_mtime, reverse=True
+        )
+        return [p.name[: -len(".json.gz")] for p in paths]
+
+    def delete(self, run_id: str) -> None:
+        """Remove the checkpoint of a run."""
+        self.path(run_id).unlink(missing_ok=True)
@@ -1,7 +1,7 @@
 import threading
 import tomllib
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Literal, Optional
 
 from pydantic import BaseModel, Field
 
@@ -23,6 +23,12 @@ class LLMSettings(BaseModel):
     temperature: float = Field(1.0, description="Sampling temperature")
     api_type: str = Field(..., description="AzureOpenai or Openai")
     api_version: str = Field(..., description="Azure Openai version if AzureOpenai")
+    input_cost_per_million: float = Field(
+        0.0, description="Price per million prompt tokens, used for cost budgets"
+    )
+    output_cost_per_million: float = Field(
+        0.0, description="Price per million completion tokens, used for cost budgets"
+    )
 
 
 class ProxySettings(BaseModel):
@@ -33,6 +39,127 @@ class ProxySettings(BaseModel):
 class SearchSettings(BaseModel):
     engine: str = Field(default='Google', description="Search engine the llm to use")
 
+class HTTPSettings(BaseModel):
+    max_connections: int = Field(
+        100, description="Maximum number of concurrent connections in the shared pool"
+    )
+    max_keepalive_connections: int = Field(
+        20, description="Maximum number of idle keep-alive connections to retain"
+    )
+    keepalive_expiry: float = Field(
+        30.0, description="Seconds an idle keep-alive connection is kept open"
+    )
+    connect_timeout: float = Field(10.0, description="Connection timeout in seconds")
+    pool_timeout: float = Field(
+        30.0, description="Seconds to wait for a free connection from the pool"
+    )
+    http2: bool = Field(False, description="Enable HTTP/2 (requires the h2 package)")
+    prewarm: bool = Field(
+        True, description="Open connections to the LLM endpoints at startup"
+    )
+
+class ArtifactSettings(BaseModel):
+    enabled: bool = Field(True, description="Offload large tool outputs to the store")
+    directory: Optional[str] = Field(
+        None, description="Store directory (default: <project root>/artifacts)"
+    )
+    inline_limit: int = Field(
+        4000, description="Outputs longer than this many characters are offloaded"
+    )
+    preview_chars: int = Field(
+        1000, description="Characters of an offloaded output kept inline as a preview"
+    )
+    max_total_bytes: int = Field(
+        200 * 1024 * 1024, description="Compressed size quota for the whole store"
+    )
+    max_artifact_bytes: int = Field(
+        50 * 1024 * 1024, description="Largest single artifact accepted (uncompressed)"
+    )
+
+class PlanningSettings(BaseModel):
+    storage: Literal["memory", "sqlite"] = Field(
+        "memory", description="Where PlanningTool keeps plans"
+    )
+    database: Optional[str] = Field(
+        None, description="SQLite file (default: <project root>/workspace/plans.db)"
+    )
+    reuse_plans: bool = Field(
+        False, description="Reuse stored plans for requests similar to earlier ones"
+    )
+    library: Optional[str] = Field(
+        None, description="Plan library file (default: <project root>/workspace/plan_library.json)"
+    )
+    reuse_threshold: float = Field(
+        0.8, description="Cosine similarity a request needs to reuse a stored plan"
+    )
+    library_size: int = Field(500, description="Plans kept; least recently used are dropped")
+    max_reuse_failures: int = Field(
+        2, description="Failed runs after which a stored plan is invalidated"
+    )
+    compact_context: bool = Field(
+        False, description="Send the plan once, then only status changes, in step prompts"
+    )
+    executor_pool: bool = Field(
+        False, description="Lease executors from a warm pool and reset them between steps"
+    )
+    pool_size: int = Field(8, description="Most executor agents alive at once")
+    pool_idle_per_type: int = Field(2, description="Idle executors kept warm per step type")
+    pool_memory_limit_mb: Optional[float] = Field(
+        None, description="Resident memory above which idle executors are released"
+    )
+    memoize_steps: bool = Field(
+        False, description="Serve unchanged plan steps from a step cache when a request is rerun"
+    )
+    step_cache: Optional[str] = Field(
+        None, description="Step cache directory (default: <project root>/workspace/step_cache)"
+    )
+    step_cache_max_entries: int = Field(
+        2000, description="Most step cache entries kept; the least recently used go first"
+    )
+    step_cache_max_age: Optional[float] = Field(
+        7 * 24 * 3600.0, description="Seconds after which step cache entries expire"
+    )
+    stream_plan: bool = Field(
+        False, description="Stream plan creation and start the first step before the plan is complete"
+    )
+    route_steps: bool = Field(
+        False, description="Send each step to the cheapest executor with the tools it needs"
+    )
+    route_with_llm: bool = Field(
+        True, description="Ask the LLM which tools a step needs when its wording does not tell"
+    )
+
+class SchedulerSettings(BaseModel):
+    max_running: int = Field(4, description="Flows running at once")
+    max_queued: int = Field(16, description="Flows waiting to run before new ones are refused")
+    llm_slots: int = Field(4, description="Concurrent LLM calls shared by running flows")
+    browser_slots: int = Field(1, description="Concurrent browser actions shared by running flows")
+    process_slots: int = Field(2, description="Concurrent Python runs shared by running flows")
+    default_slo: Optional[float] = Field(
+        None, description="Target seconds from submission to result for flows without their own"
+    )
+
+
+class CompactionSettings(BaseModel):
+    enabled: bool = Field(False, description="Summarise the oldest history of tool-calling agents")
+    model: str = Field("summary", description="[llm.<name>] section of the summarising model")
+    trigger_messages: int = Field(40, description="Messages in memory before a summary is started")
+    keep_recent: int = Field(12, description="Newest messages always kept verbatim")
+    max_chars_per_message: int = Field(
+        2000, description="Characters of each message sent to the summarising model"
+    )
+
+
+class MetricsSettings(BaseModel):
+    file: Optional[str] = Field(
+        None, description="Prometheus text file rewritten at the end of every run"
+    )
+    port: Optional[int] = Field(
+        None, description="Serve Prometheus metrics at http://127.0.0.1:<port>/metrics"
+    )
+    summary: bool = Field(True, description="Log a table of step metrics at the end of every run")
+
+
 class BrowserSettings(BaseModel):
     headless: bool = Field(False, description="Whether to run browser in headless mode")
     disable_security: bool = Field(
@@ -63,6 +190,24 @@ class AppConfig(BaseModel):
     search_config: Optional[SearchSettings] = Field(
         None, description="Search configuration"
     )
+    http_config: Optional[HTTPSettings] = Field(
+        None, description="Shared HTTP connection pool configuration"
+    )
+    artifact_config: Optional[ArtifactSettings] = Field(
+        None, description="Artifact store configuration"
+    )
+    planning_config: Optional[PlanningSettings] = Field(
+        None, description="Plan storage configuration"
+    )
+    scheduler_config: Optional[SchedulerSettings] = Field(
+        None, description="Multi-flow scheduler configuration"
+    )
+    metrics_config: Optional[MetricsSettings] = Field(
+        None, description="Flow and agent metrics export"
+    )
+    compaction_config: Optional[CompactionSettings] = Field(
+        None, description="Background memory compaction"
+    )
 
     class Config:
         arbitrary_types_allowed = True
@@ -119,6 +264,8 @@ class Config:
             "temperature": base_llm.get("temperature", 1.0),
             "api_type": base_llm.get("api_type", ""),
             "api_version": base_llm.get("api_version", ""),
+            "input_cost_per_million": base_llm.get("input_cost_per_million", 0.0),
+            "output_cost_per_million": base_llm.get("output_cost_per_million", 0.0),
         }
 
         # handle browser config.
@@ -159,6 +306,36 @@ class Config:
         if search_config:
             search_settings = SearchSettings(**search_config)
 
+        http_config = raw_config.get("http", {})
+        http_settings = None
+        if http_config:
+            http_settings = HTTPSettings(**http_config)
+
+        artifact_config = raw_config.get("artifacts", {})
+        artifact_settings = None
+        if artifact_config:
+            artifact_settings = ArtifactSettings(**artifact_config)
+
+        planning_config = raw_config.get("planning", {})
+        planning_settings = None
+        if planning_config:
+            planning_settings = PlanningSettings(**planning_config)
+
+        scheduler_config = raw_config.get("scheduler", {})
+        scheduler_settings = None
+        if scheduler_config:
+            scheduler_settings = SchedulerSettings(**scheduler_config)
+
+        metrics_config = raw_config.get("metrics", {})
+        metrics_settings = None
+        if metrics_config:
+            metrics_settings = MetricsSettings(**metrics_config)
+
+        compaction_config = raw_config.get("compaction", {})
+        compaction_settings = None
+        if compaction_config:
+            compaction_settings = CompactionSettings(**compaction_config)
+
         config_dict = {
             "llm": {
                 "default": default_settings,
@@ -169,6 +346,12 @@ class Config:
             },
             "browser_config": browser_settings,
             "search_config": search_settings,
+            "http_config": http_settings,
+            "artifact_config": artifact_settings,
+            "planning_config": planning_settings,
+            "scheduler_config": scheduler_settings,
+            "metrics_config": metrics_settings,
+            "compaction_config": compaction_settings,
         }
 
         self._config = AppConfig(**config_dict)
@@ -185,5 +368,29 @@ class Config:
     def search_config(self) -> Optional[SearchSettings]:
         return self._config.search_config
 
+    @property
+    def http_config(self) -> Optional[HTTPSettings]:
+        return self._config.http_config
+
+    @property
+    def artifact_config(self) -> Optional[ArtifactSettings]:
+        return self._config.artifact_config
+
+    @property
+    def planning_config(self) -> Optional[PlanningSettings]:
+        return self._config.planning_config
+
+    @property
+    def scheduler_config(self) -> Optional[SchedulerSettings]:
+        return self._config.scheduler_config
+
+    @property
+    def metrics_config(self) -> Optional[MetricsSettings]:
+        return self._config.metrics_config
+
+    @property
+    def compaction_config(self) -> Optional[CompactionSettings]:
+        return self._config.compaction_config
+
 
 config = Config()
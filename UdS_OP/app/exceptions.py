@@ -3,3 +3,7 @@ class ToolError(Exception):
 
     def __init__(self, message):
         self.message = message
+
+
+class FlowRejected(Exception):
+    """Raised when a scheduler refuses or sheds a flow because it is overloaded."""
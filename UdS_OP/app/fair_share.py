@@ -0,0 +1,168 @@
+"""Weighted fair sharing of LLM, browser and process capacity between concurrent flows."""
+import asyncio
+import functools
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from app.usage import new_run_id, usage_tracker
+
+
+class FlowTicket(BaseModel):
+    """A flow submitted to a scheduler, with its share and latency record."""
+
+    id: str = Field(default_factory=new_run_id)
+    run_id: str = Field(default_factory=new_run_id, description="Run whose usage is the flow's")
+    name: str = "flow"
+    priority: int = Field(0, description="Higher runs first and is shed last")
+    weight: float = Field(1.0, description="Share of contended capacity relative to other flows")
+    slo: Optional[float] = Field(None, description="Target seconds from submission to result")
+    status: str = "queued"  # queued, running, done, failed, rejected
+    submitted_at: float = Field(default_factory=time.monotonic)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def queue_wait(self) -> Optional[float]:
+        return self.started_at - self.submitted_at if self.started_at is not None else None
+
+    @property
+    def latency(self) -> Optional[float]:
+        return self.finished_at - self.submitted_at if self.finished_at is not None else None
+
+    @property
+    def slo_met(self) -> Optional[bool]:
+        if self.slo is None or self.latency is None:
+            return None
+        return self.latency <= self.slo
+
+
+class FairResource:
+    """
+    `capacity` slots handed out to flows in weighted fair order.
+
+    While slots are free they are granted at once. Under contention the
+    waiting flow with the highest priority goes first, and among equal
+    priorities the one that has used least of the resource relative to its
+    weight. Use is measured by `measure` (e.g. a flow's LLM tokens so far)
+    or, without one, by the seconds the flow has held slots.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        capacity: int,
+        measure: Optional[Callable[[FlowTicket], float]] = None,
+    ):
+        self.name = name
+        self.capacity = max(capacity, 1)
+        self.measure = measure
+        self.in_use = 0
+        self.held: Dict[str, float] = {}  # seconds held per ticket id
+        self._waiters: List[Tuple[int, float, int, asyncio.Future]] = []
+        self._order = itertools.count()
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for *_, future in self._waiters if not future.done())
+
+    def used(self, ticket: FlowTicket) -> float:
+        """The ticket's use of this resource, in the resource's unit."""
+        return self.measure(ticket) if self.measure else self.held.get(ticket.id, 0.0)
+
+    @asynccontextmanager
+    async def slot(self, ticket: FlowTicket) -> AsyncIterator[None]:
+        """Hold one slot for the duration of the block."""
+        await self.acquire(ticket)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.held[ticket.id] = self.held.get(ticket.id, 0.0) + time.monotonic() - start
+            self.release()
+
+    async def acquire(self, ticket: FlowTicket) -> None:
+        if self.in_use < self.capacity and not self.waiting:
+            self.in_use += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        virtual_time = self.used(ticket) / max(ticket.weight, 1e-9)
+        heapq.heappush(
+            self._waiters, (-ticket.priority, virtual_time, next(self._order), future)
+        )
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Granted just as we were cancelled: hand the slot on
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        """Give the slot to the next waiter in fair order, or free it."""
+        while self._waiters:
+            *_, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_use -= 1
+
+    def forget(self, ticket: FlowTicket) -> None:
+        self.held.pop(ticket.id, None)
+
+
+def llm_tokens(ticket: FlowTicket) -> float:
+    """Prompt and completion tokens of a ticket's run so far."""
+    return float(usage_tracker.totals(ticket.run_id).total_tokens)
+
+
+_current_share: ContextVar[Optional[Tuple[FlowTicket, Dict[str, FairResource]]]] = ContextVar(
+    "fair_share", default=None
+)
+
+
+def current_ticket() -> Optional[FlowTicket]:
+    """The ticket of the scheduled flow running in this context, if any."""
+    share = _current_share.get()
+    return share[0] if share else None
+
+
+@contextmanager
+def share_context(ticket: FlowTicket, resources: Dict[str, FairResource]):
+    """Make `resources` gate the calls made inside the block on behalf of `ticket`."""
+    token = _current_share.set((ticket, resources))
+    try:
+        yield
+    finally:
+        _current_share.reset(token)
+
+
+@asynccontextmanager
+async def scheduled_slot(resource: Optional[str]) -> AsyncIterator[None]:
+    """Hold a slot of `resource` when running under a scheduler; otherwise do nothing."""
+    share = _current_share.get()
+    if share is None or resource is None or resource not in share[1]:
+        yield
+        return
+    ticket, resources = share
+    async with resources[resource].slot(ticket):
+        yield
+
+
+def scheduled(resource: str):
+    """Decorator running an async method inside a `scheduled_slot` of `resource`."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            async with scheduled_slot(resource):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -5,6 +5,9 @@ from typing import Dict, List, Optional, Union
 from pydantic import BaseModel
 
 from app.agent.base import BaseAgent
+from app.budget import Budget
+from app.cancellation import CancellationToken
+from app.checkpoint import Checkpointer
 
 
 class FlowType(str, Enum):
@@ -17,6 +20,11 @@ class BaseFlow(BaseModel, ABC):
     agents: Dict[str, BaseAgent]
     tools: Optional[List] = None
     primary_agent_key: Optional[str] = None
+    run_id: Optional[str] = None
+    checkpointer: Optional[Checkpointer] = None  # writes a checkpoint after every step
+    budget: Optional[Budget] = None  # limits shared by every executor and tool
+    stop_reason: Optional[str] = None  # why the current or last run stopped
+    cancel_token: Optional[CancellationToken] = None  # cancels the run from any thread
 
     class Config:
         arbitrary_types_allowed = True
@@ -57,6 +65,23 @@ class BaseFlow(BaseModel, ABC):
         """Add a new agent to the flow"""
         self.agents[key] = agent
 
+    def checkpoint_state(self) -> dict:
+        """Capture the state needed to resume the flow, including its agents."""
+        return {
+            "agents": {key: agent.checkpoint_state() for key, agent in self.agents.items()}
+        }
+
+    def restore_checkpoint(self, state: dict) -> None:
+        """Restore state captured by `checkpoint_state`."""
+        for key, agent_state in state.get("agents", {}).items():
+            if key in self.agents:
+                self.agents[key].restore_checkpoint(agent_state)
+
+    def save_checkpoint(self) -> None:
+        """Queue a checkpoint of the flow if checkpointing is enabled."""
+        if self.checkpointer and self.run_id:
+            self.checkpointer.save(self.run_id, "flow", self.checkpoint_state())
+
     @abstractmethod
     async def execute(self, input_text: str) -> str:
         """Execute the flow with given input"""
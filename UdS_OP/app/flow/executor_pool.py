@@ -0,0 +1,185 @@
+"""Warm executor agents for flows, kept per step type and reset between steps."""
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from app.agent.base import BaseAgent
+from app.logger import logger
+
+
+def resident_memory_mb() -> Optional[float]:
+    """Resident memory of this process in MiB, or None where it cannot be read."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+class PoolStats(BaseModel):
+    """Counters of the pool's activity."""
+
+    created: int = 0
+    reused: int = 0
+    evicted: int = 0
+    waits: int = 0
+
+
+class ExecutorPool:
+    """
+    Hands out executor agents by step type and takes them back after the step.
+
+    Agents come from per-type factories, or from agent instances added with
+    `add` when no factory is known (then at most that many run at once and
+    further requests wait). New agents are warmed up (tools started, browser
+    launched) before their first step; returned agents keep their tools warm
+    and only have memory and run state reset, which is cheap.
+
+    At most `max_size` agents exist at a time and at most `max_idle_per_type`
+    idle ones are kept per type. While the process uses more than
+    `memory_limit_mb` of resident memory, returned agents are released
+    instead of kept and idle agents of other types are evicted to make room.
+    """
+
+    def __init__(
+        self,
+        factories: Optional[Dict[str, Callable[[], BaseAgent]]] = None,
+        max_size: int = 8,
+        max_idle_per_type: int = 2,
+        memory_limit_mb: Optional[float] = None,
+    ):
+        self.factories = dict(factories or {})
+        self.max_size = max(max_size, 1)
+        self.max_idle_per_type = max_idle_per_type
+        self.memory_limit_mb = memory_limit_mb
+        self.stats = PoolStats()
+        self._idle: Dict[str, List[BaseAgent]] = {}
+        self._size = 0
+        self._available = asyncio.Condition()
+
+    @property
+    def size(self) -> int:
+        """Number of agents owned by the pool, idle or leased."""
+        return self._size
+
+    def add(self, step_type: str, agent: BaseAgent) -> None:
+        """Put an existing agent in the pool as an idle executor for `step_type`."""
+        agent.pooled = True
+        self._idle.setdefault(step_type, []).append(agent)
+        self._size += 1
+
+    async def prewarm(self, step_type: str, count: int = 1) -> None:
+        """Create and warm up agents for `step_type` ahead of its first step."""
+        factory = self.factories.get(step_type)
+        idle = self._idle.setdefault(step_type, [])
+        # Agents added as instances have not been warmed up yet
+        await asyncio.gather(*(agent.warm_up() for agent in idle))
+        while factory and len(idle) < count and self._size < self.max_size:
+            idle.append(await self._create(step_type, factory))
+
+    @asynccontextmanager
+    async def lease(self, step_type: str) -> AsyncIterator[BaseAgent]:
+        """Borrow an agent for one step and return it to the pool afterwards."""
+        agent = await self.acquire(step_type)
+        try:
+            yield agent
+        finally:
+            await self.release(step_type, agent)
+
+    async def acquire(self, step_type: str) -> BaseAgent:
+        """Take an idle agent for `step_type`, creating one if the pool has room."""
+        factory = self.factories.get(step_type)
+        evicted: List[BaseAgent] = []
+        async with self._available:
+            while True:
+                idle = self._idle.get(step_type)
+                if idle:
+                    agent = idle.pop()
+                    self.stats.reused += 1
+                    break
+                if factory and (self._size >= self.max_size or self._under_memory_pressure()):
+                    evicted.extend(self._evict_idle(step_type))
+                if factory and self._size < self.max_size:
+                    self._size += 1
+                    agent = None
+                    break
+                self.stats.waits += 1
+                await self._available.wait()
+
+        await self._release_resources(evicted)
+        if agent is None:
+            try:
+                agent = await self._create(step_type, factory, counted=True)
+            except BaseException:
+                await self._discard(None)
+                raise
+        agent.reset()
+        return agent
+
+    async def release(self, step_type: str, agent: BaseAgent) -> None:
+        """Return a leased agent; it is kept warm unless the pool is full or memory is short."""
+        idle = self._idle.setdefault(step_type, [])
+        keep = (
+            step_type not in self.factories  # the only way to get this type back
+            or (len(idle) < self.max_idle_per_type and not self._under_memory_pressure())
+        )
+        if keep:
+            async with self._available:
+                idle.append(agent)
+                self._available.notify()
+        else:
+            await self._discard(agent)
+
+    async def close(self) -> None:
+        """Release every idle agent's tools and empty the pool."""
+        agents = [agent for idle in self._idle.values() for agent in idle]
+        self._idle.clear()
+        self._size -= len(agents)
+        await self._release_resources(agents)
+
+    async def _create(
+        self, step_type: str, factory: Callable[[], BaseAgent], counted: bool = False
+    ) -> BaseAgent:
+        if not counted:
+            self._size += 1
+        agent = factory()
+        agent.pooled = True
+        await agent.warm_up()
+        self.stats.created += 1
+        logger.info(f"🔥 Warmed up a new {step_type} executor ({self._size}/{self.max_size})")
+        return agent
+
+    async def _discard(self, agent: Optional[BaseAgent]) -> None:
+        async with self._available:
+            self._size -= 1
+            self._available.notify()
+        if agent is not None:
+            self.stats.evicted += 1
+            await self._release_resources([agent])
+
+    def _evict_idle(self, keep_type: str) -> List[BaseAgent]:
+        """Drop one idle agent of another type that can be recreated later."""
+        for step_type, idle in self._idle.items():
+            if step_type != keep_type and idle and step_type in self.factories:
+                self._size -= 1
+                self.stats.evicted += 1
+                return [idle.pop(0)]
+        return []
+
+    def _under_memory_pressure(self) -> bool:
+        if self.memory_limit_mb is None:
+            return False
+        used = resident_memory_mb()
+        return used is not None and used > self.memory_limit_mb
+
+    @staticmethod
+    async def _release_resources(agents: List[BaseAgent]) -> None:
+        for agent in agents:
+            try:
+                await agent.cleanup()
+            except Exception as e:
+                logger.warning(f"Cleanup of executor {agent.name} failed: {e!r}")
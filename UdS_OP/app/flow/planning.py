@@ -1,15 +1,83 @@
+import asyncio
 import json
-import time
-from typing import Dict, List, Optional, Union
+import re
+import uuid
+from contextlib import asynccontextmanager, nullcontext
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
 
-from pydantic import Field
+from pydantic import Field, PrivateAttr
 
 from app.agent.base import BaseAgent
+from app.budget import budget_context, current_budget
+from app.cancellation import absorb_cancellation, current_cancel_token
+from app.config import PlanningSettings, config
 from app.flow.base import BaseFlow, PlanStepStatus
+from app.flow.executor_pool import ExecutorPool
+from app.flow.routing import CapabilityRegistry, StepRouter
+from app.flow.step_cache import StepCache, step_dependencies
 from app.llm import LLM
 from app.logger import logger
+from app.metrics import metrics
+from app.plan_library import PlanLibrary, PlanMatch, plan_library
 from app.schema import AgentState, Message, ToolChoice
+from app.stream import StreamEvent, TapSink, event_sink_context, get_event_sink
 from app.tool import PlanningTool
+from app.tool.planning import PlanContext
+from app.tracing import tracer
+from app.usage import current_usage_tags, new_run_id, usage_context
+
+
+# Executor stop reasons that mean a step did not go as planned
+FAILED_STEP_REASONS = ("stuck", "reached max steps", "budget exhausted")
+
+_JSON_STRING = r'"((?:[^"\\]|\\.)*)"'
+
+
+class PlanStreamParser:
+    """
+    Reads the title and steps out of planning-tool arguments while they stream.
+
+    A step is final once its closing quote has arrived: later tokens of the
+    same JSON document can only add steps after it.
+    """
+
+    _TITLE = re.compile(r'"title"\s*:\s*' + _JSON_STRING)
+    _STEPS = re.compile(r'"steps"\s*:\s*\[')
+    _STEP = re.compile(r"\s*,?\s*" + _JSON_STRING)
+    _END = re.compile(r"\s*,?\s*\]")
+
+    def __init__(self):
+        self.buffer = ""
+        self.title: Optional[str] = None
+        self.steps: List[str] = []
+        self._position: Optional[int] = None  # where the next step starts
+        self._closed = False
+
+    def feed(self, fragment: str) -> bool:
+        """Add a fragment of the arguments; returns True if a new step became final."""
+        self.buffer += fragment
+        if self.title is None:
+            match = self._TITLE.search(self.buffer)
+            if match:
+                self.title = json.loads(f'"{match.group(1)}"')
+        if self._position is None:
+            match = self._STEPS.search(self.buffer)
+            if not match:
+                return False
+            self._position = match.end()
+
+        found = False
+        while not self._closed:
+            if self._END.match(self.buffer, self._position):
+                self._closed = True
+                break
+            match = self._STEP.match(self.buffer, self._position)
+            if not match:
+                break
+            self.steps.append(json.loads(f'"{match.group(1)}"'))
+            self._position = match.end()
+            found = True
+        return found
 
 
 class PlanningFlow(BaseFlow):
@@ -18,9 +86,52 @@ class PlanningFlow(BaseFlow):
     llm: LLM = Field(default_factory=lambda: LLM())
     planning_tool: PlanningTool = Field(default_factory=PlanningTool)
     executor_keys: List[str] = Field(default_factory=list)
-    active_plan_id: str = Field(default_factory=lambda: f"plan_{int(time.time())}")
+    active_plan_id: str = Field(default_factory=lambda: f"plan_{uuid.uuid4().hex}")
     current_step_index: Optional[int] = None
 
+    # Best-of-N planning: number of concurrent candidate plans to request
+    plan_candidates: int = 1
+    plan_temperature: float = 0.7
+    plan_deadline: Optional[float] = None  # seconds to wait for more candidates
+    plan_accept_score: Optional[float] = None  # accept a candidate immediately
+    plan_preferred_steps: Tuple[int, int] = (3, 8)
+
+    # Reuse plans of earlier successful runs for similar requests
+    plan_library: Optional[PlanLibrary] = Field(
+        default_factory=lambda: plan_library if plan_library.enabled else None
+    )
+    _plan_request: Optional[str] = PrivateAttr(default=None)
+    _plan_match: Optional[PlanMatch] = PrivateAttr(default=None)
+    _failed_steps: int = PrivateAttr(default=0)
+
+    # Send executors the whole plan once, then only status changes and summaries
+    compact_plan_context: bool = Field(
+        default_factory=lambda: (config.planning_config or PlanningSettings()).compact_context
+    )
+    _plan_contexts: Dict[str, PlanContext] = PrivateAttr(default_factory=dict)
+
+    # Warm executors leased per step type; factories let the pool add more
+    executor_factories: Dict[str, Callable[[], BaseAgent]] = Field(default_factory=dict)
+    executor_pool: Optional[ExecutorPool] = None
+
+    # Results of earlier runs of the same request, reused for unchanged steps
+    step_cache: Optional[StepCache] = Field(default_factory=StepCache.from_config)
+    _request: Optional[str] = PrivateAttr(default=None)
+    _step_outputs: Dict[int, str] = PrivateAttr(default_factory=dict)
+
+    # Start executing steps while the plan is still being written
+    stream_plan: bool = Field(
+        default_factory=lambda: (config.planning_config or PlanningSettings()).stream_plan
+    )
+    _plan_stream: Optional[asyncio.Task] = PrivateAttr(default=None)
+    _plan_changed: asyncio.Event = PrivateAttr(default_factory=asyncio.Event)
+
+    # Send each step to the cheapest executor that has the tools it needs
+    route_steps: bool = Field(
+        default_factory=lambda: (config.planning_config or PlanningSettings()).route_steps
+    )
+    step_router: Optional[StepRouter] = None
+
     def __init__(
         self, agents: Union[BaseAgent, List[BaseAgent], Dict[str, BaseAgent]], **data
     ):
@@ -44,6 +155,23 @@ class PlanningFlow(BaseFlow):
         if not self.executor_keys:
             self.executor_keys = list(self.agents.keys())
 
+        settings = config.planning_config or PlanningSettings()
+        if self.executor_pool is None and (settings.executor_pool or self.executor_factories):
+            self.executor_pool = ExecutorPool(
+                self.executor_factories,
+                max_size=settings.pool_size,
+                max_idle_per_type=settings.pool_idle_per_type,
+                memory_limit_mb=settings.pool_memory_limit_mb,
+            )
+            for key, agent in self.agents.items():
+                self.executor_pool.add(key, agent)
+
+        if self.step_router is None and self.route_steps:
+            self.step_router = StepRouter(
+                CapabilityRegistry.from_agents(self.agents, self.executor_factories),
+                llm=self.llm if settings.route_with_llm else None,
+            )
+
     def get_executor(self, step_type: Optional[str] = None) -> BaseAgent:
         """
         Get an appropriate executor agent for the current step.
@@ -61,52 +189,235 @@ class PlanningFlow(BaseFlow):
         # Fallback to primary agent
         return self.primary_agent
 
+    def _executor_key(self, step_type: Optional[str]) -> Optional[str]:
+        """Key of the agent or factory that handles `step_type`, as in `get_executor`."""
+        if step_type and (step_type in self.agents or step_type in self.executor_factories):
+            return step_type
+        for key in self.executor_keys:
+            if key in self.agents:
+                return key
+        return self.primary_agent_key
+
+    @asynccontextmanager
+    async def _lease_executor(self, step_type: Optional[str]) -> AsyncIterator[BaseAgent]:
+        """Executor for one step: leased from the pool when there is one."""
+        if self.executor_pool is None:
+            yield self.get_executor(step_type)
+            return
+        async with self.executor_pool.lease(self._executor_key(step_type)) as executor:
+            yield executor
+
+    async def _route_step(self, step_info: dict) -> Optional[str]:
+        """Step type or executor key to pick the step's executor by."""
+        step_type = step_info.get("type")
+        if self.step_router is None or (
+            step_type and (step_type in self.agents or step_type in self.executor_factories)
+        ):
+            return step_type
+        return await self.step_router.route(step_info["text"], step_type) or step_type
+
+    async def cleanup(self) -> None:
+        """Release the pooled executors and their tools."""
+        if self.executor_pool is not None:
+            await self.executor_pool.close()
+
     async def execute(self, input_text: str) -> str:
         """Execute the planning flow with agents."""
+        self.run_id = current_usage_tags().get("run_id") or new_run_id()
+        self.stop_reason = None
+        token = self.cancel_token or current_cancel_token()
+        with usage_context(run_id=self.run_id, plan_id=self.active_plan_id), tracer.span(
+            "flow.run", run_id=self.run_id, plan_id=self.active_plan_id
+        ), budget_context(
+            self.budget or current_budget(), self.run_id
+        ), token.bind() if token else nullcontext():
+            try:
+                return await self._execute(input_text)
+            except asyncio.CancelledError:
+                if not (token and token.cancelled):
+                    raise
+                # Cancelled outside an executor step, e.g. while planning
+                absorb_cancellation()
+                self.stop_reason = f"cancelled: {token.reason}"
+                logger.warning(f"🛑 Stopping plan {self.active_plan_id}: {self.stop_reason}")
+                return f"Stopped: Cancelled ({token.reason})"
+            finally:
+                metrics.finish_run(self.run_id)
+                if self.checkpointer:
+                    await self.checkpointer.flush()
+
+    async def resume(self, run_id: str) -> str:
+        """Continue a checkpointed run after its last completed step."""
+        if not self.checkpointer:
+            raise ValueError("Cannot resume without a checkpointer")
+        snapshot = self.checkpointer.load(run_id)
+        if snapshot is None or snapshot.get("kind") != "flow":
+            raise ValueError(f"No flow checkpoint found for run {run_id}")
+
+        self.restore_checkpoint(snapshot["state"])
+        logger.info(f"Resuming run {run_id} at plan {self.active_plan_id}")
+        with usage_context(run_id=run_id):
+            return await self.execute("")
+
+    def checkpoint_state(self) -> dict:
+        state = super().checkpoint_state()
+        state.update(
+            active_plan_id=self.active_plan_id,
+            current_step_index=self.current_step_index,
+            planning_tool=self.planning_tool.checkpoint_state(),
+            request=self._request,
+            step_outputs=dict(self._step_outputs),
+        )
+        return state
+
+    def restore_checkpoint(self, state: dict) -> None:
+        super().restore_checkpoint(state)
+        self.active_plan_id = state.get("active_plan_id", self.active_plan_id)
+        self.current_step_index = state.get("current_step_index")
+        self.planning_tool.restore_checkpoint(state.get("planning_tool", {}))
+        self._request = state.get("request")
+        # JSON turns the integer step indexes into strings
+        self._step_outputs = {int(i): d for i, d in state.get("step_outputs", {}).items()}
+
+    async def _execute(self, input_text: str) -> str:
+        """Create the plan and run its steps until it is complete."""
         try:
             if not self.primary_agent:
                 raise ValueError("No primary agent available")
 
             # Create initial plan if input provided
             if input_text:
-                await self._create_initial_plan(input_text)
+                with tracer.span("flow.plan", candidates=self.plan_candidates):
+                    await self._create_initial_plan(input_text)
 
                 # Verify plan was created successfully
-                if self.active_plan_id not in self.planning_tool.plans:
+                if not self.planning_tool.has_plan(self.active_plan_id):
                     logger.error(
                         f"Plan creation failed. Plan ID {self.active_plan_id} not found in planning tool."
                     )
                     return f"Failed to create plan for: {input_text}"
+                self.save_checkpoint()
 
             result = ""
+            token = current_cancel_token()
             while True:
+                if token and token.cancelled:
+                    self.stop_reason = f"cancelled: {token.reason}"
+                    logger.warning(f"🛑 Stopping plan {self.active_plan_id}: {self.stop_reason}")
+                    result += f"Stopped: Cancelled ({token.reason})\n"
+                    result += await self._get_plan_text()
+                    break
+
+                budget = current_budget()
+                reason = budget.exhausted_reason() if budget else None
+                if reason:
+                    self.stop_reason = f"budget exhausted: {reason}"
+                    logger.warning(f"🛑 Stopping plan {self.active_plan_id}: {self.stop_reason}")
+                    result += f"Stopped: Budget exhausted ({reason})\n"
+                    result += await self._get_plan_text()
+                    break
+
                 # Get current step to execute
                 self.current_step_index, step_info = await self._get_current_step_info()
 
+                # Wait for more steps while the plan is still streaming
+                if self.current_step_index is None and self._plan_streaming():
+                    await self._wait_for_plan_change()
+                    continue
+
                 # Exit if no more steps or plan completed
                 if self.current_step_index is None:
+                    self.stop_reason = "plan completed"
+                    self._record_plan_outcome()
                     result += await self._finalize_plan()
                     break
 
+                # Serve an unchanged step from the step cache
+                step_info["cache_key"] = self._step_cache_key(step_info)
+                step_result = await self._cached_step_result(step_info)
+                if step_result is not None:
+                    result += step_result + "\n"
+                    self.save_checkpoint()
+                    continue
+
                 # Execute current step with appropriate agent
-                step_type = step_info.get("type") if step_info else None
-                executor = self.get_executor(step_type)
-                step_result = await self._execute_step(executor, step_info)
+                step_type = await self._route_step(step_info)
+                async with self._lease_executor(step_type) as executor:
+                    step_result = await self._execute_step(executor, step_info)
+                    finished = getattr(executor, "state", None) == AgentState.FINISHED
                 result += step_result + "\n"
+                self.save_checkpoint()
 
                 # Check if agent wants to terminate
-                if hasattr(executor, "state") and executor.state == AgentState.FINISHED:
+                if finished:
                     break
 
             return result
         except Exception as e:
             logger.error(f"Error in PlanningFlow: {str(e)}")
             return f"Execution failed: {str(e)}"
+        finally:
+            if self._plan_stream is not None:
+                self._plan_stream.cancel()
+                self._plan_stream = None
 
     async def _create_initial_plan(self, request: str) -> None:
         """Create an initial plan based on the request using the flow's LLM and PlanningTool."""
         logger.info(f"Creating initial plan with ID: {self.active_plan_id}")
+        self._plan_request, self._failed_steps = request, 0
+        self._request, self._step_outputs = request, {}
+
+        cached_plan = self.step_cache.get_plan(request) if self.step_cache else None
+        self._plan_match = (
+            self.plan_library.lookup(request) if self.plan_library and not cached_plan else None
+        )
+        if cached_plan:
+            logger.info("♻️ Reusing the plan of an earlier run of this request")
+            args = {"command": "create", "title": cached_plan["title"], "steps": cached_plan["steps"]}
+        elif self._plan_match:
+            args = {
+                "command": "create",
+                "title": self._plan_match.title,
+                "steps": self._plan_match.steps,
+            }
+        elif self.plan_candidates > 1:
+            args = await self._select_best_plan(request)
+        elif self.stream_plan:
+            started, args = await self._start_plan_stream(request)
+            if started:
+                return
+        else:
+            args = await self._request_plan(request)
+
+        if args:
+            # Ensure plan_id is set correctly and execute the tool
+            args["plan_id"] = self.active_plan_id
+
+            # Execute the tool via ToolCollection instead of directly
+            result = await self.planning_tool.execute(**args)
+
+            logger.info(f"Plan creation result: {str(result)}")
+            if self.step_cache and not cached_plan:
+                self.step_cache.put_plan(request, args.get("title", ""), args.get("steps") or [])
+            return
+
+        # If execution reached here, create a default plan
+        logger.warning("Creating default plan")
 
+        # Create default plan using the ToolCollection
+        await self.planning_tool.execute(
+            **{
+                "command": "create",
+                "plan_id": self.active_plan_id,
+                "title": f"Plan for: {request[:50]}{'...' if len(request) > 50 else ''}",
+                "steps": ["Analyze request", "Execute task", "Verify results"],
+            }
+        )
+
+    async def _request_plan(
+        self, request: str, temperature: Optional[float] = None, stream: bool = False
+    ) -> Optional[dict]:
+        """Ask the LLM for a plan and return the planning tool arguments, if any."""
         # Create a system message for plan creation
         system_message = Message.system_message(
             "You are a planning assistant. Create a concise, actionable plan with clear steps. "
@@ -120,12 +431,15 @@ class PlanningFlow(BaseFlow):
         )
 
         # Call LLM with PlanningTool
-        response = await self.llm.ask_tool(
-            messages=[user_message],
-            system_msgs=[system_message],
-            tools=[self.planning_tool.to_param()],
-            tool_choice=ToolChoice.REQUIRED,
-        )
+        with usage_context(agent="flow", call_role="plan"):
+            response = await self.llm.ask_tool(
+                messages=[user_message],
+                system_msgs=[system_message],
+                tools=[self.planning_tool.to_param()],
+                tool_choice=ToolChoice.REQUIRED,
+                temperature=temperature,
+                stream=stream,
+            )
 
         # Process tool calls if present
         if response.tool_calls:
@@ -139,97 +453,240 @@ class PlanningFlow(BaseFlow):
                         except json.JSONDecodeError:
                             logger.error(f"Failed to parse tool arguments: {args}")
                             continue
+                    return args
 
-                    # Ensure plan_id is set correctly and execute the tool
-                    args["plan_id"] = self.active_plan_id
+        return None
 
-                    # Execute the tool via ToolCollection instead of directly
-                    result = await self.planning_tool.execute(**args)
+    async def _start_plan_stream(self, request: str) -> Tuple[bool, Optional[dict]]:
+        """
+        Stream the planning call until its first step is final.
 
-                    logger.info(f"Plan creation result: {str(result)}")
-                    return
+        Returns ``(True, None)`` once the plan exists with at least one step;
+        the rest of the plan keeps streaming in the background. If the
+        response ends before any step is final, returns ``(False, args)``
+        with whatever arguments it produced.
+        """
+        ready = asyncio.get_running_loop().create_future()
+        self._plan_changed.clear()
+        stream = asyncio.create_task(self._consume_plan_stream(request, ready))
+        await asyncio.wait({stream, ready}, return_when=asyncio.FIRST_COMPLETED)
+        if ready.done():
+            self._plan_stream = stream
+            return True, None
+        return False, stream.result()
+
+    async def _consume_plan_stream(self, request: str, ready: asyncio.Future) -> Optional[dict]:
+        """Stream the plan, adding steps to it as they become final.
+
+        When the response is complete, the plan is reconciled with the final
+        arguments: steps that were revised are reset, so they run again.
+        """
+        parser = PlanStreamParser()
+        title = f"Plan for: {request[:50]}{'...' if len(request) > 50 else ''}"
 
-        # If execution reached here, create a default plan
-        logger.warning("Creating default plan")
+        async def on_delta(event: StreamEvent) -> None:
+            if event.data.get("name") != "planning" or not parser.feed(event.content):
+                return
+            command = "update" if ready.done() else "create"
+            await self.planning_tool.execute(
+                command=command,
+                plan_id=self.active_plan_id,
+                title=parser.title or title,
+                steps=list(parser.steps),
+            )
+            if not ready.done():
+                logger.info(f"⚡ Starting on the plan while it streams: {parser.steps[0]}")
+                ready.set_result(True)
+            self._plan_changed.set()
 
-        # Create default plan using the ToolCollection
-        await self.planning_tool.execute(
-            **{
-                "command": "create",
-                "plan_id": self.active_plan_id,
-                "title": f"Plan for: {request[:50]}{'...' if len(request) > 50 else ''}",
-                "steps": ["Analyze request", "Execute task", "Verify results"],
-            }
+        try:
+            with event_sink_context(TapSink(get_event_sink(), on_delta)):
+                args = await self._request_plan(request, stream=True)
+        finally:
+            self._plan_changed.set()
+
+        if not ready.done():
+            return args
+        if args and args.get("steps"):
+            if args["steps"] != parser.steps:
+                logger.info("Plan revised at the end of the stream; reconciling steps")
+            await self.planning_tool.execute(
+                command="update",
+                plan_id=self.active_plan_id,
+                title=args.get("title") or parser.title or title,
+                steps=args["steps"],
+            )
+        plan = self.planning_tool.get_plan_data(self.active_plan_id)
+        logger.info(f"Plan streamed with {len(plan['steps'])} steps")
+        if self.step_cache:
+            self.step_cache.put_plan(request, plan["title"], plan["steps"])
+        self._plan_changed.set()
+        return args
+
+    def _step_revised(self, step_info: dict) -> bool:
+        """Whether the plan's text for the current step no longer matches the step that ran."""
+        if self._plan_stream is None:
+            return False
+        steps = self.planning_tool.get_plan_data(self.active_plan_id)["steps"]
+        return (
+            self.current_step_index >= len(steps)
+            or steps[self.current_step_index] != step_info.get("text")
+        )
+
+    def _plan_streaming(self) -> bool:
+        return self._plan_stream is not None and not self._plan_stream.done()
+
+    async def _wait_for_plan_change(self) -> None:
+        """Block until the streaming plan gains steps or the stream ends."""
+        changed = asyncio.create_task(self._plan_changed.wait())
+        try:
+            await asyncio.wait(
+                {changed, self._plan_stream}, return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            changed.cancel()
+        self._plan_changed.clear()
+        if self._plan_stream.done() and not self._plan_stream.cancelled():
+            error = self._plan_stream.exception()
+            if error is not None:
+                logger.warning(f"Plan stream failed, continuing with the steps received: {error}")
+
+    async def _select_best_plan(self, request: str) -> Optional[dict]:
+        """
+        Request several candidate plans concurrently and keep the best-scoring one.
+
+        Candidates are collected until all have arrived, a candidate reaches
+        `plan_accept_score`, or `plan_deadline` expires with at least one valid
+        plan in hand. Outstanding requests are cancelled once a plan is chosen.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = (
+            loop.time() + self.plan_deadline if self.plan_deadline is not None else None
+        )
+        pending = {
+            asyncio.create_task(
+                self._request_plan(request, temperature=self.plan_temperature)
+            )
+            for _ in range(self.plan_candidates)
+        }
+
+        best_args, best_score, received = None, float("-inf"), 0
+        try:
+            while pending:
+                timeout = None
+                if deadline is not None:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        if best_args is not None:
+                            break
+                        # Past the deadline without a usable plan: take the next one
+                        timeout = None
+
+                done, pending = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is not None:
+                        logger.warning(f"Plan candidate failed: {task.exception()}")
+                        continue
+                    args = task.result()
+                    if not args:
+                        continue
+                    received += 1
+                    score = self._score_plan(args.get("steps"))
+                    if score > best_score:
+                        best_args, best_score = args, score
+
+                if (
+                    best_args is not None
+                    and self.plan_accept_score is not None
+                    and best_score >= self.plan_accept_score
+                ):
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if best_args is not None:
+            logger.info(
+                f"Selected plan with score {best_score:.2f} from {received}/{self.plan_candidates} candidates"
+            )
+        return best_args
+
+    def _score_plan(self, steps: Optional[List[str]]) -> float:
+        """
+        Score a candidate plan with a cheap local heuristic in the range [0, 1].
+
+        Rewards a moderate number of steps, penalises duplicate or near-empty
+        steps and gives credit for `[TYPE]` tags that map to an available executor.
+        """
+        if not steps or not isinstance(steps, list):
+            return 0.0
+        steps = [str(step).strip() for step in steps]
+        count = len(steps)
+
+        # Step count: full marks within the preferred range, decaying outside it
+        low, high = self.plan_preferred_steps
+        if count < low:
+            count_score = count / low
+        elif count > high:
+            count_score = high / count
+        else:
+            count_score = 1.0
+
+        # Duplicates and steps too short to be actionable
+        normalized = [re.sub(r"\W+", " ", step.lower()).strip() for step in steps]
+        unique_ratio = len(set(normalized)) / count
+        substantive_ratio = sum(1 for step in normalized if len(step.split()) >= 2) / count
+
+        # Step-type coverage: typed steps that an executor can handle
+        typed = [re.search(r"\[([A-Z_]+)\]", step) for step in steps]
+        typed = [match.group(1).lower() for match in typed if match]
+        if typed:
+            coverage = sum(1 for step_type in typed if step_type in self.agents) / len(typed)
+        else:
+            coverage = 0.5
+
+        return (
+            0.35 * count_score
+            + 0.3 * unique_ratio
+            + 0.2 * substantive_ratio
+            + 0.15 * coverage
         )
 
     async def _get_current_step_info(self) -> tuple[Optional[int], Optional[dict]]:
         """
-        Parse the current plan to identify the first non-completed step's index and info.
+        Mark the first non-completed step of the plan as in progress and return its index and info.
         Returns (None, None) if no active step is found.
         """
-        if (
-            not self.active_plan_id
-            or self.active_plan_id not in self.planning_tool.plans
-        ):
+        if not self.planning_tool.has_plan(self.active_plan_id):
             logger.error(f"Plan with ID {self.active_plan_id} not found")
             return None, None
 
         try:
-            # Direct access to plan data from planning tool storage
-            plan_data = self.planning_tool.plans[self.active_plan_id]
-            steps = plan_data.get("steps", [])
-            step_statuses = plan_data.get("step_statuses", [])
-
-            # Find first non-completed step
-            for i, step in enumerate(steps):
-                if i >= len(step_statuses):
-                    status = PlanStepStatus.NOT_STARTED.value
-                else:
-                    status = step_statuses[i]
-
-                if status in PlanStepStatus.get_active_statuses():
-                    # Extract step type/category if available
-                    step_info = {"text": step}
-
-                    # Try to extract step type from the text (e.g., [SEARCH] or [CODE])
-                    import re
-
-                    type_match = re.search(r"\[([A-Z_]+)\]", step)
-                    if type_match:
-                        step_info["type"] = type_match.group(1).lower()
-
-                    # Mark current step as in_progress
-                    try:
-                        await self.planning_tool.execute(
-                            command="mark_step",
-                            plan_id=self.active_plan_id,
-                            step_index=i,
-                            step_status=PlanStepStatus.IN_PROGRESS.value,
-                        )
-                    except Exception as e:
-                        logger.warning(f"Error marking step as in_progress: {e}")
-                        # Update step status directly if needed
-                        if i < len(step_statuses):
-                            step_statuses[i] = PlanStepStatus.IN_PROGRESS.value
-                        else:
-                            while len(step_statuses) < i:
-                                step_statuses.append(PlanStepStatus.NOT_STARTED.value)
-                            step_statuses.append(PlanStepStatus.IN_PROGRESS.value)
-
-                        plan_data["step_statuses"] = step_statuses
-
-                    return i, step_info
-
-            return None, None  # No active step found
-
+            step = self.planning_tool.start_next_step(self.active_plan_id)
         except Exception as e:
             logger.warning(f"Error finding current step index: {e}")
             return None, None
+        if step is None:
+            return None, None  # No active step found
+
+        index, text = step
+        step_info = {"text": text}
+
+        # Try to extract step type from the text (e.g., [SEARCH] or [CODE])
+        type_match = re.search(r"\[([A-Z_]+)\]", text)
+        if type_match:
+            step_info["type"] = type_match.group(1).lower()
+        return index, step_info
 
     async def _execute_step(self, executor: BaseAgent, step_info: dict) -> str:
         """Execute the current step with the specified agent using agent.run()."""
         # Prepare context for the agent with current plan status
-        plan_status = await self._get_plan_text()
+        if self.compact_plan_context:
+            plan_status = self._get_plan_context(executor)
+        else:
+            plan_status = await self._get_plan_text()
         step_text = step_info.get("text", f"Step {self.current_step_index}")
 
         # Create a prompt for the agent to execute the current step
@@ -245,7 +702,27 @@ class PlanningFlow(BaseFlow):
 
         # Use agent.run() to execute the step
         try:
-            step_result = await executor.run(step_prompt)
+            with usage_context(plan_step=self.current_step_index), tracer.span(
+                "flow.step", step=self.current_step_index, executor=executor.name
+            ), metrics.step(executor.name, step_info.get("type")) as step_metrics:
+                step_result = await executor.run(step_prompt)
+                interrupted = self._step_interrupted(executor)
+                if interrupted:
+                    step_metrics.status = "incomplete"
+                elif (executor.stop_reason or "").startswith(FAILED_STEP_REASONS):
+                    step_metrics.status = "failed"
+
+            # A step cut short by the flow's budget or a cancel is left open for a resumed run
+            if interrupted:
+                return step_result
+            # A step revised by the streaming plan while it ran is run again
+            if self._step_revised(step_info):
+                logger.info(f"Step {self.current_step_index} was revised while it ran; rerunning it")
+                return step_result
+            failed = (executor.stop_reason or "").startswith(FAILED_STEP_REASONS)
+            if failed:
+                self._failed_steps += 1
+            self._record_step_output(step_info, step_result, cache=not failed)
 
             # Mark the step as completed after successful execution
             await self._mark_step_completed()
@@ -253,46 +730,102 @@ class PlanningFlow(BaseFlow):
             return step_result
         except Exception as e:
             logger.error(f"Error executing step {self.current_step_index}: {e}")
+            self._failed_steps += 1
             return f"Error executing step {self.current_step_index}: {str(e)}"
 
+    @staticmethod
+    def _step_interrupted(executor: BaseAgent) -> bool:
+        """Whether a cancel or the flow's budget, not the executor's own budget, stopped the step."""
+        stop_reason = executor.stop_reason or ""
+        if stop_reason.startswith("cancelled"):
+            return True
+        budget = current_budget()
+        return stop_reason.startswith("budget exhausted") and bool(
+            budget and budget.exhausted_reason()
+        )
+
+    def _record_plan_outcome(self) -> None:
+        """Tell the plan library whether the plan worked, once per planned request."""
+        if not (self.plan_library and self._plan_request):
+            return
+        request, self._plan_request = self._plan_request, None
+        try:
+            if self._failed_steps:
+                if self._plan_match:
+                    self.plan_library.record_failure(self._plan_match)
+                return
+            plan = self.planning_tool.get_plan_data(self.active_plan_id)
+            if plan:
+                self.plan_library.record_success(
+                    request, plan["title"], plan["steps"], self._plan_match
+                )
+        except Exception as e:
+            logger.warning(f"Failed to update the plan library: {e}")
+
+    def _step_cache_key(self, step_info: dict) -> Optional[str]:
+        """Step cache key of the current step, or None if it cannot be addressed."""
+        if not (self.step_cache and self._request):
+            return None
+        dependencies = step_dependencies(self.current_step_index, step_info["text"])
+        outputs = [self._step_outputs.get(index) for index in dependencies]
+        if None in outputs:
+            return None  # a dependency ran before the cache was in use
+        return StepCache.step_key(self._request, step_info["text"], step_info.get("type"), outputs)
+
+    async def _cached_step_result(self, step_info: dict) -> Optional[str]:
+        """Complete the current step from the step cache, returning its stored result."""
+        key = step_info.get("cache_key")
+        result = self.step_cache.get_step(key) if key else None
+        if result is None:
+            return None
+        logger.info(f"♻️ Step {self.current_step_index} unchanged, using its cached result")
+        with usage_context(plan_step=self.current_step_index):
+            metrics.record_cached("step_cache", step_info.get("type"))
+        self._record_step_output(step_info, result, cache=False)
+        await self._mark_step_completed()
+        return result
+
+    def _record_step_output(self, step_info: dict, result: str, cache: bool) -> None:
+        """Note a finished step's output for dependent steps, prompts and the step cache."""
+        self._step_outputs[self.current_step_index] = StepCache.output_digest(result)
+        for context in self._plan_contexts.values():
+            context.record_result(self.current_step_index, result)
+        key = step_info.get("cache_key")
+        if cache and key:
+            self.step_cache.put_step(key, step_info["text"], result)
+
+    def _get_plan_context(self, executor: BaseAgent) -> str:
+        """Plan status for an executor: the whole plan once, then the changes since its last step."""
+        context = self._plan_contexts.get(executor.name)
+        if context is None or context.plan_id != self.active_plan_id:
+            context = PlanContext(self.planning_tool, self.active_plan_id)
+            self._plan_contexts[executor.name] = context
+        elif not context.seen_by(executor.memory.messages):
+            # A fresh or compacted memory lost the full plan
+            context.reset()
+        return context.render()
+
     async def _mark_step_completed(self) -> None:
         """Mark the current step as completed."""
         if self.current_step_index is None:
             return
 
         try:
-            # Mark the step as completed
-            await self.planning_tool.execute(
-                command="mark_step",
-                plan_id=self.active_plan_id,
-                step_index=self.current_step_index,
-                step_status=PlanStepStatus.COMPLETED.value,
+            self.planning_tool.set_step_status(
+                self.active_plan_id,
+                self.current_step_index,
+                PlanStepStatus.COMPLETED.value,
             )
             logger.info(
                 f"Marked step {self.current_step_index} as completed in plan {self.active_plan_id}"
             )
         except Exception as e:
             logger.warning(f"Failed to update plan status: {e}")
-            # Update step status directly in planning tool storage
-            if self.active_plan_id in self.planning_tool.plans:
-                plan_data = self.planning_tool.plans[self.active_plan_id]
-                step_statuses = plan_data.get("step_statuses", [])
-
-                # Ensure the step_statuses list is long enough
-                while len(step_statuses) <= self.current_step_index:
-                    step_statuses.append(PlanStepStatus.NOT_STARTED.value)
-
-                # Update the status
-                step_statuses[self.current_step_index] = PlanStepStatus.COMPLETED.value
-                plan_data["step_statuses"] = step_statuses
 
     async def _get_plan_text(self) -> str:
         """Get the current plan as formatted text."""
         try:
-            result = await self.planning_tool.execute(
-                command="get", plan_id=self.active_plan_id
-            )
-            return result.output if hasattr(result, "output") else str(result)
+            return self.planning_tool.format_plan(self.active_plan_id)
         except Exception as e:
             logger.error(f"Error getting plan: {e}")
             return self._generate_plan_text_from_storage()
@@ -300,10 +833,10 @@ class PlanningFlow(BaseFlow):
     def _generate_plan_text_from_storage(self) -> str:
         """Generate plan text directly from storage if the planning tool fails."""
         try:
-            if self.active_plan_id not in self.planning_tool.plans:
+            plan_data = self.planning_tool.get_plan_data(self.active_plan_id)
+            if plan_data is None:
                 return f"Error: Plan with ID {self.active_plan_id} not found"
 
-            plan_data = self.planning_tool.plans[self.active_plan_id]
             title = plan_data.get("title", "Untitled Plan")
             steps = plan_data.get("steps", [])
             step_statuses = plan_data.get("step_statuses", [])
@@ -369,9 +902,10 @@ class PlanningFlow(BaseFlow):
                 f"The plan has been completed. Here is the final plan status:\n\n{plan_text}\n\nPlease provide a summary of what was accomplished and any final thoughts."
             )
 
-            response = await self.llm.ask(
-                messages=[user_message], system_msgs=[system_message]
-            )
+            with usage_context(agent="flow", call_role="summary"):
+                response = await self.llm.ask(
+                    messages=[user_message], system_msgs=[system_message]
+                )
 
             return f"Plan completed:\n\n{response}"
         except Exception as e:
@@ -0,0 +1,232 @@
+"""Route plan steps to the cheapest executor whose tools can do them."""
+import re
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from app.agent.base import BaseAgent
+from app.llm import LLM
+from app.logger import logger
+from app.schema import Message
+from app.usage import usage_context
+
+
+# Relative cost of having a tool in an executor: browsers are slow to start
+# and hold a lot of memory, a Python process is cheap, the rest are nearly free
+TOOL_COSTS: Dict[str, float] = {
+    "browser_use": 10.0,
+    "bash": 3.0,
+    "execute_command": 3.0,
+    "python_execute": 2.0,
+    "str_replace_editor": 1.0,
+    "web_search": 1.0,
+    "file_saver": 0.5,
+    "read_artifact": 0.2,
+}
+DEFAULT_TOOL_COST = 1.0
+
+# Tools every executor has and no step needs to ask for
+_IMPLICIT_TOOLS = frozenset({"terminate", "planning", "create_chat_completion"})
+
+# `[TYPE]` tags of plan steps that name what a step needs
+TYPE_TOOLS: Dict[str, FrozenSet[str]] = {
+    "search": frozenset({"web_search"}),
+    "code": frozenset({"python_execute"}),
+    "python": frozenset({"python_execute"}),
+    "browse": frozenset({"browser_use"}),
+    "browser": frozenset({"browser_use"}),
+    "web": frozenset({"browser_use"}),
+    "file": frozenset({"file_saver"}),
+    "save": frozenset({"file_saver"}),
+    "shell": frozenset({"bash"}),
+    "edit": frozenset({"str_replace_editor"}),
+}
+
+# Words that show a step needs a tool
+_TOOL_HINTS: Dict[str, re.Pattern] = {
+    "browser_use": re.compile(
+        r"https?://|\b(browse|navigate|click|log ?in|sign in|scrape|screenshot|web ?page|"
+        r"website|open the (page|site|url|link)|fill (in|out) (the )?form)",
+        re.IGNORECASE,
+    ),
+    "web_search": re.compile(
+        r"\b(search|look up|google|find (information|sources|articles)|latest news|"
+        r"research online)",
+        re.IGNORECASE,
+    ),
+    "python_execute": re.compile(
+        r"\b(calculate|compute|python|script|plot|chart|graph|dataframe|pandas|numpy|"
+        r"statistic|regression|simulate|parse|convert|sort|count|csv|json|"
+        r"analy[sz]e (the )?(data|numbers|results))",
+        re.IGNORECASE,
+    ),
+    "file_saver": re.compile(
+        r"\b(save|write (it |the \w+ )?(to|into) (a )?file|export|store (it|the \w+) (in|to))\b",
+        re.IGNORECASE,
+    ),
+    "bash": re.compile(
+        r"\b(shell|terminal|command line|install|run (the )?tests|git|pip|npm)\b",
+        re.IGNORECASE,
+    ),
+    "str_replace_editor": re.compile(
+        r"\b(edit|modify|refactor|patch) (the )?(file|code|source|function)", re.IGNORECASE
+    ),
+}
+
+ROUTE_PROMPT = (
+    "Which tools does this task step need? Available tools: {tools}.\n"
+    "Step: {step}\n"
+    "Answer with the tool names only, separated by commas, or 'none' if it needs no tools."
+)
+
+
+class ExecutorProfile(BaseModel):
+    """What an executor can do and what a step on it costs."""
+
+    key: str
+    tools: FrozenSet[str]
+    cost: float
+
+
+class StepNeeds(BaseModel):
+    """Tools a step needs, and how that was decided."""
+
+    tools: FrozenSet[str]
+    source: str  # "tag", "rules" or "llm"
+    ambiguous: bool = False
+
+
+class CapabilityRegistry:
+    """
+    Executors indexed by the tools they have.
+
+    Each executor is registered with its tool names and a cost per step:
+    the agent's `step_cost` if set, else the sum of `TOOL_COSTS` of its
+    tools, so an executor with a browser costs more than one without.
+    """
+
+    def __init__(self):
+        self.profiles: Dict[str, ExecutorProfile] = {}
+        self._by_tool: Dict[str, List[str]] = {}
+
+    @classmethod
+    def from_agents(
+        cls,
+        agents: Dict[str, BaseAgent],
+        factories: Optional[Dict[str, Callable[[], BaseAgent]]] = None,
+    ) -> "CapabilityRegistry":
+        registry = cls()
+        for key, agent in agents.items():
+            registry.register_agent(key, agent)
+        for key, factory in (factories or {}).items():
+            if key not in registry.profiles:
+                # Building an agent only creates its tool objects; nothing is started
+                registry.register_agent(key, factory())
+        return registry
+
+    def register_agent(self, key: str, agent: BaseAgent) -> ExecutorProfile:
+        return self.register(key, agent.tool_names, agent.step_cost)
+
+    def register(
+        self, key: str, tools: Iterable[str], cost: Optional[float] = None
+    ) -> ExecutorProfile:
+        tools = frozenset(tools) - _IMPLICIT_TOOLS
+        if cost is None:
+            cost = sum(TOOL_COSTS.get(tool, DEFAULT_TOOL_COST) for tool in tools)
+        profile = ExecutorProfile(key=key, tools=tools, cost=cost)
+        self.profiles[key] = profile
+        self._by_tool = {}
+        for candidate in self.profiles.values():
+            for tool in candidate.tools:
+                self._by_tool.setdefault(tool, []).append(candidate.key)
+        return profile
+
+    @property
+    def tools(self) -> FrozenSet[str]:
+        """Every tool some executor has."""
+        return frozenset(self._by_tool)
+
+    def capable(self, tools: FrozenSet[str]) -> List[ExecutorProfile]:
+        """Executors that have all of `tools`, cheapest first."""
+        if not tools:
+            keys = set(self.profiles)
+        else:
+            keys = set.intersection(*(set(self._by_tool.get(tool, ())) for tool in tools))
+        return sorted((self.profiles[key] for key in keys), key=lambda p: (p.cost, p.key))
+
+
+def classify_step(text: str, step_type: Optional[str] = None) -> StepNeeds:
+    """Decide from the step's tag and wording which tools it needs, without an LLM.
+
+    A known `[TYPE]` tag decides on its own. Otherwise every tool whose
+    hints appear in the text is needed; a step matching no hints is ambiguous.
+    """
+    if step_type and step_type in TYPE_TOOLS:
+        return StepNeeds(tools=TYPE_TOOLS[step_type], source="tag")
+    tools = frozenset(tool for tool, hints in _TOOL_HINTS.items() if hints.search(text))
+    return StepNeeds(tools=tools, source="rules", ambiguous=not tools)
+
+
+class StepRouter:
+    """
+    Picks the executor for each plan step by the tools it needs.
+
+    Steps are classified by `classify_step`; only steps it finds ambiguous
+    are sent to `llm`, if given, and its answers are cached by step text.
+    The cheapest executor that has every needed tool runs the step. Steps
+    whose needs no single executor covers go to the executor covering most
+    of them, cheapest first; steps that stay ambiguous are not routed.
+    """
+
+    def __init__(self, registry: CapabilityRegistry, llm: Optional[LLM] = None):
+        self.registry = registry
+        self.llm = llm
+        self._llm_answers: Dict[str, FrozenSet[str]] = {}
+
+    async def route(self, text: str, step_type: Optional[str] = None) -> Optional[str]:
+        """Key of the executor for a step, or None if its needs are unknown."""
+        needs = await self.needs(text, step_type)
+        if needs.ambiguous:
+            return None
+        executor = self._cheapest(needs.tools)
+        if executor is not None:
+            logger.info(
+                f"🧭 Routing step to {executor} (needs {', '.join(sorted(needs.tools)) or 'no tools'}, "
+                f"by {needs.source})"
+            )
+        return executor
+
+    async def needs(self, text: str, step_type: Optional[str] = None) -> StepNeeds:
+        needs = classify_step(text, step_type)
+        if needs.ambiguous and self.llm is not None:
+            tools = await self._ask_llm(text)
+            if tools is not None:
+                return StepNeeds(tools=tools, source="llm")
+        return needs
+
+    def _cheapest(self, tools: FrozenSet[str]) -> Optional[str]:
+        capable = self.registry.capable(tools)
+        if capable:
+            return capable[0].key
+        # Nobody has everything: take the best partial match
+        best: Optional[Tuple[int, float, str]] = None
+        for profile in self.registry.profiles.values():
+            rank = (-len(tools & profile.tools), profile.cost, profile.key)
+            if best is None or rank < best:
+                best = rank
+        return best[2] if best else None
+
+    async def _ask_llm(self, text: str) -> Optional[FrozenSet[str]]:
+        if text in self._llm_answers:
+            return self._llm_answers[text]
+        known = self.registry.tools
+        prompt = ROUTE_PROMPT.format(tools=", ".join(sorted(known)), step=text)
+        try:
+            with usage_context(agent="flow", call_role="route"):
+                answer = await self.llm.ask([Message.user_message(prompt)], stream=False)
+        except Exception as e:
+            logger.warning(f"Step classification by the LLM failed: {e}")
+            return None
+        tools = frozenset(name for name in re.findall(r"[a-z_]+", answer.lower()) if name in known)
+        self._llm_answers[text] = tools
+        return tools
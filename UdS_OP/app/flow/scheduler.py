@@ -0,0 +1,239 @@
+"""Run queue for concurrent flows with priorities, fair resource sharing and SLO tracking."""
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+from pydantic import BaseModel
+
+from app.agent.base import BaseAgent
+from app.config import SchedulerSettings, config
+from app.exceptions import FlowRejected
+from app.fair_share import FairResource, FlowTicket, llm_tokens, share_context
+from app.flow.base import BaseFlow
+from app.logger import logger
+from app.usage import current_usage_tags, new_run_id, usage_context
+
+
+class SloReport(BaseModel):
+    """Latency of finished flows against their SLOs."""
+
+    finished: int = 0
+    failed: int = 0
+    rejected: int = 0
+    with_slo: int = 0
+    slo_met: int = 0
+    p50_latency: float = 0.0
+    p95_latency: float = 0.0
+    mean_queue_wait: float = 0.0
+
+    @property
+    def attainment(self) -> float:
+        """Fraction of flows with an SLO that met it."""
+        return self.slo_met / self.with_slo if self.with_slo else 1.0
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class FlowScheduler:
+    """
+    Admits flows into a run queue and shares LLM and tool capacity between them.
+
+    At most `max_running` flows run at once; the rest wait in a queue ordered
+    by priority, then submission. While they run, every LLM call of a flow
+    takes one of `llm_slots`, every browser action one of `browser_slots`
+    and every Python run one of `process_slots`. Contended slots go to the
+    highest-priority waiter, and among equals to the flow that has used the
+    least of the resource for its weight: LLM tokens for LLM slots, seconds
+    held for the others. A flow with weight 2 thus gets about twice the
+    tokens of a flow with weight 1 when both are waiting.
+
+    Under overload new flows are refused with `FlowRejected`: when the queue
+    already holds `max_queued` flows (a higher-priority flow instead sheds the
+    lowest-priority queued one), or when the expected queue wait alone would
+    exceed the flow's SLO. Latency from submission to result is tracked
+    against each flow's SLO; see `slo_report`.
+
+    Agents can be submitted too and are scheduled like a flow of one agent;
+    `BatchRunner` submits its tasks this way when given a scheduler.
+    """
+
+    def __init__(
+        self,
+        max_running: int = 4,
+        max_queued: int = 16,
+        llm_slots: int = 4,
+        browser_slots: int = 1,
+        process_slots: int = 2,
+        default_slo: Optional[float] = None,
+    ):
+        self.max_running = max(max_running, 1)
+        self.max_queued = max_queued
+        self.default_slo = default_slo
+        self.resources: Dict[str, FairResource] = {
+            "llm": FairResource("llm", llm_slots, measure=llm_tokens),
+            "browser": FairResource("browser", browser_slots),
+            "process": FairResource("process", process_slots),
+        }
+        self.running: Dict[str, FlowTicket] = {}
+        self.finished: List[FlowTicket] = []
+        self.rejected = 0
+        self._queue: List[Tuple[int, int, FlowTicket, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._mean_run_time: Optional[float] = None
+
+    @classmethod
+    def from_config(cls, settings: Optional[SchedulerSettings] = None) -> "FlowScheduler":
+        settings = settings or config.scheduler_config or SchedulerSettings()
+        return cls(
+            max_running=settings.max_running,
+            max_queued=settings.max_queued,
+            llm_slots=settings.llm_slots,
+            browser_slots=settings.browser_slots,
+            process_slots=settings.process_slots,
+            default_slo=settings.default_slo,
+        )
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for *_, admitted in self._queue if not admitted.done())
+
+    async def submit(
+        self,
+        flow: Union[BaseFlow, BaseAgent],
+        request: str,
+        priority: int = 0,
+        weight: float = 1.0,
+        slo: Optional[float] = None,
+        name: Optional[str] = None,
+    ) -> str:
+        """
+        Run `flow` (or an agent) on `request` once admitted and return its result.
+
+        The flow's usage is accounted to the enclosing run, if any, else to
+        a new run. Raises `FlowRejected` if the scheduler is overloaded, or if
+        the flow is shed from the queue for a higher-priority one.
+        """
+        ticket = FlowTicket(
+            run_id=current_usage_tags().get("run_id") or new_run_id(),
+            name=name or type(flow).__name__,
+            priority=priority,
+            weight=weight,
+            slo=slo if slo is not None else self.default_slo,
+        )
+        await self._admit(ticket)
+        try:
+            with share_context(ticket, self.resources), usage_context(run_id=ticket.run_id):
+                if isinstance(flow, BaseAgent):
+                    result = await flow.run(request)
+                else:
+                    result = await flow.execute(request)
+            ticket.status = "done"
+            return result
+        except BaseException:
+            ticket.status = "failed"
+            raise
+        finally:
+            self._finish(ticket)
+
+    async def _admit(self, ticket: FlowTicket) -> None:
+        """Wait for a run slot, or raise `FlowRejected` under overload."""
+        if len(self.running) < self.max_running and not self.queued:
+            self._start(ticket)
+            return
+
+        expected_wait = self._expected_wait(ticket)
+        if ticket.slo is not None and expected_wait is not None and expected_wait > ticket.slo:
+            raise self._rejection(ticket, f"expected queue wait {expected_wait:.0f}s exceeds its SLO")
+        if self.queued >= self.max_queued:
+            lowest = self._lowest_queued()
+            if lowest is None or lowest[2].priority >= ticket.priority:
+                raise self._rejection(ticket, f"{self.queued} flows already queued")
+            *_, shed, admitted = lowest
+            self.rejected += 1
+            shed.status = "rejected"
+            admitted.set_exception(FlowRejected(f"Flow {shed.name} shed for a higher-priority flow"))
+            logger.warning(f"🚦 Shed queued flow {shed.name} for {ticket.name} (priority {ticket.priority})")
+
+        admitted = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (-ticket.priority, next(self._order), ticket, admitted))
+        logger.info(f"🚦 Queued flow {ticket.name} ({self.queued} waiting, {len(self.running)} running)")
+        try:
+            await admitted
+        except asyncio.CancelledError:
+            if admitted.done() and not admitted.cancelled() and admitted.exception() is None:
+                self._finish(ticket)  # started just as we were cancelled
+            raise
+
+    def _start(self, ticket: FlowTicket) -> None:
+        ticket.status = "running"
+        ticket.started_at = time.monotonic()
+        self.running[ticket.id] = ticket
+
+    def _finish(self, ticket: FlowTicket) -> None:
+        if self.running.pop(ticket.id, None) is None:
+            return
+        ticket.finished_at = time.monotonic()
+        run_time = ticket.finished_at - ticket.started_at
+        self._mean_run_time = (
+            run_time if self._mean_run_time is None else 0.8 * self._mean_run_time + 0.2 * run_time
+        )
+        self.finished.append(ticket)
+        for resource in self.resources.values():
+            resource.forget(ticket)
+        if ticket.slo_met is False:
+            logger.warning(
+                f"⏱️ Flow {ticket.name} missed its SLO: {ticket.latency:.1f}s > {ticket.slo:g}s "
+                f"({ticket.queue_wait:.1f}s queued)"
+            )
+
+        # Start the next queued flows
+        while self._queue and len(self.running) < self.max_running:
+            *_, queued, admitted = heapq.heappop(self._queue)
+            if admitted.done():
+                continue  # shed or cancelled while queued
+            self._start(queued)
+            admitted.set_result(None)
+
+    def _expected_wait(self, ticket: FlowTicket) -> Optional[float]:
+        """Queue wait of a new flow, from the mean run time and the flows ahead of it."""
+        if self._mean_run_time is None:
+            return None
+        ahead = sum(
+            1 for _, _, queued, admitted in self._queue
+            if not admitted.done() and queued.priority >= ticket.priority
+        )
+        return (ahead // self.max_running + 1) * self._mean_run_time
+
+    def _lowest_queued(self) -> Optional[Tuple[int, int, FlowTicket, asyncio.Future]]:
+        waiting = [entry for entry in self._queue if not entry[3].done()]
+        # Lowest priority, most recently queued
+        return max(waiting, key=lambda entry: (entry[0], entry[1])) if waiting else None
+
+    def _rejection(self, ticket: FlowTicket, reason: str) -> FlowRejected:
+        ticket.status = "rejected"
+        self.rejected += 1
+        logger.warning(f"🚦 Rejected flow {ticket.name}: {reason}")
+        return FlowRejected(f"Flow {ticket.name} rejected: {reason}")
+
+    def slo_report(self) -> SloReport:
+        """Latency and SLO attainment of the flows finished so far."""
+        latencies = [ticket.latency for ticket in self.finished]
+        waits = [ticket.queue_wait for ticket in self.finished]
+        with_slo = [ticket for ticket in self.finished if ticket.slo is not None]
+        return SloReport(
+            finished=len(self.finished),
+            failed=sum(1 for ticket in self.finished if ticket.status == "failed"),
+            rejected=self.rejected,
+            with_slo=len(with_slo),
+            slo_met=sum(1 for ticket in with_slo if ticket.slo_met),
+            p50_latency=_percentile(latencies, 0.5),
+            p95_latency=_percentile(latencies, 0.95),
+            mean_queue_wait=sum(waits) / len(waits) if waits else 0.0,
+        )
@@ -0,0 +1,184 @@
+"""Content-addressed store of plan step results, so reruns resume at the first changed step."""
+import hashlib
+import json
+import os
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from app.config import WORKSPACE_ROOT, PlanningSettings, config
+from app.logger import logger
+
+
+# "step 2", "steps 1 and 3", "Steps 0, 2 & 4"
+_STEP_REFERENCE = re.compile(r"\bsteps?\s+(\d+(?:\s*(?:,|and|&)\s*\d+)*)", re.IGNORECASE)
+
+
+def _digest(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def step_dependencies(step_index: int, step_text: str) -> List[int]:
+    """Earlier steps a step depends on.
+
+    Steps that name earlier steps ("using the results of steps 1 and 3")
+    depend on those; any other step depends on the one before it, and so,
+    transitively, on every step before it.
+    """
+    named = {
+        int(number)
+        for match in _STEP_REFERENCE.finditer(step_text)
+        for number in re.findall(r"\d+", match.group(1))
+        if int(number) < step_index
+    }
+    if named:
+        return sorted(named)
+    return [step_index - 1] if step_index > 0 else []
+
+
+class StepCache:
+    """
+    Results of plan steps, addressed by a hash of everything they depend on.
+
+    A step's key covers the request, the step's text and type, and the
+    digests of the outputs of the steps it depends on. Rerunning a request
+    therefore serves every step whose inputs are unchanged and runs again
+    from the first step that failed or whose inputs changed; a changed step
+    invalidates only the steps that depend on it, and only if its output
+    changed too. The plan made for a request is kept as well, so a rerun
+    gets the same steps without a planning call.
+
+    Entries are small JSON files under `directory`. Entries older than
+    `max_age` seconds are ignored, and every `SWEEP_EVERY` writes a sweep
+    deletes them and then the least recently used entries beyond
+    `max_entries`. `clear` empties the cache.
+    """
+
+    SWEEP_EVERY = 50
+
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        max_entries: Optional[int] = 2000,
+        max_age: Optional[float] = 7 * 24 * 3600.0,
+    ):
+        self.directory = Path(directory)
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._writes = 0
+
+    @classmethod
+    def from_config(cls, settings: Optional[PlanningSettings] = None) -> Optional["StepCache"]:
+        """The cache selected by ``[planning] memoize_steps``, or None when it is off."""
+        settings = settings or config.planning_config or PlanningSettings()
+        return cls.configured(settings) if settings.memoize_steps else None
+
+    @classmethod
+    def configured(cls, settings: Optional[PlanningSettings] = None) -> "StepCache":
+        """The cache at the configured directory, whether memoization is on or not."""
+        settings = settings or config.planning_config or PlanningSettings()
+        return cls(
+            settings.step_cache or WORKSPACE_ROOT / "step_cache",
+            max_entries=settings.step_cache_max_entries,
+            max_age=settings.step_cache_max_age,
+        )
+
+    @staticmethod
+    def step_key(
+        request: str, step_text: str, step_type: Optional[str], dependency_outputs: List[str]
+    ) -> str:
+        """Key of a step given the output digests of its dependencies."""
+        return _digest("step", request, step_text, step_type, dependency_outputs)
+
+    @staticmethod
+    def output_digest(result: str) -> str:
+        return _digest("output", result)
+
+    def get_step(self, key: str) -> Optional[str]:
+        """Stored result of a step, or None."""
+        record = self._read(f"step-{key}")
+        return record["result"] if record else None
+
+    def put_step(self, key: str, step_text: str, result: str) -> None:
+        self._write(f"step-{key}", {"step": step_text, "result": result})
+
+    def get_plan(self, request: str) -> Optional[dict]:
+        """Title and steps of the plan last made for `request`, or None."""
+        return self._read(f"plan-{_digest('plan', request)}")
+
+    def put_plan(self, request: str, title: str, steps: List[str]) -> None:
+        self._write(f"plan-{_digest('plan', request)}", {"title": title, "steps": steps})
+
+    def clear(self) -> int:
+        """Delete every entry; returns how many were deleted."""
+        removed = 0
+        for path in self._entries():
+            removed += self._remove(path)
+        return removed
+
+    def sweep(self) -> int:
+        """Delete expired entries, then the least recently used beyond `max_entries`.
+
+        Returns how many entries were deleted.
+        """
+        entries = []
+        for path in self._entries():
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except OSError:
+                continue  # removed by another process
+        removed = 0
+        if self.max_age is not None:
+            cutoff = time.time() - self.max_age
+            removed += sum(self._remove(path) for mtime, path in entries if mtime < cutoff)
+            entries = [(mtime, path) for mtime, path in entries if mtime >= cutoff]
+        if self.max_entries is not None and len(entries) > self.max_entries:
+            entries.sort()
+            excess = len(entries) - self.max_entries
+            removed += sum(self._remove(path) for _, path in entries[:excess])
+        if removed:
+            logger.info(f"🧹 Evicted {removed} step cache entries")
+        return removed
+
+    def _entries(self) -> List[Path]:
+        if not self.directory.is_dir():
+            return []
+        return list(self.directory.glob("*.json"))
+
+    @staticmethod
+    def _remove(path: Path) -> int:
+        try:
+            path.unlink()
+            return 1
+        except FileNotFoundError:
+            return 0
+
+    def _read(self, name: str) -> Optional[Dict]:
+        path = self.directory / f"{name}.json"
+        try:
+            record = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable step cache entry {path}: {e}")
+            return None
+        if self.max_age is not None and time.time() - record.get("created", 0) > self.max_age:
+            self._remove(path)
+            return None
+        try:
+            # The modification time tracks use, for least recently used eviction
+            os.utime(path)
+        except OSError:
+            pass
+        return record
+
+    def _write(self, name: str, record: Dict) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{name}.json"
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps({**record, "created": time.time()}), encoding="utf-8")
+        os.replace(tmp, path)
+        if self._writes % self.SWEEP_EVERY == 0:
+            self.sweep()
+        self._writes += 1
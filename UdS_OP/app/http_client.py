@@ -0,0 +1,224 @@
+"""Shared, tuned HTTP connection pool used by every LLM client and network tool."""
+import asyncio
+import importlib.util
+import threading
+import time
+from typing import Dict, Iterable, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.config import HTTPSettings, config
+from app.logger import logger
+
+
+class _TrackedStream(httpx.AsyncByteStream):
+    """Response stream wrapper that reports back when the body is released."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+        self._closed = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._closed:
+                self._closed = True
+                self._on_close()
+
+
+class _InstrumentedTransport(httpx.AsyncBaseTransport):
+    """Transport that delegates to httpx and records pool utilisation."""
+
+    def __init__(self, transport: httpx.AsyncHTTPTransport):
+        self._transport = transport
+        self.requests_total = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.pool_timeouts = 0
+        self.errors = 0
+        self.wait_time_total = 0.0
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests_total += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        start = time.perf_counter()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except httpx.PoolTimeout:
+            self.pool_timeouts += 1
+            self.errors += 1
+            self._release()
+            raise
+        except BaseException:
+            self.errors += 1
+            self._release()
+            raise
+        self.wait_time_total += time.perf_counter() - start
+
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_TrackedStream(response.stream, self._release),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+    def connection_counts(self) -> Dict[str, int]:
+        """Count open and idle connections held by the underlying pool."""
+        pool = getattr(self._transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        idle = 0
+        for connection in connections:
+            try:
+                if connection.is_idle():
+                    idle += 1
+            except Exception:
+                continue
+        return {"connections_open": len(connections), "connections_idle": idle}
+
+
+class HTTPClientPool:
+    """Process-wide holder of the shared ``httpx.AsyncClient``.
+
+    All LLM clients are built on top of the same client so that keep-alive
+    connections, TLS sessions and connection limits are shared across agents,
+    flows and config names.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._client = None
+                    cls._instance._transport = None
+        return cls._instance
+
+    @property
+    def settings(self) -> HTTPSettings:
+        return config.http_config or HTTPSettings()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Return the shared client, creating it on first use."""
+        if self._client is None or self._client.is_closed:
+            with self._lock:
+                if self._client is None or self._client.is_closed:
+                    self._client = self._build_client(self.settings)
+        return self._client
+
+    def _build_client(self, settings: HTTPSettings) -> httpx.AsyncClient:
+        http2 = settings.http2
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("HTTP/2 requested but the 'h2' package is not installed; using HTTP/1.1")
+            http2 = False
+
+        limits = httpx.Limits(
+            max_connections=settings.max_connections,
+            max_keepalive_connections=settings.max_keepalive_connections,
+            keepalive_expiry=settings.keepalive_expiry,
+        )
+        self._transport = _InstrumentedTransport(
+            httpx.AsyncHTTPTransport(limits=limits, http2=http2)
+        )
+        timeout = httpx.Timeout(
+            600.0, connect=settings.connect_timeout, pool=settings.pool_timeout
+        )
+        return httpx.AsyncClient(
+            transport=self._transport, timeout=timeout, follow_redirects=True
+        )
+
+    async def prewarm(self, urls: Optional[Iterable[str]] = None) -> int:
+        """Open connections to the given endpoints ahead of the first real request.
+
+        Args:
+            urls: Endpoints to warm. Defaults to the base URLs of all configured LLMs.
+
+        Returns:
+            int: Number of origins that accepted a connection.
+        """
+        if urls is None:
+            urls = [settings.base_url for settings in config.llm.values()]
+
+        origins = []
+        for url in urls:
+            if not url:
+                continue
+            parts = urlsplit(url)
+            if not parts.scheme or not parts.netloc:
+                continue
+            origin = f"{parts.scheme}://{parts.netloc}"
+            if origin not in origins:
+                origins.append(origin)
+
+        async def _warm(origin: str) -> bool:
+            try:
+                response = await self.client.head(origin)
+                await response.aclose()
+                return True
+            except httpx.HTTPError as e:
+                logger.debug(f"Connection pre-warm failed for {origin}: {e}")
+                return False
+
+        results = await asyncio.gather(*(_warm(origin) for origin in origins))
+        warmed = sum(results)
+        logger.info(f"🔥 Pre-warmed {warmed}/{len(origins)} HTTP connection(s)")
+        return warmed
+
+    def stats(self) -> Dict[str, float]:
+        """Return pool utilisation metrics for the shared client."""
+        settings = self.settings
+        stats = {
+            "max_connections": settings.max_connections,
+            "max_keepalive_connections": settings.max_keepalive_connections,
+            "requests_total": 0,
+            "in_flight": 0,
+            "peak_in_flight": 0,
+            "pool_timeouts": 0,
+            "errors": 0,
+            "avg_wait_seconds": 0.0,
+            "connections_open": 0,
+            "connections_idle": 0,
+        }
+        transport = self._transport
+        if transport is None:
+            return stats
+
+        stats.update(
+            requests_total=transport.requests_total,
+            in_flight=transport.in_flight,
+            peak_in_flight=transport.peak_in_flight,
+            pool_timeouts=transport.pool_timeouts,
+            errors=transport.errors,
+        )
+        completed = transport.requests_total - transport.errors
+        if completed > 0:
+            stats["avg_wait_seconds"] = transport.wait_time_total / completed
+        stats.update(transport.connection_counts())
+        return stats
+
+    async def aclose(self) -> None:
+        """Close the shared client and release all pooled connections."""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+        self._transport = None
+
+
+http_pool = HTTPClientPool()
@@ -1,3 +1,4 @@
+import time
 from typing import Dict, List, Optional, Union
 
 from openai import (
@@ -11,8 +12,49 @@ from openai import (
 from tenacity import retry, stop_after_attempt, wait_random_exponential
 
 from app.config import LLMSettings, config
+from app.fair_share import scheduled
+from app.http_client import http_pool
 from app.logger import logger  # Assuming a logger is set up in your app
-from app.schema import Message, TOOL_CHOICE_TYPE, ROLE_VALUES, TOOL_CHOICE_VALUES, ToolChoice
+from app.schema import (
+    Function,
+    Message,
+    TOOL_CHOICE_TYPE,
+    ROLE_VALUES,
+    TOOL_CHOICE_VALUES,
+    ToolCall,
+    ToolChoice,
+)
+from app.replay import recordable
+from app.stream import EventType, emit_event
+from app.tracing import current_span, traced
+from app.usage import get_cached_tokens, usage_tracker
+
+
+def _encode_tool_response(message) -> dict:
+    """Record the parts of a tool-call response that agents read."""
+    return {
+        "content": message.content,
+        "tool_calls": [
+            {
+                "id": call.id,
+                "type": "function",
+                "function": {
+                    "name": call.function.name,
+                    "arguments": call.function.arguments,
+                },
+            }
+            for call in message.tool_calls or []
+        ]
+        or None,
+    }
+
+
+def _decode_tool_response(data: dict) -> Message:
+    return Message(role="assistant", content=data.get("content"), tool_calls=data.get("tool_calls"))
+
+
+def _llm_span_attributes(llm: "LLM", messages, *args, **kwargs) -> dict:
+    return {"model": llm.model, "messages": len(messages)}
 
 
 class LLM:
@@ -45,9 +87,14 @@ class LLM:
                     base_url=self.base_url,
                     api_key=self.api_key,
                     api_version=self.api_version,
+                    http_client=http_pool.client,
                 )
             else:
-                self.client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url)
+                self.client = AsyncOpenAI(
+                    api_key=self.api_key,
+                    base_url=self.base_url,
+                    http_client=http_pool.client,
+                )
 
     @staticmethod
     def format_messages(messages: List[Union[dict, Message]]) -> List[dict]:
@@ -97,10 +144,55 @@ class LLM:
 
         return formatted_messages
 
+    @staticmethod
+    def _log_usage(usage) -> None:
+        """Report prompt, cached and completion token counts for a response."""
+        if usage is None:
+            return
+        logger.debug(
+            f"📊 Tokens: {usage.prompt_tokens} prompt "
+            f"({get_cached_tokens(usage)} cached), {usage.completion_tokens} completion"
+        )
+
+    async def _create_completion(self, **params):
+        """Call the chat completions API and account for its tokens and latency."""
+        if params.get("stream"):
+            # OpenAI-compatible servers only report usage of a stream, on its
+            # final chunk, when asked to
+            params.setdefault("stream_options", {"include_usage": True})
+        start = time.perf_counter()
+        try:
+            response = await self.client.chat.completions.create(**params)
+        except Exception:
+            usage_tracker.record(
+                model=self.model, latency=time.perf_counter() - start, success=False
+            )
+            raise
+
+        span = current_span()
+        if span.recording:
+            span.set(bytes_in=len(str(params.get("messages", ""))))
+        if not params.get("stream"):
+            self._log_usage(response.usage)
+            record = usage_tracker.record(
+                model=self.model,
+                usage=response.usage,
+                latency=time.perf_counter() - start,
+            )
+            span.set(
+                prompt_tokens=record.prompt_tokens,
+                completion_tokens=record.completion_tokens,
+                cached_tokens=record.cached_tokens,
+            )
+        return response
+
+    @traced("llm.ask", _llm_span_attributes)
+    @recordable("llm.ask")
     @retry(
         wait=wait_random_exponential(min=1, max=60),
         stop=stop_after_attempt(6),
     )
+    @scheduled("llm")
     async def ask(
         self,
         messages: List[Union[dict, Message]],
@@ -135,7 +227,7 @@ class LLM:
 
             if not stream:
                 # Non-streaming request
-                response = await self.client.chat.completions.create(
+                response = await self._create_completion(
                     model=self.model,
                     messages=messages,
                     max_tokens=self.max_tokens,
@@ -147,7 +239,8 @@ class LLM:
                 return response.choices[0].message.content
 
             # Streaming request
-            response = await self.client.chat.completions.create(
+            start = time.perf_counter()
+            response = await self._create_completion(
                 model=self.model,
                 messages=messages,
                 max_tokens=self.max_tokens,
@@ -156,13 +249,30 @@ class LLM:
             )
 
             collected_messages = []
+            usage = None
             async for chunk in response:
+                # With include_usage, usage arrives on the final chunk, which has no choices
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
                 chunk_message = chunk.choices[0].delta.content or ""
-                collected_messages.append(chunk_message)
-                print(chunk_message, end="", flush=True)
-
-            print()  # Newline after streaming
+                if chunk_message:
+                    collected_messages.append(chunk_message)
+                    await emit_event(EventType.TOKEN, chunk_message)
+
+            await emit_event(EventType.RESPONSE_END)
+            self._log_usage(usage)
+            record = usage_tracker.record(
+                model=self.model, usage=usage, latency=time.perf_counter() - start
+            )
             full_response = "".join(collected_messages).strip()
+            current_span().set(
+                prompt_tokens=record.prompt_tokens,
+                completion_tokens=record.completion_tokens,
+                cached_tokens=record.cached_tokens,
+                bytes_out=len(full_response),
+            )
             if not full_response:
                 raise ValueError("Empty response from streaming LLM")
             return full_response
@@ -177,10 +287,15 @@ class LLM:
             logger.error(f"Unexpected error in ask: {e}")
             raise
 
+    @traced("llm.ask_tool", _llm_span_attributes)
+    @recordable(
+        "llm.ask_tool", encode=_encode_tool_response, decode=_decode_tool_response
+    )
     @retry(
         wait=wait_random_exponential(min=1, max=60),
         stop=stop_after_attempt(6),
     )
+    @scheduled("llm")
     async def ask_tool(
         self,
         messages: List[Union[dict, Message]],
@@ -189,6 +304,7 @@ class LLM:
         tools: Optional[List[dict]] = None,
         tool_choice: TOOL_CHOICE_TYPE = ToolChoice.AUTO, # type: ignore
         temperature: Optional[float] = None,
+        stream: bool = False,
         **kwargs,
     ):
         """
@@ -201,6 +317,7 @@ class LLM:
             tools: List of tools to use
             tool_choice: Tool choice strategy
             temperature: Sampling temperature for the response
+            stream: Stream the response, emitting token and tool-call delta events
             **kwargs: Additional completion arguments
 
         Returns:
@@ -229,8 +346,21 @@ class LLM:
                     if not isinstance(tool, dict) or "type" not in tool:
                         raise ValueError("Each tool must be a dict with 'type' field")
 
+            if stream:
+                return await self._stream_tool_response(
+                    model=self.model,
+                    messages=messages,
+                    temperature=temperature or self.temperature,
+                    max_tokens=self.max_tokens,
+                    tools=tools,
+                    tool_choice=tool_choice,
+                    timeout=timeout,
+                    stream=True,
+                    **kwargs,
+                )
+
             # Set up the completion request
-            response = await self.client.chat.completions.create(
+            response = await self._create_completion(
                 model=self.model,
                 messages=messages,
                 temperature=temperature or self.temperature,
@@ -270,3 +400,69 @@ class LLM:
         except Exception as e:
             logger.error(f"Unexpected error in ask_tool: {e}")
             raise
+
+    async def _stream_tool_response(self, **params) -> Message:
+        """Stream a tool-call completion and assemble the final message.
+
+        Content tokens are emitted as ``TOKEN`` events and argument fragments
+        as ``TOOL_CALL_DELTA`` events carrying the call's index, id and name,
+        so consumers can act on a tool call before it is complete.
+        """
+        start = time.perf_counter()
+        response = await self._create_completion(**params)
+
+        content: List[str] = []
+        calls: Dict[int, dict] = {}
+        usage = None
+        async for chunk in response:
+            # With include_usage, usage arrives on the final chunk, which has no choices
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if delta.content:
+                content.append(delta.content)
+                await emit_event(EventType.TOKEN, delta.content)
+            for call_delta in getattr(delta, "tool_calls", None) or []:
+                call = calls.setdefault(
+                    call_delta.index, {"id": None, "name": "", "arguments": ""}
+                )
+                call["id"] = call_delta.id or call["id"]
+                function = call_delta.function
+                if function is not None:
+                    call["name"] += function.name or ""
+                    fragment = function.arguments or ""
+                    call["arguments"] += fragment
+                    if fragment:
+                        await emit_event(
+                            EventType.TOOL_CALL_DELTA,
+                            fragment,
+                            index=call_delta.index,
+                            id=call["id"],
+                            name=call["name"],
+                        )
+
+        await emit_event(EventType.RESPONSE_END)
+        self._log_usage(usage)
+        record = usage_tracker.record(
+            model=self.model, usage=usage, latency=time.perf_counter() - start
+        )
+        current_span().set(
+            prompt_tokens=record.prompt_tokens,
+            completion_tokens=record.completion_tokens,
+            cached_tokens=record.cached_tokens,
+        )
+
+        tool_calls = [
+            ToolCall(
+                id=call["id"] or f"call_{index}",
+                function=Function(name=call["name"], arguments=call["arguments"]),
+            )
+            for index, call in sorted(calls.items())
+        ]
+        if not content and not tool_calls:
+            raise ValueError("Empty response from streaming LLM")
+        return Message(
+            role="assistant", content="".join(content), tool_calls=tool_calls or None
+        )
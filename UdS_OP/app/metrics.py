@@ -0,0 +1,352 @@
+"""Per-step wall time, LLM and tool time, tokens and tool-call counts of flows and agents."""
+import bisect
+import os
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from app.config import MetricsSettings, config
+from app.logger import logger
+from app.usage import UsageRecord, current_usage_tags, usage_tracker
+
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class StepMetrics(BaseModel):
+    """What one plan step (or one agent run outside a flow) took."""
+
+    run_id: Optional[str] = None
+    plan_id: Optional[str] = None
+    step: Optional[int] = Field(None, description="Plan step index; None for a standalone agent run")
+    step_type: str = "default"
+    executor: str
+    status: str = "running"
+    started_at: float = Field(default_factory=time.time)
+    wall_time: float = 0.0
+    llm_time: float = 0.0
+    tool_time: float = 0.0
+    llm_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    agent_steps: int = 0
+    tool_calls: Dict[str, int] = Field(default_factory=dict)
+    tool_errors: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    @property
+    def other_time(self) -> float:
+        """Wall time spent neither waiting on the LLM nor in tools."""
+        return max(self.wall_time - self.llm_time - self.tool_time, 0.0)
+
+
+class _Histogram:
+    """Cumulative Prometheus histogram of one labelled series."""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(LATENCY_BUCKETS, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name: str, labels: str) -> List[str]:
+        sep = "," if labels else ""
+        lines, cumulative = [], 0
+        for bound, count in zip(LATENCY_BUCKETS, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{bound:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum:.6f}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+def _label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsCollector:
+    """
+    Collects how plan steps spend their time, tokens and tool calls.
+
+    A flow opens a record per plan step with `step`; an agent run outside a
+    flow step opens one for itself. LLM calls (from the usage tracker) and
+    tool calls made under the same run, plan and plan step are added to the
+    open record, so each finished step knows its wall time, LLM and tool
+    time, tokens, inner agent steps and tool-call histogram.
+
+    Finished steps are kept for summaries (the most recent `max_steps`) and
+    aggregated into Prometheus series by step type, tool and model, which
+    `prometheus_text` renders, `write_prometheus` saves and `serve` exposes
+    on a local HTTP endpoint.
+    """
+
+    def __init__(self, settings: Optional[MetricsSettings] = None, max_steps: int = 10_000):
+        self._settings = settings
+        self.steps: Deque[StepMetrics] = deque(maxlen=max_steps)
+        self._open: Dict[Tuple, StepMetrics] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+        self._step_seconds: Dict[str, _Histogram] = defaultdict(_Histogram)
+        self._tool_seconds: Dict[str, _Histogram] = defaultdict(_Histogram)
+        self._llm_seconds: Dict[str, _Histogram] = defaultdict(_Histogram)
+        self._type_totals: Dict[str, Counter] = defaultdict(Counter)
+        self._tool_calls: Counter = Counter()
+        self._tokens: Counter = Counter()
+        usage_tracker.subscribe(self.record_llm)
+
+    @property
+    def settings(self) -> MetricsSettings:
+        return self._settings or config.metrics_config or MetricsSettings()
+
+    @staticmethod
+    def _key(tags: Dict) -> Tuple:
+        return tags.get("run_id"), tags.get("plan_id"), tags.get("plan_step")
+
+    @contextmanager
+    def step(self, executor: str, step_type: Optional[str] = None) -> Iterator[StepMetrics]:
+        """Measure the plan step (or standalone agent run) executed inside the block.
+
+        Nested calls for the same step share the outer record, so an executor
+        run inside a flow step adds to the flow's record instead of opening
+        its own.
+        """
+        tags = current_usage_tags()
+        key = self._key(tags)
+        with self._lock:
+            record = self._open.get(key)
+            owner = record is None
+            if owner:
+                record = self._open[key] = StepMetrics(
+                    run_id=key[0],
+                    plan_id=key[1],
+                    step=key[2],
+                    step_type=step_type or "default",
+                    executor=executor,
+                )
+        start = time.perf_counter()
+        try:
+            yield record
+        except BaseException:
+            if owner:
+                record.status = "error"
+            raise
+        finally:
+            if owner:
+                record.wall_time = time.perf_counter() - start
+                if record.status == "running":
+                    record.status = "completed"
+                self._close(key, record)
+
+    def record_cached(self, executor: str, step_type: Optional[str] = None) -> None:
+        """Record a plan step served from the step cache."""
+        with self.step(executor, step_type) as record:
+            record.status = "cached"
+
+    def _close(self, key: Tuple, record: StepMetrics) -> None:
+        with self._lock:
+            self._open.pop(key, None)
+            self.steps.append(record)
+            self._step_seconds[record.step_type].observe(record.wall_time)
+            totals = self._type_totals[record.step_type]
+            totals["llm_seconds"] += record.llm_time
+            totals["tool_seconds"] += record.tool_time
+            totals["agent_steps"] += record.agent_steps
+            totals[f"status:{record.status}"] += 1
+
+    def record_llm(self, usage: UsageRecord) -> None:
+        """Add an LLM call to its open step; subscribed to the usage tracker."""
+        with self._lock:
+            self._llm_seconds[usage.model].observe(usage.latency)
+            self._tokens["prompt"] += usage.prompt_tokens
+            self._tokens["completion"] += usage.completion_tokens
+            record = self._open.get((usage.run_id, usage.plan_id, usage.plan_step))
+            if record is not None:
+                record.llm_calls += 1
+                record.llm_time += usage.latency
+                record.prompt_tokens += usage.prompt_tokens
+                record.completion_tokens += usage.completion_tokens
+
+    def record_tool(self, name: str, duration: float, success: bool = True) -> None:
+        """Add a tool call to the open step of the current context."""
+        key = self._key(current_usage_tags())
+        with self._lock:
+            self._tool_seconds[name].observe(duration)
+            self._tool_calls[(name, "ok" if success else "error")] += 1
+            record = self._open.get(key)
+            if record is not None:
+                record.tool_time += duration
+                record.tool_calls[name] = record.tool_calls.get(name, 0) + 1
+                if not success:
+                    record.tool_errors += 1
+
+    def steps_for(self, run_id: Optional[str] = None) -> List[StepMetrics]:
+        """Finished steps, optionally of one run."""
+        with self._lock:
+            return [s for s in self.steps if run_id is None or s.run_id == run_id]
+
+    def summary_table(self, run_id: Optional[str] = None) -> str:
+        """Per-step-type totals of a run as a text table, slowest types first."""
+        groups: Dict[str, List[StepMetrics]] = defaultdict(list)
+        for record in self.steps_for(run_id):
+            groups[record.step_type].append(record)
+        if not groups:
+            return "No steps recorded"
+
+        header = (
+            "type", "steps", "wall s", "max s", "llm s", "tool s", "other s",
+            "tokens", "agent steps", "top tools",
+        )
+        rows = []
+        for step_type, records in sorted(
+            groups.items(), key=lambda item: -sum(r.wall_time for r in item[1])
+        ):
+            tools = Counter()
+            for record in records:
+                tools.update(record.tool_calls)
+            rows.append((
+                step_type,
+                str(len(records)),
+                f"{sum(r.wall_time for r in records):.1f}",
+                f"{max(r.wall_time for r in records):.1f}",
+                f"{sum(r.llm_time for r in records):.1f}",
+                f"{sum(r.tool_time for r in records):.1f}",
+                f"{sum(r.other_time for r in records):.1f}",
+                str(sum(r.total_tokens for r in records)),
+                str(sum(r.agent_steps for r in records)),
+                ", ".join(f"{name}×{count}" for name, count in tools.most_common(3)) or "-",
+            ))
+        widths = [max(len(row[i]) for row in (header, *rows)) for i in range(len(header))]
+
+        def line(cells) -> str:
+            return "  ".join(
+                cell.ljust(width) if i in (0, len(cells) - 1) else cell.rjust(width)
+                for i, (cell, width) in enumerate(zip(cells, widths))
+            ).rstrip()
+
+        rule = "-" * len(line(header))
+        return "\n".join([line(header), rule, *(line(row) for row in rows)])
+
+    def prometheus_text(self) -> str:
+        """All series in the Prometheus text exposition format."""
+        out: List[str] = []
+        with self._lock:
+            out += [
+                "# HELP udsop_step_seconds Wall time of plan steps and standalone agent runs",
+                "# TYPE udsop_step_seconds histogram",
+            ]
+            for step_type, histogram in sorted(self._step_seconds.items()):
+                out += histogram.lines("udsop_step_seconds", f'step_type="{_label(step_type)}"')
+
+            for metric, key, help_text in (
+                ("udsop_step_llm_seconds_total", "llm_seconds", "Time plan steps waited on the LLM"),
+                ("udsop_step_tool_seconds_total", "tool_seconds", "Time plan steps spent in tools"),
+                ("udsop_step_agent_steps_total", "agent_steps", "Agent steps taken by plan steps"),
+            ):
+                out += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+                for step_type, totals in sorted(self._type_totals.items()):
+                    out.append(f'{metric}{{step_type="{_label(step_type)}"}} {totals[key]:g}')
+
+            out += ["# HELP udsop_steps_total Plan steps by outcome", "# TYPE udsop_steps_total counter"]
+            for step_type, totals in sorted(self._type_totals.items()):
+                for name, count in sorted(totals.items()):
+                    if name.startswith("status:"):
+                        out.append(
+                            f'udsop_steps_total{{step_type="{_label(step_type)}",'
+                            f'status="{name[len("status:"):]}"}} {count}'
+                        )
+
+            out += ["# HELP udsop_tool_calls_total Tool calls by outcome", "# TYPE udsop_tool_calls_total counter"]
+            for (tool, status), count in sorted(self._tool_calls.items()):
+                out.append(f'udsop_tool_calls_total{{tool="{_label(tool)}",status="{status}"}} {count}')
+
+            out += ["# HELP udsop_tool_seconds Duration of tool calls", "# TYPE udsop_tool_seconds histogram"]
+            for tool, histogram in sorted(self._tool_seconds.items()):
+                out += histogram.lines("udsop_tool_seconds", f'tool="{_label(tool)}"')
+
+            out += ["# HELP udsop_llm_seconds Latency of LLM calls", "# TYPE udsop_llm_seconds histogram"]
+            for model, histogram in sorted(self._llm_seconds.items()):
+                out += histogram.lines("udsop_llm_seconds", f'model="{_label(model)}"')
+
+            out += ["# HELP udsop_llm_tokens_total LLM tokens by kind", "# TYPE udsop_llm_tokens_total counter"]
+            for kind, count in sorted(self._tokens.items()):
+                out.append(f'udsop_llm_tokens_total{{kind="{kind}"}} {count}')
+        return "\n".join(out) + "\n"
+
+    def write_prometheus(self, path: Optional[str] = None) -> Optional[Path]:
+        """Write the series to `path` (default: the configured file), e.g. for node_exporter."""
+        path = path or self.settings.file
+        if not path:
+            return None
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(self.prometheus_text(), encoding="utf-8")
+        os.replace(tmp, path)
+        return path
+
+    def serve(self, port: Optional[int] = None, host: str = "127.0.0.1") -> int:
+        """Expose the series at http://host:port/metrics from a background thread."""
+        if self._server is not None:
+            return self._server.server_address[1]
+        collector = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = collector.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        port = self.settings.port if port is None else port
+        self._server = ThreadingHTTPServer((host, port or 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        port = self._server.server_address[1]
+        logger.info(f"📈 Serving metrics at http://{host}:{port}/metrics")
+        return port
+
+    def shutdown(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def finish_run(self, run_id: Optional[str]) -> None:
+        """Report a finished run: summary table in the log and the Prometheus file, as configured."""
+        if config.metrics_config is None and self._settings is None:
+            return
+        if self.settings.summary:
+            logger.info(f"📊 Step metrics for run {run_id}:\n{self.summary_table(run_id)}")
+        try:
+            self.write_prometheus()
+        except OSError as e:
+            logger.warning(f"Failed to write metrics file: {e}")
+
+
+metrics = MetricsCollector()
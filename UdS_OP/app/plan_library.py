@@ -0,0 +1,287 @@
+"""Library of plans from successful runs, reused for requests of the same shape."""
+import json
+import math
+import os
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from pydantic import BaseModel, Field
+
+from app.config import WORKSPACE_ROOT, PlanningSettings, config
+from app.logger import logger
+
+
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from in into is it me my of on or please "
+    "the then this that to with".split()
+)
+
+# Details that change between requests of the same shape. They are left out
+# of the similarity and, when they also appear in the plan's steps, become
+# slots that are filled from the new request.
+_SLOT = re.compile(
+    r"(?P<url>https?://[^\s\"'<>]+[^\s\"'<>.,;:)])"
+    r"|\"(?P<dquote>[^\"\n]+)\""
+    r"|'(?P<squote>[^'\n]+)'"
+    r"|(?P<file>\b[\w-]+\.(?:txt|md|csv|json|jsonl|html|py|pdf|xlsx|xls|docx|png|jpg)\b)"
+    r"|(?P<number>\b\d+(?:\.\d+)?\b)"
+)
+_SLOT_MARK = "{{slot:%d}}"
+_SLOT_MARK_RE = re.compile(r"\{\{slot:(\d+)\}\}")
+
+
+def _slots(text: str) -> List[Tuple[str, str]]:
+    """Return the ``(kind, value)`` of every variable detail in a request."""
+    return [(m.lastgroup, m.group(m.lastgroup)) for m in _SLOT.finditer(text)]
+
+
+def _shape_tokens(text: str) -> List[str]:
+    """Words of a request with its variable details replaced by their kind."""
+    text = _SLOT.sub(lambda m: f" {m.lastgroup}slot ", text)
+    return [word for word in _WORD.findall(text.lower()) if word not in _STOPWORDS]
+
+
+class LibraryEntry(BaseModel):
+    """A stored plan and the request it was made for."""
+
+    id: str
+    request: str
+    title: str
+    steps: List[str] = Field(..., description="Steps with slot markers for request details")
+    slot_kinds: List[str] = Field(default_factory=list)
+    uses: int = 0
+    successes: int = 0
+    failures: int = Field(0, description="Consecutive reuses with failed steps")
+    created: float = Field(default_factory=time.time)
+    last_used: float = Field(default_factory=time.time)
+
+
+class PlanMatch(BaseModel):
+    """A stored plan adapted to a new request."""
+
+    entry_id: str
+    score: float
+    title: str
+    steps: List[str]
+
+
+class LibraryStats(BaseModel):
+    """Hit-rate counters since the process started."""
+
+    lookups: int = 0
+    hits: int = 0
+    stored: int = 0
+    invalidated: int = 0
+    size: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+
+class PlanLibrary:
+    """
+    Plans of completed runs, indexed by the words of their requests.
+
+    Requests are compared by TF-IDF cosine similarity over an inverted index,
+    after URLs, quoted strings, file names and numbers are reduced to their
+    kind, so "summarise 'rust' into a.md" and "summarise 'go' into b.md" have
+    the same shape. A stored plan is reused when a new request is at least
+    `reuse_threshold` similar and its details can fill the plan's slots.
+
+    A plan is stored only after a run completes without failed steps. Reuses
+    that end with failed steps count against it, and after
+    `max_reuse_failures` such runs in a row it is dropped.
+    """
+
+    def __init__(self, settings: Optional[PlanningSettings] = None, path: Optional[Path] = None):
+        self._settings = settings
+        self._path = path
+        self._entries: Optional[Dict[str, LibraryEntry]] = None
+        self._terms: Dict[str, Counter] = {}
+        self._postings: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.stats = LibraryStats()
+
+    @property
+    def settings(self) -> PlanningSettings:
+        return self._settings or config.planning_config or PlanningSettings()
+
+    @property
+    def enabled(self) -> bool:
+        return self.settings.reuse_plans
+
+    @property
+    def path(self) -> Path:
+        if self._path is not None:
+            return self._path
+        library = self.settings.library
+        return Path(library) if library else WORKSPACE_ROOT / "plan_library.json"
+
+    def lookup(self, request: str) -> Optional[PlanMatch]:
+        """Return the closest stored plan adapted to `request`, or None."""
+        slots = _slots(request)
+        with self._lock:
+            entries = self._load()
+            self.stats.lookups += 1
+            for score, entry_id in self._search(_shape_tokens(request)):
+                if score < self.settings.reuse_threshold:
+                    break
+                entry = entries[entry_id]
+                filled = self._fill(entry, slots)
+                if filled is None:
+                    continue
+                entry.uses += 1
+                entry.last_used = time.time()
+                self.stats.hits += 1
+                self._save()
+                logger.info(
+                    f"♻️ Reusing plan {entry.id} (similarity {score:.2f}, "
+                    f"hit rate {self.stats.hit_rate:.0%} of {self.stats.lookups})"
+                )
+                return PlanMatch(
+                    entry_id=entry.id, score=score, title=filled[0], steps=filled[1:]
+                )
+        return None
+
+    def record_success(
+        self, request: str, title: str, steps: List[str], match: Optional[PlanMatch] = None
+    ) -> None:
+        """Record a run that completed without failed steps, storing its plan if new."""
+        with self._lock:
+            entries = self._load()
+            entry = entries.get(match.entry_id) if match else None
+            if entry is not None:
+                entry.successes += 1
+                entry.failures = 0
+            else:
+                self._add(request, title, steps)
+                self._evict()
+            self._save()
+
+    def record_failure(self, match: PlanMatch) -> None:
+        """Record a reuse that ended with failed steps; drops the plan after repeated failures."""
+        with self._lock:
+            entry = self._load().get(match.entry_id)
+            if entry is None:
+                return
+            entry.failures += 1
+            if entry.failures >= self.settings.max_reuse_failures:
+                self._remove(entry.id)
+                self.stats.invalidated += 1
+                logger.info(f"🗑️ Dropped plan {entry.id} after {entry.failures} failed reuses")
+            self._save()
+
+    def _search(self, tokens: List[str]) -> List[Tuple[float, str]]:
+        """Entries sharing a word with the request, by descending cosine similarity."""
+        query = Counter(tokens)
+        candidates = set()
+        for token in query:
+            candidates |= self._postings.get(token, set())
+        if not candidates:
+            return []
+
+        count = len(self._entries)
+
+        def idf(token: str) -> float:
+            return math.log((count + 1) / (len(self._postings.get(token, ())) + 1)) + 1
+
+        query_vector = {token: tf * idf(token) for token, tf in query.items()}
+        query_norm = math.sqrt(sum(w * w for w in query_vector.values()))
+
+        results = []
+        for entry_id in candidates:
+            terms = self._terms[entry_id]
+            dot, norm = 0.0, 0.0
+            for token, tf in terms.items():
+                weight = tf * idf(token)
+                norm += weight * weight
+                dot += weight * query_vector.get(token, 0.0)
+            results.append((dot / (math.sqrt(norm) * query_norm), entry_id))
+        results.sort(reverse=True)
+        return results
+
+    @staticmethod
+    def _fill(entry: LibraryEntry, slots: List[Tuple[str, str]]) -> Optional[List[str]]:
+        """The entry's title and steps with slots filled from the request, or None if they do not fit."""
+        texts = [entry.title, *entry.steps]
+        used = {int(i) for text in texts for i in _SLOT_MARK_RE.findall(text)}
+        if not used:
+            return texts
+        if [kind for kind, _ in slots] != entry.slot_kinds:
+            return None
+        return [_SLOT_MARK_RE.sub(lambda m: slots[int(m.group(1))][1], text) for text in texts]
+
+    @staticmethod
+    def _template(text: str, slots: List[Tuple[str, str]]) -> str:
+        # Longest values first, so "10" is not replaced inside "100"
+        for i, (_, value) in sorted(enumerate(slots), key=lambda s: -len(s[1][1])):
+            text = re.sub(rf"(?<!\w){re.escape(value)}(?!\w)", _SLOT_MARK % i, text)
+        return text
+
+    def _add(self, request: str, title: str, steps: List[str]) -> None:
+        slots = _slots(request)
+        entry = LibraryEntry(
+            id=uuid.uuid4().hex[:12],
+            request=request,
+            title=self._template(title, slots),
+            steps=[self._template(step, slots) for step in steps],
+            slot_kinds=[kind for kind, _ in slots],
+        )
+        self._index(entry)
+        self.stats.stored += 1
+
+    def _index(self, entry: LibraryEntry) -> None:
+        self._entries[entry.id] = entry
+        terms = Counter(_shape_tokens(entry.request))
+        self._terms[entry.id] = terms
+        for token in terms:
+            self._postings.setdefault(token, set()).add(entry.id)
+        self.stats.size = len(self._entries)
+
+    def _remove(self, entry_id: str) -> None:
+        self._entries.pop(entry_id, None)
+        for token in self._terms.pop(entry_id, ()):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.discard(entry_id)
+                if not postings:
+                    del self._postings[token]
+        self.stats.size = len(self._entries)
+
+    def _evict(self) -> None:
+        excess = len(self._entries) - self.settings.library_size
+        if excess > 0:
+            for entry in sorted(self._entries.values(), key=lambda e: e.last_used)[:excess]:
+                self._remove(entry.id)
+
+    def _load(self) -> Dict[str, LibraryEntry]:
+        if self._entries is None:
+            self._entries = {}
+            if self.path.exists():
+                try:
+                    records = json.loads(self.path.read_text(encoding="utf-8"))
+                    for record in records:
+                        self._index(LibraryEntry.model_validate(record))
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Ignoring unreadable plan library {self.path}: {e}")
+        return self._entries
+
+    def _save(self) -> None:
+        # Write a temporary file and rename it, so a crash never leaves half a library
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(
+            json.dumps([entry.model_dump() for entry in self._entries.values()]),
+            encoding="utf-8",
+        )
+        os.replace(tmp, self.path)
+
+
+plan_library = PlanLibrary()
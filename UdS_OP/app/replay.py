@@ -0,0 +1,300 @@
+"""Record every LLM and tool call of a run, and replay them without network access."""
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import Enum
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Literal, Optional, Union
+
+from pydantic import BaseModel
+
+from app.logger import logger
+
+
+REPLAY_VERSION = 1
+
+# Volatile values that legitimately differ between a recording and its replay
+DEFAULT_IGNORE_PATTERNS = (r"\bplan_[0-9a-f]+\b",)
+
+
+class ReplayDivergence(Exception):
+    """Raised when a replayed run asks for a call that was not recorded."""
+
+
+class ReplayedError(Exception):
+    """An error that was raised by the recorded call."""
+
+
+class Divergence(BaseModel):
+    """A call whose request did not match the recording"""
+
+    kind: str
+    position: int  # index of the event that was served (-1 if none was)
+    expected_digest: Optional[str] = None
+    actual_digest: str
+    actual_request: Any = None
+
+
+def to_jsonable(value: Any) -> Any:
+    """Convert call arguments and results into JSON-compatible data."""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, Enum):
+        return value.value
+    if hasattr(value, "to_dict"):
+        return to_jsonable(value.to_dict())
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, dict):
+        return {str(k): to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return [to_jsonable(v) for v in value]
+    return str(value)
+
+
+class RunRecorder:
+    """Appends every intercepted call to a JSONL file as it completes."""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self.path.open("w", encoding="utf-8")
+        self._file.write(
+            json.dumps({"type": "header", "version": REPLAY_VERSION, "started_at": time.time()})
+            + "\n"
+        )
+        self._origin = time.perf_counter()
+        self.events = 0
+
+    async def handle(
+        self,
+        kind: str,
+        request: Any,
+        call: Callable[[], Awaitable[Any]],
+        encode: Callable[[Any], Any],
+        decode: Callable[[Any], Any],
+    ) -> Any:
+        start = time.perf_counter()
+        event = {
+            "type": "call",
+            "kind": kind,
+            "digest": request_digest(request, ()),
+            "request": request,
+            "start": start - self._origin,
+        }
+        try:
+            result = await call()
+        except Exception as e:
+            event.update(
+                duration=time.perf_counter() - start,
+                error={"type": type(e).__name__, "message": str(e)},
+            )
+            self._write(event)
+            raise
+        event.update(duration=time.perf_counter() - start, response=encode(result))
+        self._write(event)
+        return result
+
+    def _write(self, event: Dict[str, Any]) -> None:
+        event["seq"] = self.events
+        self.events += 1
+        self._file.write(json.dumps(event, default=str) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+        logger.info(f"📼 Recorded {self.events} calls to {self.path}")
+
+
+class RunReplayer:
+    """
+    Serves recorded responses instead of calling the LLM or executing tools.
+
+    Calls are matched by kind and by a digest of their request. A call is
+    served the next unused event of its kind. If that event's digest differs,
+    later events are searched for an exact match first, because concurrent
+    calls (such as best-of-N planning) may complete in a different order. A
+    call with no matching event is recorded as a divergence. In strict mode it
+    also raises `ReplayDivergence`; otherwise it gets the next event anyway.
+
+    With ``timing="fast"`` responses are returned immediately, so a replay
+    measures the framework's own overhead. With ``timing="recorded"`` each
+    call waits for its recorded duration divided by ``speed``.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        timing: Literal["fast", "recorded"] = "fast",
+        speed: float = 1.0,
+        strict: bool = False,
+        ignore_patterns: tuple = DEFAULT_IGNORE_PATTERNS,
+    ):
+        self.path = Path(path)
+        self.timing = timing
+        self.speed = speed
+        self.strict = strict
+        self.ignore_patterns = tuple(re.compile(p) for p in ignore_patterns)
+        self.events: List[Dict[str, Any]] = []
+        with self.path.open(encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record.get("type") == "header":
+                    if record.get("version") != REPLAY_VERSION:
+                        raise ValueError(f"Unsupported recording version: {record.get('version')}")
+                elif record.get("type") == "call":
+                    self.events.append(record)
+        # Recorded digests are recomputed with this replayer's ignore patterns
+        for event in self.events:
+            event["digest"] = request_digest(event["request"], self.ignore_patterns)
+        self._used = [False] * len(self.events)
+        self._cursor: Dict[str, int] = {}
+        self.divergences: List[Divergence] = []
+        self.served = 0
+
+    async def handle(
+        self,
+        kind: str,
+        request: Any,
+        call: Callable[[], Awaitable[Any]],
+        encode: Callable[[Any], Any],
+        decode: Callable[[Any], Any],
+    ) -> Any:
+        digest = request_digest(to_jsonable(request), self.ignore_patterns)
+        position = self._match(kind, digest)
+        if position is None:
+            position = self._next_unused(kind)
+            self.divergences.append(
+                Divergence(
+                    kind=kind,
+                    position=-1 if position is None else position,
+                    expected_digest=None if position is None else self.events[position]["digest"],
+                    actual_digest=digest,
+                    actual_request=request,
+                )
+            )
+            logger.warning(f"Replay diverged at a {kind} call (event {position})")
+            if self.strict or position is None:
+                raise ReplayDivergence(
+                    f"No recorded {kind} call matches the request"
+                    if position is not None
+                    else f"Recording has no more {kind} calls"
+                )
+
+        self._used[position] = True
+        self.served += 1
+        event = self.events[position]
+        if self.timing == "recorded" and event.get("duration"):
+            await asyncio.sleep(event["duration"] / self.speed)
+
+        if "error" in event:
+            error = event["error"]
+            raise ReplayedError(f"{error['type']}: {error['message']}")
+        return decode(event.get("response"))
+
+    def _next_unused(self, kind: str) -> Optional[int]:
+        start = self._cursor.get(kind, 0)
+        for position in range(start, len(self.events)):
+            if not self._used[position] and self.events[position]["kind"] == kind:
+                self._cursor[kind] = position
+                return position
+        self._cursor[kind] = len(self.events)
+        return None
+
+    def _match(self, kind: str, digest: str) -> Optional[int]:
+        position = self._next_unused(kind)
+        if position is None:
+            return None
+        for candidate in range(position, len(self.events)):
+            event = self.events[candidate]
+            if not self._used[candidate] and event["kind"] == kind and event["digest"] == digest:
+                return candidate
+        return None
+
+    def remaining(self) -> int:
+        """Number of recorded calls that were never served."""
+        return self._used.count(False)
+
+    def report(self) -> str:
+        """Summarise how closely the replay followed the recording."""
+        status = "matched the recording" if not self.divergences else "DIVERGED"
+        return (
+            f"Replay {status}: served {self.served}/{len(self.events)} recorded calls, "
+            f"{len(self.divergences)} divergence(s), {self.remaining()} unused"
+        )
+
+    def close(self) -> None:
+        logger.info(self.report())
+
+
+ReplaySession = Union[RunRecorder, RunReplayer]
+
+_session: ContextVar[Optional[ReplaySession]] = ContextVar("replay_session", default=None)
+
+
+def get_replay_session() -> Optional[ReplaySession]:
+    """Return the recorder or replayer active in the current context."""
+    return _session.get()
+
+
+@contextmanager
+def replay_context(session: Optional[ReplaySession]):
+    """Record or replay every intercepted call made inside the block."""
+    token = _session.set(session)
+    try:
+        yield session
+    finally:
+        _session.reset(token)
+        if session is not None:
+            session.close()
+
+
+def request_digest(request: Any, ignore_patterns: tuple) -> str:
+    """Hash a request canonically, masking values that vary between runs."""
+    text = json.dumps(request, sort_keys=True, default=str)
+    for pattern in ignore_patterns:
+        text = pattern.sub("<ignored>", text)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def recordable(
+    kind: str,
+    encode: Callable[[Any], Any] = to_jsonable,
+    decode: Callable[[Any], Any] = lambda value: value,
+):
+    """Route an async method through the active recorder or replayer.
+
+    The request is the method's bound arguments (excluding ``self``) converted
+    to JSON. ``encode`` and ``decode`` convert the result to and from its
+    recorded form. Without an active session the method is called directly.
+    """
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            session = _session.get()
+            if session is None:
+                return await func(*args, **kwargs)
+
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            arguments.pop("self", None)
+            arguments.update(arguments.pop("kwargs", None) or {})
+            request = to_jsonable(arguments)
+            return await session.handle(
+                kind, request, lambda: func(*args, **kwargs), encode, decode
+            )
+
+        return wrapper
+
+    return decorator
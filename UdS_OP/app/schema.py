@@ -1,7 +1,9 @@
+from collections import deque
 from enum import Enum
-from typing import Any, List, Literal, Optional, Union
+from itertools import count, islice
+from typing import Any, Callable, Deque, Dict, List, Literal, Optional, Union
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 
 class Role(str, Enum):
     """Message role options"""
@@ -137,29 +139,127 @@ class Message(BaseModel):
         )
 
 
+class _MessageIndex:
+    """Ids and cached dict forms of the messages held by a Memory"""
+
+    __slots__ = ("ids", "counter", "dict_cache")
+
+    def __init__(self):
+        self.ids: Deque[int] = deque()
+        self.counter = count()
+        self.dict_cache: Dict[int, dict] = {}
+
+
 class Memory(BaseModel):
-    messages: List[Message] = Field(default_factory=list)
+    """
+    Bounded message store backed by a deque.
+
+    Appends and evictions are O(1). Every message gets a stable integer id
+    that survives eviction of older messages. Messages are treated as
+    immutable once added, which lets their serialised form be cached for the
+    LLM payload. Eviction never separates an assistant tool call from its tool
+    responses.
+    """
+
+    messages: Deque[Message] = Field(default_factory=deque)
     max_messages: int = Field(default=100)
+    on_evict: Optional[Callable[[List[Message]], None]] = Field(
+        default=None, exclude=True, description="Called with evicted messages"
+    )
+
+    _index: _MessageIndex = PrivateAttr(default_factory=_MessageIndex)
+
+    def model_post_init(self, __context: Any) -> None:
+        index = self._index
+        for _ in self.messages:
+            index.ids.append(next(index.counter))
 
-    def add_message(self, message: Message) -> None:
-        """Add a message to memory"""
-        self.messages.append(message)
-        # Optional: Implement message limit
-        if len(self.messages) > self.max_messages:
-            self.messages = self.messages[-self.max_messages :]
+    def add_message(self, message: Message) -> int:
+        """Add a message to memory and return its id"""
+        index = self._index
+        message_id = next(index.counter)
+        messages = self.messages
+        messages.append(message)
+        index.ids.append(message_id)
+        if len(messages) > self.max_messages:
+            self._evict()
+        return message_id
 
-    def add_messages(self, messages: List[Message]) -> None:
+    def add_messages(self, messages: List[Message]) -> List[int]:
         """Add multiple messages to memory"""
-        self.messages.extend(messages)
+        return [self.add_message(message) for message in messages]
+
+    def _pop_oldest(self, index: _MessageIndex) -> Message:
+        index.dict_cache.pop(index.ids.popleft(), None)
+        return self.messages.popleft()
+
+    def _evict(self) -> None:
+        """Drop the oldest messages until within the limit, keeping tool pairs intact."""
+        index = self._index
+        evicted = []
+        while len(self.messages) > self.max_messages:
+            evicted.append(self._pop_oldest(index))
+            # Tool responses whose assistant tool call was evicted go with it
+            while self.messages and self.messages[0].role == Role.TOOL:
+                evicted.append(self._pop_oldest(index))
+        if evicted and self.on_evict:
+            self.on_evict(evicted)
 
     def clear(self) -> None:
         """Clear all messages"""
         self.messages.clear()
+        self._index.ids.clear()
+        self._index.dict_cache.clear()
+
+    def replace_oldest(self, last_id: int, message: Message) -> bool:
+        """Replace every message up to and including `last_id` with `message`.
+
+        The replacement takes over `last_id`, so ids stay ordered. Returns False
+        if `last_id` has already been evicted.
+        """
+        index = self._index
+        if last_id not in index.ids:
+            return False
+        while index.ids[0] != last_id:
+            self._pop_oldest(index)
+        self._pop_oldest(index)
+        self.messages.appendleft(message)
+        index.ids.appendleft(last_id)
+        return True
+
+    def ids(self) -> List[int]:
+        """Return the ids of the stored messages, oldest first"""
+        return list(self._index.ids)
+
+    def get_message(self, message_id: int) -> Optional[Message]:
+        """Get a stored message by id"""
+        ids = self._index.ids
+        if not ids or not ids[0] <= message_id <= ids[-1]:
+            return None
+        for stored_id, message in zip(reversed(ids), reversed(self.messages)):
+            if stored_id == message_id:
+                return message
+        return None
 
     def get_recent_messages(self, n: int) -> List[Message]:
         """Get n most recent messages"""
-        return self.messages[-n:]
+        if n <= 0:
+            return []
+        start = max(len(self.messages) - n, 0)
+        return list(islice(self.messages, start, None))
+
+    def view(self) -> List[Message]:
+        """Return the stored messages as a list, oldest first"""
+        return list(self.messages)
 
     def to_dict_list(self) -> List[dict]:
-        """Convert messages to list of dicts"""
-        return [msg.to_dict() for msg in self.messages]
+        """Convert messages to list of dicts, reusing cached conversions"""
+        index = self._index
+        cache = index.dict_cache
+        result = []
+        for message_id, message in zip(index.ids, self.messages):
+            message_dict = cache.get(message_id)
+            if message_dict is None:
+                message_dict = cache[message_id] = message.to_dict()
+            result.append(message_dict)
+        return result
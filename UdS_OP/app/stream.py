@@ -0,0 +1,280 @@
+"""Pluggable sinks for streamed tokens and agent progress events."""
+import asyncio
+import sys
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import Enum
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from pydantic import BaseModel, Field
+
+from app.usage import current_usage_tags
+
+
+class EventType(str, Enum):
+    """Kinds of events emitted while an agent is running"""
+
+    TOKEN = "token"
+    TOOL_CALL_DELTA = "tool_call_delta"
+    RESPONSE_END = "response_end"
+    STEP_START = "step_start"
+    STEP_END = "step_end"
+    TOOL_RESULT = "tool_result"
+
+
+class StreamEvent(BaseModel):
+    """A single streamed event"""
+
+    type: EventType
+    content: str = ""
+    agent: Optional[str] = None
+    step: Optional[int] = None
+    data: Dict[str, Any] = Field(default_factory=dict)
+    timestamp: float = Field(default_factory=time.time)
+
+    def to_sse(self) -> str:
+        """Format the event as a Server-Sent Events message."""
+        return f"event: {self.type.value}\ndata: {self.model_dump_json()}\n\n"
+
+
+def coalesce_tokens(events: List[StreamEvent]) -> List[StreamEvent]:
+    """Merge runs of consecutive token events from the same agent into one event."""
+    merged: List[StreamEvent] = []
+    for event in events:
+        last = merged[-1] if merged else None
+        if (
+            last is not None
+            and event.type == EventType.TOKEN
+            and last.type == EventType.TOKEN
+            and last.agent == event.agent
+            and last.step == event.step
+        ):
+            merged[-1] = last.model_copy(update={"content": last.content + event.content})
+        else:
+            merged.append(event)
+    return merged
+
+
+class EventSink(ABC):
+    """Destination for stream events."""
+
+    @abstractmethod
+    async def emit(self, event: StreamEvent) -> None:
+        """Accept an event. Implementations must not block on slow consumers."""
+
+    async def flush(self) -> None:
+        """Deliver any buffered events."""
+
+    async def aclose(self) -> None:
+        """Flush and release the sink."""
+        await self.flush()
+
+
+class BufferedSink(EventSink):
+    """Sink that batches token events and writes them in coalesced chunks.
+
+    Tokens are buffered until ``flush_interval`` seconds have passed, the buffer
+    holds ``max_buffer`` events, or a non-token event arrives, so the writer is
+    invoked once per batch instead of once per token.
+    """
+
+    def __init__(self, flush_interval: float = 0.05, max_buffer: int = 64):
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer: List[StreamEvent] = []
+        self._last_flush = time.monotonic()
+
+    async def emit(self, event: StreamEvent) -> None:
+        self._buffer.append(event)
+        if (
+            event.type != EventType.TOKEN
+            or len(self._buffer) >= self.max_buffer
+            or time.monotonic() - self._last_flush >= self.flush_interval
+        ):
+            await self.flush()
+
+    async def flush(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        batch, self._buffer = coalesce_tokens(self._buffer), []
+        await self._write_batch(batch)
+
+    @abstractmethod
+    async def _write_batch(self, events: List[StreamEvent]) -> None:
+        """Write a batch of coalesced events."""
+
+
+class ConsoleSink(BufferedSink):
+    """Writes streamed tokens to stdout in batches."""
+
+    def __init__(self, stream=None, **kwargs):
+        super().__init__(**kwargs)
+        self.stream = stream or sys.stdout
+
+    async def _write_batch(self, events: List[StreamEvent]) -> None:
+        text = "".join(
+            event.content if event.type == EventType.TOKEN else "\n"
+            for event in events
+            if event.type in (EventType.TOKEN, EventType.RESPONSE_END)
+        )
+        if text:
+            self.stream.write(text)
+            self.stream.flush()
+
+
+class CallbackSink(BufferedSink):
+    """Hands batches of events to a callback, e.g. a GUI scheduling function.
+
+    The callback must return quickly; GUI toolkits should use it to schedule
+    rendering on their own thread (such as ``tk.Tk.after``).
+    """
+
+    def __init__(self, callback: Callable[[List[StreamEvent]], Any], **kwargs):
+        super().__init__(**kwargs)
+        self.callback = callback
+
+    async def _write_batch(self, events: List[StreamEvent]) -> None:
+        self.callback(events)
+
+
+class _Subscriber:
+    """Bounded per-consumer event queue used by ``StreamingSink``."""
+
+    def __init__(self, max_pending: int):
+        self.max_pending = max_pending
+        self.pending: deque = deque()
+        self.ready = asyncio.Event()
+        self.dropped = 0
+        self.closed = False
+
+    def push(self, event: StreamEvent) -> None:
+        if self.pending:
+            last = self.pending[-1]
+            if (
+                event.type == EventType.TOKEN
+                and last.type == EventType.TOKEN
+                and last.agent == event.agent
+            ):
+                # Tokens are folded into the pending event instead of queued
+                self.pending[-1] = last.model_copy(
+                    update={"content": last.content + event.content}
+                )
+                self.ready.set()
+                return
+        if len(self.pending) >= self.max_pending:
+            self.pending.popleft()
+            self.dropped += 1
+        self.pending.append(event)
+        self.ready.set()
+
+
+class StreamingSink(BufferedSink):
+    """Fans events out to WebSocket or SSE consumers.
+
+    Each consumer gets a bounded queue. A slow consumer never stalls generation:
+    its pending tokens are merged, and once its queue is full the oldest events
+    are dropped and counted in ``dropped``. Producers and consumers must share
+    one event loop.
+    """
+
+    def __init__(self, max_pending: int = 256, **kwargs):
+        super().__init__(**kwargs)
+        self.max_pending = max_pending
+        self._subscribers: List[_Subscriber] = []
+        self.dropped = 0
+
+    async def _write_batch(self, events: List[StreamEvent]) -> None:
+        for subscriber in self._subscribers:
+            before = subscriber.dropped
+            for event in events:
+                subscriber.push(event)
+            self.dropped += subscriber.dropped - before
+
+    async def events(self) -> AsyncIterator[StreamEvent]:
+        """Yield events as they arrive, e.g. to send over a WebSocket."""
+        subscriber = _Subscriber(self.max_pending)
+        self._subscribers.append(subscriber)
+        try:
+            while not subscriber.closed or subscriber.pending:
+                if not subscriber.pending:
+                    subscriber.ready.clear()
+                    await subscriber.ready.wait()
+                    continue
+                yield subscriber.pending.popleft()
+        finally:
+            self._subscribers.remove(subscriber)
+
+    async def sse(self) -> AsyncIterator[str]:
+        """Yield events formatted as Server-Sent Events."""
+        async for event in self.events():
+            yield event.to_sse()
+
+    async def aclose(self) -> None:
+        await self.flush()
+        for subscriber in self._subscribers:
+            subscriber.closed = True
+            subscriber.ready.set()
+
+
+class TapSink(EventSink):
+    """Forwards every event to another sink, first handing selected types to a handler.
+
+    Used to react to a response while it is still streaming, e.g. to parse
+    the arguments of a tool call from its ``TOOL_CALL_DELTA`` events.
+    """
+
+    def __init__(
+        self,
+        forward: EventSink,
+        handler: Callable[[StreamEvent], Awaitable[None]],
+        types: Iterable[EventType] = (EventType.TOOL_CALL_DELTA,),
+    ):
+        self.forward = forward
+        self.handler = handler
+        self.types = frozenset(types)
+
+    async def emit(self, event: StreamEvent) -> None:
+        if event.type in self.types:
+            await self.handler(event)
+        await self.forward.emit(event)
+
+    async def flush(self) -> None:
+        await self.forward.flush()
+
+
+console_sink = ConsoleSink()
+
+_current_sink: ContextVar[Optional[EventSink]] = ContextVar("event_sink", default=None)
+
+
+def get_event_sink() -> EventSink:
+    """Return the sink for the current context, defaulting to the console."""
+    return _current_sink.get() or console_sink
+
+
+@contextmanager
+def event_sink_context(sink: Optional[EventSink]):
+    """Route events emitted inside the block (and its tasks) to ``sink``."""
+    token = _current_sink.set(sink)
+    try:
+        yield
+    finally:
+        _current_sink.reset(token)
+
+
+async def emit_event(event_type: EventType, content: str = "", **data) -> None:
+    """Emit an event to the current sink, tagged with the active agent and step."""
+    tags = current_usage_tags()
+    await get_event_sink().emit(
+        StreamEvent(
+            type=event_type,
+            content=content,
+            agent=tags.get("agent"),
+            step=tags.get("step"),
+            data=data,
+        )
+    )
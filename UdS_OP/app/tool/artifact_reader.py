@@ -0,0 +1,124 @@
+import re
+from typing import Optional
+
+from app.artifacts import ARTIFACT_READER_NAME, ArtifactError, artifact_store
+from app.tool.base import BaseTool, ToolResult
+
+
+_ARTIFACT_READER_DESCRIPTION = """Read a large tool output that was stored as an artifact.
+Long outputs are shown as a short preview followed by a handle such as `artifact:3f2a...`.
+Use this tool to see the rest without loading everything into the conversation:
+- 'page': Return a page of lines (1-based page number)
+- 'grep': Return lines matching a regular expression, with surrounding context
+- 'info': Show the artifact's type, size and origin
+"""
+
+
+class ArtifactReader(BaseTool):
+    name: str = ARTIFACT_READER_NAME
+    description: str = _ARTIFACT_READER_DESCRIPTION
+    parameters: dict = {
+        "type": "object",
+        "properties": {
+            "artifact_id": {
+                "type": "string",
+                "description": "(required) Artifact handle, e.g. `artifact:3f2a9c...`.",
+            },
+            "action": {
+                "type": "string",
+                "enum": ["page", "grep", "info"],
+                "description": "(optional) What to read. Default is 'page'.",
+            },
+            "page": {
+                "type": "integer",
+                "description": "(optional) Page number for 'page', starting at 1.",
+            },
+            "page_size": {
+                "type": "integer",
+                "description": "(optional) Lines per page for 'page'. Default is 100.",
+            },
+            "pattern": {
+                "type": "string",
+                "description": "(optional) Regular expression for 'grep'.",
+            },
+            "context": {
+                "type": "integer",
+                "description": "(optional) Lines of context around each 'grep' match. Default is 2.",
+            },
+        },
+        "required": ["artifact_id"],
+    }
+
+    max_chars: int = 8000
+    max_matches: int = 50
+
+    async def execute(
+        self,
+        artifact_id: str,
+        action: str = "page",
+        page: int = 1,
+        page_size: int = 100,
+        pattern: Optional[str] = None,
+        context: int = 2,
+    ) -> ToolResult:
+        artifact = artifact_store.info(artifact_id)
+        if artifact is None:
+            return ToolResult(error=f"Unknown or evicted artifact: {artifact_id}")
+
+        if action == "info":
+            return ToolResult(
+                output=f"artifact:{artifact.id} ({artifact.mime}, {artifact.size} bytes, "
+                f"from {artifact.source or 'unknown'})"
+            )
+        if not artifact.is_text:
+            return ToolResult(
+                error=f"artifact:{artifact.id} is {artifact.mime} and cannot be read as text"
+            )
+
+        try:
+            lines = artifact_store.get_text(artifact.id).splitlines()
+        except ArtifactError as e:
+            return ToolResult(error=str(e))
+
+        if action == "page":
+            page_size = max(page_size, 1)
+            pages = max((len(lines) + page_size - 1) // page_size, 1)
+            page = min(max(page, 1), pages)
+            start = (page - 1) * page_size
+            body = "\n".join(lines[start : start + page_size])
+            header = f"[artifact:{artifact.id} page {page}/{pages}, lines {start + 1}-{min(start + page_size, len(lines))} of {len(lines)}]"
+            return ToolResult(output=self._clip(f"{header}\n{body}"))
+
+        if action == "grep":
+            if not pattern:
+                return ToolResult(error="Pattern is required for 'grep' action")
+            try:
+                regex = re.compile(pattern, re.IGNORECASE)
+            except re.error as e:
+                return ToolResult(error=f"Invalid pattern: {e}")
+
+            blocks, matches, last_end = [], 0, -1
+            for number, line in enumerate(lines):
+                if not regex.search(line):
+                    continue
+                matches += 1
+                if matches > self.max_matches:
+                    break
+                start = max(number - context, last_end + 1)
+                end = min(number + context, len(lines) - 1)
+                if start > last_end + 1 and blocks:
+                    blocks.append("--")
+                blocks.extend(f"{i + 1}: {lines[i]}" for i in range(start, end + 1))
+                last_end = end
+            if not matches:
+                return ToolResult(output=f"No lines in artifact:{artifact.id} match {pattern!r}")
+            more = " (showing the first matches)" if matches > self.max_matches else ""
+            header = f"[artifact:{artifact.id} matches for {pattern!r}{more}]"
+            return ToolResult(output=self._clip(header + "\n" + "\n".join(blocks)))
+
+        return ToolResult(error=f"Unknown action: {action}")
+
+    def _clip(self, text: str) -> str:
+        if len(text) <= self.max_chars:
+            return text
+        return text[: self.max_chars] + "\n...[use a smaller page_size or a narrower pattern]"
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Optional
+from typing import Any, ClassVar, Dict, Optional
 
 from pydantic import BaseModel, Field
 
@@ -8,6 +8,8 @@ class BaseTool(ABC, BaseModel):
     name: str
     description: str
     parameters: Optional[dict] = None
+    # Scheduler resource ("browser", "process") a call holds a slot of, if any
+    scheduler_resource: ClassVar[Optional[str]] = None
 
     class Config:
         arbitrary_types_allowed = True
@@ -20,6 +22,19 @@ class BaseTool(ABC, BaseModel):
     async def execute(self, **kwargs) -> Any:
         """Execute the tool with given parameters."""
 
+    async def cleanup(self) -> None:
+        """Release subprocesses, browser pages and other resources held by the tool."""
+
+    async def warm_up(self) -> None:
+        """Start browsers, sessions or connections ahead of the first call."""
+
+    def checkpoint_state(self) -> Optional[dict]:
+        """Return JSON-serialisable state to checkpoint, or None if stateless."""
+        return None
+
+    def restore_checkpoint(self, state: dict) -> None:
+        """Restore state produced by `checkpoint_state`."""
+
     def to_param(self) -> Dict:
         """Convert tool to function call format."""
         return {
@@ -1,5 +1,6 @@
 import asyncio
 import os
+import signal
 from typing import Optional
 
 from app.exceptions import ToolError
@@ -50,7 +51,11 @@ class _BashSession:
             raise ToolError("Session has not started.")
         if self._process.returncode is not None:
             return
-        self._process.terminate()
+        # The shell leads its own process group; stop the commands it started too
+        try:
+            os.killpg(self._process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
 
     async def run(self, command: str):
         """Execute a command in the bash shell."""
@@ -91,6 +96,10 @@ class _BashSession:
                         # strip the sentinel and break
                         output = output[: output.index(self._sentinel)]
                         break
+        except asyncio.CancelledError:
+            # The command is still running and the output buffers are out of sync
+            self.stop()
+            raise
         except asyncio.TimeoutError:
             self._timed_out = True
             raise ToolError(
@@ -151,6 +160,12 @@ class Bash(BaseTool):
 
         raise ToolError("no command provided.")
 
+    async def cleanup(self):
+        """Stop the shell session and the commands running in it."""
+        if self._session:
+            self._session.stop()
+            self._session = None
+
 
 if __name__ == "__main__":
     bash = Bash()
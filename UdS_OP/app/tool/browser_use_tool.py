@@ -1,6 +1,7 @@
 import asyncio
+import base64
 import json
-from typing import Optional
+from typing import ClassVar, Optional
 
 from browser_use import Browser as BrowserUseBrowser
 from browser_use import BrowserConfig
@@ -9,6 +10,7 @@ from browser_use.dom.service import DomService
 from pydantic import Field, field_validator
 from pydantic_core.core_schema import ValidationInfo
 
+from app.artifacts import ArtifactError, artifact_store
 from app.config import config
 from app.tool.base import BaseTool, ToolResult
 
@@ -37,6 +39,7 @@ content extraction, and tab management. Supported actions include:
 class BrowserUseTool(BaseTool):
     name: str = "browser_use"
     description: str = _BROWSER_DESCRIPTION
+    scheduler_resource: ClassVar[Optional[str]] = "browser"
     parameters: dict = {
         "type": "object",
         "properties": {
@@ -216,21 +219,39 @@ class BrowserUseTool(BaseTool):
 
                 elif action == "screenshot":
                     screenshot = await context.take_screenshot(full_page=True)
+                    # Keep the image on disk rather than base64 in the result
+                    try:
+                        artifact = await asyncio.to_thread(
+                            artifact_store.put,
+                            base64.b64decode(screenshot),
+                            "image/png",
+                            "browser_use.screenshot",
+                        )
+                    except (ArtifactError, ValueError):
+                        return ToolResult(
+                            output=f"Screenshot captured (base64 length: {len(screenshot)})",
+                            system=screenshot,
+                        )
                     return ToolResult(
-                        output=f"Screenshot captured (base64 length: {len(screenshot)})",
-                        system=screenshot,
+                        output=f"Screenshot captured as artifact:{artifact.id} ({artifact.size} bytes PNG)",
+                        system=f"artifact:{artifact.id}",
                     )
 
                 elif action == "get_html":
                     html = await context.get_page_html()
-                    truncated = (
-                        html[:MAX_LENGTH] + "..." if len(html) > MAX_LENGTH else html
+                    return ToolResult(
+                        output=await artifact_store.aoffload(
+                            html, source="browser_use.get_html", limit=MAX_LENGTH
+                        )
                     )
-                    return ToolResult(output=truncated)
 
                 elif action == "get_text":
                     text = await context.execute_javascript("document.body.innerText")
-                    return ToolResult(output=text)
+                    return ToolResult(
+                        output=await artifact_store.aoffload(
+                            text or "", source="browser_use.get_text"
+                        )
+                    )
 
                 elif action == "read_links":
                     links = await context.execute_javascript(
@@ -303,6 +324,11 @@ class BrowserUseTool(BaseTool):
             except Exception as e:
                 return ToolResult(error=f"Failed to get browser state: {str(e)}")
 
+    async def warm_up(self) -> None:
+        """Launch the browser and open a page before the first action."""
+        async with self.lock:
+            await self._ensure_browser_initialized()
+
     async def cleanup(self):
         """Clean up browser resources."""
         async with self.lock:
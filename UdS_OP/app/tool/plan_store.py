@@ -0,0 +1,342 @@
+"""Storage backends for PlanningTool: in-process memory and a shared SQLite file."""
+import copy
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from app.config import WORKSPACE_ROOT, PlanningSettings, config
+
+
+STEP_STATUSES = ("not_started", "in_progress", "completed", "blocked")
+ACTIVE_STEP_STATUSES = ("not_started", "in_progress")
+
+# (step index, new status or None, new notes or None)
+StepUpdate = Tuple[int, Optional[str], Optional[str]]
+
+
+class PlanStore(ABC):
+    """
+    Where plans live.
+
+    Plans are exchanged as dicts with ``plan_id``, ``title``, ``steps``,
+    ``step_statuses`` and ``step_notes``. Dicts returned by `get` are copies;
+    changes are written back with `replace` or `update_steps`.
+    """
+
+    # Whether plans outlive the process (and need no checkpointing)
+    persistent: bool = False
+
+    @abstractmethod
+    def get(self, plan_id: str) -> Optional[dict]:
+        """Return a copy of a plan, or None."""
+
+    @abstractmethod
+    def exists(self, plan_id: str) -> bool:
+        """Whether a plan with this id is stored."""
+
+    @abstractmethod
+    def create(self, plan: dict) -> bool:
+        """Store a new plan; returns False if the id is taken."""
+
+    @abstractmethod
+    def replace(self, plan: dict) -> None:
+        """Overwrite the title, steps, statuses and notes of an existing plan."""
+
+    @abstractmethod
+    def delete(self, plan_id: str) -> bool:
+        """Remove a plan; returns False if it did not exist."""
+
+    @abstractmethod
+    def summaries(self) -> List[Tuple[str, str, int, int]]:
+        """Return ``(plan_id, title, completed steps, total steps)`` for every plan."""
+
+    @abstractmethod
+    def update_steps(self, plan_id: str, updates: Iterable[StepUpdate]) -> None:
+        """Apply several status and note changes to a plan at once."""
+
+    @abstractmethod
+    def next_pending(self, plan_id: str) -> Optional[Tuple[int, str]]:
+        """Index and text of the first step not yet completed or blocked."""
+
+    @abstractmethod
+    def status_counts(self, plan_id: str) -> Dict[str, int]:
+        """Number of steps in each status."""
+
+    def all(self) -> Dict[str, dict]:
+        """Copies of every plan, keyed by id."""
+        return {plan_id: self.get(plan_id) for plan_id, *_ in self.summaries()}
+
+    def close(self) -> None:
+        """Release the backend's resources."""
+
+
+class _PlanIndex:
+    """Status counts of a plan and a pointer to its first step still to do."""
+
+    __slots__ = ("counts", "next_pending")
+
+    def __init__(self, statuses: List[str]):
+        self.counts = Counter(statuses)
+        self.next_pending = 0
+        self._advance(statuses)
+
+    def _advance(self, statuses: List[str]) -> None:
+        # Moves forward only, so finding the current step is amortised O(1)
+        while (
+            self.next_pending < len(statuses)
+            and statuses[self.next_pending] not in ACTIVE_STEP_STATUSES
+        ):
+            self.next_pending += 1
+
+    def update(self, statuses: List[str], index: int, old: str, new: str) -> None:
+        """Record that step `index` changed from `old` to `new` (already applied)."""
+        self.counts[old] -= 1
+        self.counts[new] += 1
+        if new in ACTIVE_STEP_STATUSES:
+            self.next_pending = min(self.next_pending, index)
+        elif index == self.next_pending:
+            self._advance(statuses)
+
+
+class MemoryPlanStore(PlanStore):
+    """Plans in a dict, with an in-memory status index per plan."""
+
+    def __init__(self):
+        self._plans: Dict[str, dict] = {}
+        self._indexes: Dict[str, _PlanIndex] = {}
+
+    def get(self, plan_id: str) -> Optional[dict]:
+        plan = self._plans.get(plan_id)
+        return copy.deepcopy(plan) if plan is not None else None
+
+    def exists(self, plan_id: str) -> bool:
+        return plan_id in self._plans
+
+    def create(self, plan: dict) -> bool:
+        if plan["plan_id"] in self._plans:
+            return False
+        self.replace(plan)
+        return True
+
+    def replace(self, plan: dict) -> None:
+        plan = copy.deepcopy(plan)
+        self._plans[plan["plan_id"]] = plan
+        self._indexes[plan["plan_id"]] = _PlanIndex(plan["step_statuses"])
+
+    def delete(self, plan_id: str) -> bool:
+        self._indexes.pop(plan_id, None)
+        return self._plans.pop(plan_id, None) is not None
+
+    def summaries(self) -> List[Tuple[str, str, int, int]]:
+        return [
+            (plan_id, plan["title"], self._indexes[plan_id].counts["completed"], len(plan["steps"]))
+            for plan_id, plan in self._plans.items()
+        ]
+
+    def update_steps(self, plan_id: str, updates: Iterable[StepUpdate]) -> None:
+        plan, index = self._plans[plan_id], self._indexes[plan_id]
+        statuses = plan["step_statuses"]
+        for step_index, status, notes in updates:
+            if status and statuses[step_index] != status:
+                old = statuses[step_index]
+                statuses[step_index] = status
+                index.update(statuses, step_index, old, status)
+            if notes:
+                plan["step_notes"][step_index] = notes
+
+    def next_pending(self, plan_id: str) -> Optional[Tuple[int, str]]:
+        steps = self._plans[plan_id]["steps"]
+        index = self._indexes[plan_id].next_pending
+        return (index, steps[index]) if index < len(steps) else None
+
+    def status_counts(self, plan_id: str) -> Dict[str, int]:
+        counts = self._indexes[plan_id].counts
+        return {status: counts[status] for status in STEP_STATUSES}
+
+    def all(self) -> Dict[str, dict]:
+        return copy.deepcopy(self._plans)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS plans (
+    plan_id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS steps (
+    plan_id TEXT NOT NULL REFERENCES plans(plan_id) ON DELETE CASCADE,
+    idx INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'not_started',
+    notes TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (plan_id, idx)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS steps_by_status ON steps (plan_id, status);
+CREATE INDEX IF NOT EXISTS steps_pending ON steps (plan_id, idx)
+    WHERE status IN ('not_started', 'in_progress');
+"""
+
+
+class SqlitePlanStore(PlanStore):
+    """
+    Plans in a SQLite database in WAL mode, shared by flows and processes.
+
+    WAL lets readers proceed while one writer commits, so concurrent flows
+    and worker processes need no lock of their own; SQLite serialises writes
+    and waits up to `busy_timeout` seconds for a busy database. Each thread
+    gets its own connection. The next pending step and the status counts are
+    answered from indexes on ``(plan_id, idx)`` for open steps and
+    ``(plan_id, status)``, and `update_steps` writes a batch of changes in one
+    transaction.
+    """
+
+    persistent = True
+
+    def __init__(self, path: Union[str, Path], busy_timeout: float = 10.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def get(self, plan_id: str) -> Optional[dict]:
+        conn = self._connection()
+        row = conn.execute("SELECT title FROM plans WHERE plan_id = ?", (plan_id,)).fetchone()
+        if row is None:
+            return None
+        steps = conn.execute(
+            "SELECT text, status, notes FROM steps WHERE plan_id = ? ORDER BY idx", (plan_id,)
+        ).fetchall()
+        return {
+            "plan_id": plan_id,
+            "title": row[0],
+            "steps": [step[0] for step in steps],
+            "step_statuses": [step[1] for step in steps],
+            "step_notes": [step[2] for step in steps],
+        }
+
+    def exists(self, plan_id: str) -> bool:
+        return (
+            self._connection()
+            .execute("SELECT 1 FROM plans WHERE plan_id = ?", (plan_id,))
+            .fetchone()
+            is not None
+        )
+
+    def create(self, plan: dict) -> bool:
+        try:
+            with self._connection() as conn:
+                conn.execute(
+                    "INSERT INTO plans (plan_id, title, updated_at) VALUES (?, ?, ?)",
+                    (plan["plan_id"], plan["title"], time.time()),
+                )
+                self._insert_steps(conn, plan)
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def replace(self, plan: dict) -> None:
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO plans (plan_id, title, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (plan_id) DO UPDATE SET title = excluded.title, "
+                "updated_at = excluded.updated_at",
+                (plan["plan_id"], plan["title"], time.time()),
+            )
+            conn.execute("DELETE FROM steps WHERE plan_id = ?", (plan["plan_id"],))
+            self._insert_steps(conn, plan)
+
+    @staticmethod
+    def _insert_steps(conn: sqlite3.Connection, plan: dict) -> None:
+        conn.executemany(
+            "INSERT INTO steps (plan_id, idx, text, status, notes) VALUES (?, ?, ?, ?, ?)",
+            [
+                (plan["plan_id"], index, text, status, notes or "")
+                for index, (text, status, notes) in enumerate(
+                    zip(plan["steps"], plan["step_statuses"], plan["step_notes"])
+                )
+            ],
+        )
+
+    def delete(self, plan_id: str) -> bool:
+        with self._connection() as conn:
+            cursor = conn.execute("DELETE FROM plans WHERE plan_id = ?", (plan_id,))
+        return cursor.rowcount > 0
+
+    def summaries(self) -> List[Tuple[str, str, int, int]]:
+        rows = self._connection().execute(
+            "SELECT p.plan_id, p.title, "
+            "COALESCE(SUM(s.status = 'completed'), 0), COUNT(s.idx) "
+            "FROM plans p LEFT JOIN steps s ON s.plan_id = p.plan_id "
+            "GROUP BY p.plan_id ORDER BY p.updated_at"
+        ).fetchall()
+        return [tuple(row) for row in rows]
+
+    def update_steps(self, plan_id: str, updates: Iterable[StepUpdate]) -> None:
+        statuses, notes = [], []
+        for step_index, status, note in updates:
+            if status:
+                statuses.append((status, plan_id, step_index))
+            if note:
+                notes.append((note, plan_id, step_index))
+        if not statuses and not notes:
+            return
+        with self._connection() as conn:
+            conn.executemany("UPDATE steps SET status = ? WHERE plan_id = ? AND idx = ?", statuses)
+            conn.executemany("UPDATE steps SET notes = ? WHERE plan_id = ? AND idx = ?", notes)
+            conn.execute(
+                "UPDATE plans SET updated_at = ? WHERE plan_id = ?", (time.time(), plan_id)
+            )
+
+    def next_pending(self, plan_id: str) -> Optional[Tuple[int, str]]:
+        row = (
+            self._connection()
+            .execute(
+                "SELECT idx, text FROM steps WHERE plan_id = ? "
+                "AND status IN ('not_started', 'in_progress') ORDER BY idx LIMIT 1",
+                (plan_id,),
+            )
+            .fetchone()
+        )
+        return tuple(row) if row else None
+
+    def status_counts(self, plan_id: str) -> Dict[str, int]:
+        counts = dict.fromkeys(STEP_STATUSES, 0)
+        counts.update(
+            self._connection()
+            .execute(
+                "SELECT status, COUNT(*) FROM steps WHERE plan_id = ? GROUP BY status",
+                (plan_id,),
+            )
+            .fetchall()
+        )
+        return counts
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def create_plan_store(settings: Optional[PlanningSettings] = None) -> PlanStore:
+    """Create the store selected by the ``[planning]`` configuration."""
+    settings = settings or config.planning_config or PlanningSettings()
+    if settings.storage == "sqlite":
+        return SqlitePlanStore(settings.database or WORKSPACE_ROOT / "plans.db")
+    return MemoryPlanStore()
@@ -1,8 +1,12 @@
 # tool/planning.py
-from typing import Dict, List, Literal, Optional
+from collections import Counter
+from typing import Dict, List, Literal, Optional, Tuple
+
+from pydantic import Field
 
 from app.exceptions import ToolError
 from app.tool.base import BaseTool, ToolResult
+from app.tool.plan_store import STEP_STATUSES, PlanStore, create_plan_store
 
 
 _PLANNING_TOOL_DESCRIPTION = """
@@ -10,7 +14,6 @@ A planning tool that allows the agent to create and manage plans for solving com
 The tool provides functionality for creating plans, updating plan steps, and tracking progress.
 """
 
-
 class PlanningTool(BaseTool):
     """
     A planning tool that allows the agent to create and manage plans for solving complex tasks.
@@ -66,7 +69,7 @@ class PlanningTool(BaseTool):
         "additionalProperties": False,
     }
 
-    plans: dict = {}  # Dictionary to store plans by plan_id
+    store: PlanStore = Field(default_factory=create_plan_store, exclude=True)
     _current_plan_id: Optional[str] = None  # Track the current active plan
 
     async def execute(
@@ -117,6 +120,97 @@ class PlanningTool(BaseTool):
                 f"Unrecognized command: {command}. Allowed commands are: create, update, list, get, set_active, mark_step, delete"
             )
 
+    @property
+    def plans(self) -> Dict[str, dict]:
+        """Copies of all stored plans, keyed by plan_id."""
+        return self.store.all()
+
+    def checkpoint_state(self) -> dict:
+        state = {"current_plan_id": self._current_plan_id}
+        if not self.store.persistent:
+            state["plans"] = self.store.all()
+        return state
+
+    def restore_checkpoint(self, state: dict) -> None:
+        for plan in state.get("plans", {}).values():
+            self.store.replace(plan)
+        self._current_plan_id = state.get("current_plan_id")
+
+    # Structured access for agents and flows, answered from the store's
+    # status index; text formatting is only needed for prompts.
+
+    @property
+    def current_plan_id(self) -> Optional[str]:
+        """ID of the plan this tool last created or activated."""
+        return self._current_plan_id
+
+    def has_plan(self, plan_id: Optional[str]) -> bool:
+        return bool(plan_id) and self.store.exists(plan_id)
+
+    def get_plan_data(self, plan_id: Optional[str] = None) -> Optional[dict]:
+        """Return a copy of a plan's title, steps, statuses and notes, or None."""
+        plan_id = plan_id or self._current_plan_id
+        return self.store.get(plan_id) if plan_id else None
+
+    def current_step(self, plan_id: Optional[str] = None) -> Optional[Tuple[int, str]]:
+        """Return the index and text of the first step not yet completed or blocked."""
+        return self.store.next_pending(self._require_plan_id(plan_id))
+
+    def start_next_step(self, plan_id: Optional[str] = None) -> Optional[Tuple[int, str]]:
+        """Mark the current step as in progress and return it, or None when all are done."""
+        plan_id = self._require_plan_id(plan_id)
+        step = self.store.next_pending(plan_id)
+        if step is not None:
+            self.store.update_steps(plan_id, [(step[0], "in_progress", None)])
+        return step
+
+    def status_counts(self, plan_id: Optional[str] = None) -> Dict[str, int]:
+        """Return the number of steps in each status."""
+        return self.store.status_counts(self._require_plan_id(plan_id))
+
+    def set_step_status(
+        self,
+        plan_id: Optional[str],
+        step_index: int,
+        status: Optional[str] = None,
+        notes: Optional[str] = None,
+    ) -> None:
+        """Update the status and/or notes of a step."""
+        self.update_steps(plan_id, [(step_index, status, notes)])
+
+    def update_steps(
+        self, plan_id: Optional[str], updates: List[Tuple[int, Optional[str], Optional[str]]]
+    ) -> None:
+        """Apply several ``(step_index, status, notes)`` changes in one write."""
+        plan_id = self._require_plan_id(plan_id)
+        total = sum(self.store.status_counts(plan_id).values())
+        for step_index, status, _ in updates:
+            if step_index < 0 or step_index >= total:
+                raise ToolError(
+                    f"Invalid step_index: {step_index}. Valid indices range from 0 to {total-1}."
+                )
+            if status and status not in STEP_STATUSES:
+                raise ToolError(
+                    f"Invalid step_status: {status}. Valid statuses are: not_started, in_progress, completed, blocked"
+                )
+        self.store.update_steps(plan_id, updates)
+
+    def format_plan(self, plan_id: Optional[str] = None) -> str:
+        """Render a plan as text for a prompt."""
+        return self._format_plan(self.store.get(self._require_plan_id(plan_id)))
+
+    def _require_plan_id(self, plan_id: Optional[str]) -> str:
+        if not plan_id:
+            # If no plan_id is provided, use the current active plan
+            if not self._current_plan_id:
+                raise ToolError(
+                    "No active plan. Please specify a plan_id or set an active plan."
+                )
+            plan_id = self._current_plan_id
+        if not self.store.exists(plan_id):
+            raise ToolError(f"No plan found with ID: {plan_id}")
+        return plan_id
+
     def _create_plan(
         self, plan_id: Optional[str], title: Optional[str], steps: Optional[List[str]]
     ) -> ToolResult:
@@ -124,11 +218,6 @@ class PlanningTool(BaseTool):
         if not plan_id:
             raise ToolError("Parameter `plan_id` is required for command: create")
 
-        if plan_id in self.plans:
-            raise ToolError(
-                f"A plan with ID '{plan_id}' already exists. Use 'update' to modify existing plans."
-            )
-
         if not title:
             raise ToolError("Parameter `title` is required for command: create")
 
@@ -150,7 +239,10 @@ class PlanningTool(BaseTool):
             "step_notes": [""] * len(steps),
         }
 
-        self.plans[plan_id] = plan
+        if not self.store.create(plan):
+            raise ToolError(
+                f"A plan with ID '{plan_id}' already exists. Use 'update' to modify existing plans."
+            )
         self._current_plan_id = plan_id  # Set as active plan
 
         return ToolResult(
@@ -164,11 +256,10 @@ class PlanningTool(BaseTool):
         if not plan_id:
             raise ToolError("Parameter `plan_id` is required for command: update")
 
-        if plan_id not in self.plans:
+        plan = self.store.get(plan_id)
+        if plan is None:
             raise ToolError(f"No plan found with ID: {plan_id}")
 
-        plan = self.plans[plan_id]
-
         if title:
             plan["title"] = title
 
@@ -202,56 +293,43 @@ class PlanningTool(BaseTool):
             plan["step_statuses"] = new_statuses
             plan["step_notes"] = new_notes
 
+        self.store.replace(plan)
         return ToolResult(
             output=f"Plan updated successfully: {plan_id}\n\n{self._format_plan(plan)}"
         )
 
     def _list_plans(self) -> ToolResult:
         """List all available plans."""
-        if not self.plans:
+        summaries = self.store.summaries()
+        if not summaries:
             return ToolResult(
                 output="No plans available. Create a plan with the 'create' command."
             )
 
         output = "Available plans:\n"
-        for plan_id, plan in self.plans.items():
+        for plan_id, title, completed, total in summaries:
             current_marker = " (active)" if plan_id == self._current_plan_id else ""
-            completed = sum(
-                1 for status in plan["step_statuses"] if status == "completed"
-            )
-            total = len(plan["steps"])
             progress = f"{completed}/{total} steps completed"
-            output += f"• {plan_id}{current_marker}: {plan['title']} - {progress}\n"
+            output += f"• {plan_id}{current_marker}: {title} - {progress}\n"
 
         return ToolResult(output=output)
 
     def _get_plan(self, plan_id: Optional[str]) -> ToolResult:
         """Get details of a specific plan."""
-        if not plan_id:
-            # If no plan_id is provided, use the current active plan
-            if not self._current_plan_id:
-                raise ToolError(
-                    "No active plan. Please specify a plan_id or set an active plan."
-                )
-            plan_id = self._current_plan_id
-
-        if plan_id not in self.plans:
-            raise ToolError(f"No plan found with ID: {plan_id}")
-
-        plan = self.plans[plan_id]
-        return ToolResult(output=self._format_plan(plan))
+        return ToolResult(output=self.format_plan(plan_id))
 
     def _set_active_plan(self, plan_id: Optional[str]) -> ToolResult:
         """Set a plan as the active plan."""
         if not plan_id:
             raise ToolError("Parameter `plan_id` is required for command: set_active")
 
-        if plan_id not in self.plans:
+        plan = self.store.get(plan_id)
+        if plan is None:
             raise ToolError(f"No plan found with ID: {plan_id}")
 
         self._current_plan_id = plan_id
         return ToolResult(
-            output=f"Plan '{plan_id}' is now the active plan.\n\n{self._format_plan(self.plans[plan_id])}"
+            output=f"Plan '{plan_id}' is now the active plan.\n\n{self._format_plan(plan)}"
         )
 
     def _mark_step(
@@ -262,45 +340,15 @@ class PlanningTool(BaseTool):
         step_notes: Optional[str],
     ) -> ToolResult:
         """Mark a step with a specific status and optional notes."""
-        if not plan_id:
-            # If no plan_id is provided, use the current active plan
-            if not self._current_plan_id:
-                raise ToolError(
-                    "No active plan. Please specify a plan_id or set an active plan."
-                )
-            plan_id = self._current_plan_id
-
-        if plan_id not in self.plans:
-            raise ToolError(f"No plan found with ID: {plan_id}")
+        plan_id = self._require_plan_id(plan_id)
 
         if step_index is None:
             raise ToolError("Parameter `step_index` is required for command: mark_step")
 
-        plan = self.plans[plan_id]
-
-        if step_index < 0 or step_index >= len(plan["steps"]):
-            raise ToolError(
-                f"Invalid step_index: {step_index}. Valid indices range from 0 to {len(plan['steps'])-1}."
-            )
-
-        if step_status and step_status not in [
-            "not_started",
-            "in_progress",
-            "completed",
-            "blocked",
-        ]:
-            raise ToolError(
-                f"Invalid step_status: {step_status}. Valid statuses are: not_started, in_progress, completed, blocked"
-            )
-
-        if step_status:
-            plan["step_statuses"][step_index] = step_status
-
-        if step_notes:
-            plan["step_notes"][step_index] = step_notes
+        self.set_step_status(plan_id, step_index, step_status, step_notes)
 
         return ToolResult(
-            output=f"Step {step_index} updated in plan '{plan_id}'.\n\n{self._format_plan(plan)}"
+            output=f"Step {step_index} updated in plan '{plan_id}'.\n\n{self.format_plan(plan_id)}"
         )
 
     def _delete_plan(self, plan_id: Optional[str]) -> ToolResult:
@@ -308,11 +356,9 @@ class PlanningTool(BaseTool):
         if not plan_id:
             raise ToolError("Parameter `plan_id` is required for command: delete")
 
-        if plan_id not in self.plans:
+        if not self.store.delete(plan_id):
             raise ToolError(f"No plan found with ID: {plan_id}")
 
-        del self.plans[plan_id]
-
         # If the deleted plan was the active plan, clear the active plan
         if self._current_plan_id == plan_id:
             self._current_plan_id = None
@@ -326,14 +372,11 @@ class PlanningTool(BaseTool):
 
         # Calculate progress statistics
         total_steps = len(plan["steps"])
-        completed = sum(1 for status in plan["step_statuses"] if status == "completed")
-        in_progress = sum(
-            1 for status in plan["step_statuses"] if status == "in_progress"
-        )
-        blocked = sum(1 for status in plan["step_statuses"] if status == "blocked")
-        not_started = sum(
-            1 for status in plan["step_statuses"] if status == "not_started"
-        )
+        counts = Counter(plan["step_statuses"])
+        completed = counts["completed"]
+        in_progress = counts["in_progress"]
+        blocked = counts["blocked"]
+        not_started = counts["not_started"]
 
         output += f"Progress: {completed}/{total_steps} steps completed "
         if total_steps > 0:
@@ -361,3 +404,70 @@ class PlanningTool(BaseTool):
                 output += f"   Notes: {notes}\n"
 
         return output
+
+
+class PlanContext:
+    """
+    Plan status for prompts that are repeated every step.
+
+    The first prompt carries the whole plan. Later prompts only list the
+    steps whose status changed since the previous one, short summaries of
+    newly finished steps and the progress, so the prompt stays the same size
+    however long the plan is. The whole plan is sent again when its steps are
+    revised or when the receiver's memory no longer holds the last full copy.
+    """
+
+    def __init__(self, tool: PlanningTool, plan_id: str, summary_chars: int = 200):
+        self.tool = tool
+        self.plan_id = plan_id
+        self.summary_chars = summary_chars
+        self.full_text: Optional[str] = None
+        self._steps: Optional[List[str]] = None
+        self._statuses: List[str] = []
+        self._summaries: Dict[int, str] = {}
+
+    def reset(self) -> None:
+        """Send the whole plan with the next update."""
+        self.full_text, self._steps = None, None
+
+    def seen_by(self, messages: List) -> bool:
+        """Whether the last full plan is still in a conversation."""
+        return self.full_text is not None and any(
+            isinstance(message.content, str) and self.full_text in message.content
+            for message in messages
+        )
+
+    def record_result(self, step_index: int, result: str) -> None:
+        """Keep a short summary of a finished step for the next update."""
+        result = " ".join(str(result).split())
+        if len(result) > self.summary_chars:
+            result = result[: self.summary_chars - 3] + "..."
+        self._summaries[step_index] = result
+
+    def render(self) -> str:
+        """The whole plan the first time, then the changes since the last call."""
+        plan = self.tool.get_plan_data(self.plan_id)
+        if plan is None:
+            return f"No plan found with ID: {self.plan_id}"
+        steps, statuses = plan["steps"], plan["step_statuses"]
+
+        if steps != self._steps:
+            self._steps, self._statuses = steps, list(statuses)
+            self._summaries.clear()
+            self.full_text = self.tool._format_plan(plan)
+            return self.full_text
+
+        lines = ["Changes since the last plan status:"]
+        for i, (old, new) in enumerate(zip(self._statuses, statuses)):
+            if old != new:
+                lines.append(f"- Step {i} ({steps[i]}): {old} -> {new}")
+        for i, summary in sorted(self._summaries.items()):
+            lines.append(f"- Step {i} result: {summary}")
+        if len(lines) == 1:
+            lines.append("- No changes")
+        completed = statuses.count("completed")
+        lines.append(f"Progress: {completed}/{len(steps)} steps completed")
+
+        self._statuses = list(statuses)
+        self._summaries.clear()
+        return "\n".join(lines)
@@ -1,7 +1,8 @@
+import asyncio
 import sys
 from io import StringIO
 import multiprocessing
-from typing import Dict
+from typing import ClassVar, Dict, Optional
 
 from app.tool.base import BaseTool
 
@@ -11,6 +12,7 @@ class PythonExecute(BaseTool):
 
     name: str = "python_execute"
     description: str = "Executes Python code string. Note: Only print outputs are visible, function return values are not captured. Use print statements to see results."
+    scheduler_resource: ClassVar[Optional[str]] = "process"
     parameters: dict = {
         "type": "object",
         "properties": {
@@ -66,7 +68,13 @@ class PythonExecute(BaseTool):
                 args=(code, result, safe_globals)
             )
             proc.start()
-            proc.join(timeout)
+            try:
+                # Wait off the event loop so the run stays cancellable
+                await asyncio.to_thread(proc.join, timeout)
+            except asyncio.CancelledError:
+                proc.terminate()
+                proc.join(1)
+                raise
 
             # timeout process
             if proc.is_alive():
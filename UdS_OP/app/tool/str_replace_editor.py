@@ -88,6 +88,15 @@ class StrReplaceEditor(BaseTool):
 
     _file_history: list = defaultdict(list)
 
+    def checkpoint_state(self) -> dict:
+        # Histories only grow by appending strings, so shallow copies suffice
+        return {str(path): list(texts) for path, texts in self._file_history.items()}
+
+    def restore_checkpoint(self, state: dict) -> None:
+        self._file_history = defaultdict(
+            list, {Path(path): list(texts) for path, texts in state.items()}
+        )
+
     async def execute(
         self,
         *,
@@ -63,6 +63,10 @@ Note: You MUST append a `sleep 0.05` to the end of the command for commands that
                             output=stdout.decode().strip(),
                             error=stderr.decode().strip()
                         )
+                    except asyncio.CancelledError:
+                        if self.process and self.process.returncode is None:
+                            self.process.kill()
+                        raise
                     except Exception as e:
                         result = CLIResult(output="", error=str(e))
                     finally:
@@ -173,6 +177,10 @@ Note: You MUST append a `sleep 0.05` to the end of the command for commands that
                 finally:
                     self.process = None
 
+    async def cleanup(self):
+        """Stop the running command, if any."""
+        await self.close()
+
     async def __aenter__(self):
         """Enter the asynchronous context manager."""
         return self
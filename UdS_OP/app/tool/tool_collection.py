@@ -1,8 +1,46 @@
 """Collection classes for managing multiple tools."""
-from typing import Any, Dict, List
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
 
+from app.budget import current_budget
 from app.exceptions import ToolError
-from app.tool.base import BaseTool, ToolFailure, ToolResult
+from app.fair_share import scheduled_slot
+from app.logger import logger
+from app.metrics import metrics
+from app.replay import recordable, to_jsonable
+from app.tool.base import BaseTool, CLIResult, ToolFailure, ToolResult
+from app.tracing import traced
+
+
+_RESULT_TYPES = {cls.__name__: cls for cls in (ToolResult, CLIResult, ToolFailure)}
+
+
+def _encode_result(result: Any) -> Any:
+    if isinstance(result, ToolResult):
+        return {
+            "result_type": type(result).__name__,
+            "output": to_jsonable(result.output),
+            "error": result.error,
+            "system": result.system,
+        }
+    return {"value": to_jsonable(result)}
+
+
+def _decode_result(data: Any) -> Any:
+    if "result_type" in data:
+        data = dict(data)
+        cls = _RESULT_TYPES.get(data.pop("result_type"), ToolResult)
+        return cls(**data)
+    return data["value"]
+
+
+def _result_span_attributes(result: Any) -> Dict[str, Any]:
+    output = getattr(result, "output", result)
+    attributes = {"bytes_out": len(str(output or ""))}
+    if getattr(result, "error", None):
+        attributes["error"] = result.error
+    return attributes
 
 
 class ToolCollection:
@@ -11,13 +49,26 @@ class ToolCollection:
     def __init__(self, *tools: BaseTool):
         self.tools = tools
         self.tool_map = {tool.name: tool for tool in tools}
+        self._params: Optional[List[Dict[str, Any]]] = None
 
     def __iter__(self):
         return iter(self.tools)
 
     def to_params(self) -> List[Dict[str, Any]]:
-        return [tool.to_param() for tool in self.tools]
+        """Return the tool schemas, built once so the request prefix stays byte-stable."""
+        if self._params is None:
+            self._params = [tool.to_param() for tool in self.tools]
+        return self._params
 
+    @traced(
+        "tool.execute",
+        lambda collection, *, name, tool_input=None: {
+            "tool": name,
+            "bytes_in": len(str(tool_input or "")),
+        },
+        _result_span_attributes,
+    )
+    @recordable("tool.execute", encode=_encode_result, decode=_decode_result)
     async def execute(
         self, *, name: str, tool_input: Dict[str, Any] = None
     ) -> ToolResult:
@@ -25,11 +76,43 @@ class ToolCollection:
         if not tool:
             return ToolFailure(error=f"Tool {name} is invalid")
         try:
-            result = await tool(**tool_input)
-            return result
+            async with scheduled_slot(tool.scheduler_resource):
+                budget = current_budget()
+                limit = budget.tool_time_limit() if budget else None
+                return await self._timed_call(tool, tool_input, limit)
+        except asyncio.TimeoutError as e:
+            # A timeout of the tool's own, not the time budget
+            return ToolFailure(error=f"Tool {name} timed out: {str(e) or 'no details'}")
         except ToolError as e:
             return ToolFailure(error=e.message)
 
+    @staticmethod
+    async def _timed_call(tool: BaseTool, tool_input: Dict[str, Any], limit: Optional[float]) -> Any:
+        """Run a tool within `limit` seconds and record its duration in the step metrics.
+
+        Raises `ToolError` when the tool is stopped by the time budget; other
+        timeouts raised by the tool itself propagate unchanged.
+        """
+        start = time.perf_counter()
+        success = False
+        try:
+            if limit is None:
+                result = await tool(**tool_input)
+            else:
+                try:
+                    async with asyncio.timeout(limit) as budget_timer:
+                        result = await tool(**tool_input)
+                except asyncio.TimeoutError:
+                    if budget_timer.expired():
+                        raise ToolError(
+                            f"Tool {tool.name} was stopped after {limit:.1f}s (time budget)"
+                        )
+                    raise
+            success = not (isinstance(result, ToolResult) and result.error)
+            return result
+        finally:
+            metrics.record_tool(tool.name, time.perf_counter() - start, success)
+
     async def execute_all(self) -> List[ToolResult]:
         """Execute all tools in the collection sequentially."""
         results = []
@@ -41,12 +124,57 @@ class ToolCollection:
                 results.append(ToolFailure(error=e.message))
         return results
 
+    async def cleanup(self, timeout: float = 10.0) -> None:
+        """Release the resources of every tool concurrently, each within `timeout` seconds."""
+
+        async def release(tool: BaseTool) -> None:
+            try:
+                async with asyncio.timeout(timeout):
+                    await tool.cleanup()
+            except Exception as e:
+                logger.warning(f"Cleanup of tool {tool.name} failed: {e!r}")
+
+        async with asyncio.TaskGroup() as group:
+            for tool in self.tools:
+                group.create_task(release(tool))
+
+    async def warm_up(self, timeout: float = 30.0) -> None:
+        """Start every tool's resources concurrently, each within `timeout` seconds."""
+
+        async def start(tool: BaseTool) -> None:
+            try:
+                async with asyncio.timeout(timeout):
+                    await tool.warm_up()
+            except Exception as e:
+                logger.warning(f"Warm-up of tool {tool.name} failed: {e!r}")
+
+        async with asyncio.TaskGroup() as group:
+            for tool in self.tools:
+                group.create_task(start(tool))
+
+    def checkpoint_state(self) -> Dict[str, dict]:
+        """Collect the checkpoint state of every stateful tool, keyed by name."""
+        states = {}
+        for tool in self.tools:
+            state = tool.checkpoint_state()
+            if state is not None:
+                states[tool.name] = state
+        return states
+
+    def restore_checkpoint(self, states: Dict[str, dict]) -> None:
+        """Restore tool states collected by `checkpoint_state`."""
+        for name, state in states.items():
+            tool = self.tool_map.get(name)
+            if tool:
+                tool.restore_checkpoint(state)
+
     def get_tool(self, name: str) -> BaseTool:
         return self.tool_map.get(name)
 
     def add_tool(self, tool: BaseTool):
         self.tools += (tool,)
         self.tool_map[tool.name] = tool
+        self._params = None
         return self
 
     def add_tools(self, *tools: BaseTool):
@@ -0,0 +1,290 @@
+"""Lightweight nested tracing spans with local JSONL and Chrome-trace exporters."""
+import asyncio
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from app.logger import logger
+
+
+class Span:
+    """A timed operation with attributes, nested under the span active when it started."""
+
+    __slots__ = (
+        "name",
+        "span_id",
+        "parent_id",
+        "attributes",
+        "start_ns",
+        "end_ns",
+        "wall_start",
+        "tid",
+        "_token",
+    )
+
+    recording = True
+
+    def __init__(self, name: str, span_id: int, parent: Optional["Span"], attributes: dict):
+        self.name = name
+        self.span_id = span_id
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = attributes
+        self.start_ns = 0
+        self.end_ns = 0
+        self.wall_start = 0.0
+        self.tid = 0
+        self._token = None
+
+    @property
+    def duration(self) -> float:
+        """Duration in seconds (0 while the span is open)."""
+        return max(self.end_ns - self.start_ns, 0) / 1e9
+
+    def set(self, **attributes) -> None:
+        """Attach or overwrite attributes."""
+        self.attributes.update(attributes)
+
+    def add(self, key: str, amount: Union[int, float]) -> None:
+        """Increment a numeric attribute."""
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        self.tid = _task_id()
+        self.wall_start = time.time()
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.end_ns = time.perf_counter_ns()
+        if exc_type is not None:
+            self.attributes["error"] = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        self._token = None
+        tracer._finish(self)
+        return False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.wall_start,
+            "duration": self.duration,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Stand-in returned while tracing is disabled; every operation is a no-op."""
+
+    __slots__ = ()
+
+    recording = False
+    attributes: Dict[str, Any] = {}
+
+    def set(self, **attributes) -> None:
+        pass
+
+    def add(self, key: str, amount: Union[int, float]) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+_task_ids: Dict[int, int] = {}
+
+
+def _task_id() -> int:
+    """Small stable id for the current asyncio task, used as a trace-viewer lane."""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    key = id(task) if task is not None else threading.get_ident()
+    tid = _task_ids.get(key)
+    if tid is None:
+        tid = _task_ids[key] = len(_task_ids) + 1
+    return tid
+
+
+class SpanExporter(ABC):
+    """Destination for finished spans."""
+
+    @abstractmethod
+    def export(self, spans: List[Span]) -> None:
+        """Write a batch of finished spans."""
+
+    def shutdown(self) -> None:
+        """Flush and close the exporter."""
+
+
+class JsonlSpanExporter(SpanExporter):
+    """Appends one JSON object per span to a file."""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def export(self, spans: List[Span]) -> None:
+        with self.path.open("a", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+
+class ChromeTraceExporter(SpanExporter):
+    """Writes spans in Chrome trace-event format (chrome://tracing, Perfetto).
+
+    The file is rewritten on shutdown, because the format is a single JSON
+    document.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._events: List[Dict[str, Any]] = []
+        self._origin_ns = time.perf_counter_ns()
+
+    def export(self, spans: List[Span]) -> None:
+        pid = os.getpid()
+        for span in spans:
+            self._events.append(
+                {
+                    "name": span.name,
+                    "cat": span.name.split(".", 1)[0],
+                    "ph": "X",
+                    "ts": (span.start_ns - self._origin_ns) / 1000,
+                    "dur": (span.end_ns - span.start_ns) / 1000,
+                    "pid": pid,
+                    "tid": span.tid,
+                    "args": span.attributes,
+                }
+            )
+
+    def shutdown(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self._events, "displayTimeUnit": "ms"}, f, default=str)
+
+
+class Tracer:
+    """
+    Creates spans and hands finished ones to exporters in batches.
+
+    Tracing is off until `configure` is called with at least one exporter.
+    While it is off, `span` returns a shared no-op object, so instrumented code
+    costs one attribute check per span.
+    """
+
+    def __init__(self, batch_size: int = 256):
+        self.enabled = False
+        self.batch_size = batch_size
+        self.exporters: List[SpanExporter] = []
+        self._ids = itertools.count(1)
+        self._finished: List[Span] = []
+        self._lock = threading.Lock()
+
+    def configure(self, *exporters: SpanExporter) -> None:
+        """Enable tracing with the given exporters; no exporters disables it."""
+        self.shutdown()
+        self.exporters = list(exporters)
+        self.enabled = bool(self.exporters)
+
+    def configure_path(self, path: Union[str, Path]) -> None:
+        """Enable tracing to a file: ``.jsonl`` for JSONL, anything else for Chrome trace."""
+        path = Path(path)
+        exporter = (
+            JsonlSpanExporter(path) if path.suffix == ".jsonl" else ChromeTraceExporter(path)
+        )
+        self.configure(exporter)
+        logger.info(f"🔎 Tracing to {path}")
+
+    def span(self, name: str, **attributes) -> Union[Span, _NoopSpan]:
+        """Start a span as a context manager, nested under the current span."""
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(name, next(self._ids), _current_span.get(), attributes)
+
+    def _finish(self, span: Span) -> None:
+        with self._lock:
+            self._finished.append(span)
+            if len(self._finished) < self.batch_size:
+                return
+            batch, self._finished = self._finished, []
+        self._export(batch)
+
+    def _export(self, batch: List[Span]) -> None:
+        for exporter in self.exporters:
+            try:
+                exporter.export(batch)
+            except Exception as e:
+                logger.warning(f"Span exporter {type(exporter).__name__} failed: {e}")
+
+    def flush(self) -> None:
+        """Export all finished spans."""
+        with self._lock:
+            batch, self._finished = self._finished, []
+        if batch:
+            self._export(batch)
+
+    def shutdown(self) -> None:
+        """Flush pending spans and close the exporters."""
+        self.flush()
+        for exporter in self.exporters:
+            try:
+                exporter.shutdown()
+            except Exception as e:
+                logger.warning(f"Span exporter {type(exporter).__name__} failed: {e}")
+
+
+tracer = Tracer()
+
+
+def current_span() -> Union[Span, _NoopSpan]:
+    """Return the innermost open span, or the no-op span."""
+    if not tracer.enabled:
+        return NOOP_SPAN
+    return _current_span.get() or NOOP_SPAN
+
+
+def traced(
+    name: str,
+    attributes: Optional[Callable[..., Dict[str, Any]]] = None,
+    result_attributes: Optional[Callable[[Any], Dict[str, Any]]] = None,
+):
+    """Wrap an async function in a span.
+
+    Args:
+        name: Span name.
+        attributes: Called with the function's arguments to build start attributes.
+        result_attributes: Called with the return value to add attributes.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return await func(*args, **kwargs)
+            with tracer.span(name, **(attributes(*args, **kwargs) if attributes else {})) as span:
+                result = await func(*args, **kwargs)
+                if result_attributes:
+                    span.set(**result_attributes(result))
+                return result
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,265 @@
+"""Token and latency accounting for every LLM call made during a run."""
+import atexit
+import json
+import queue
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from pydantic import BaseModel, Field
+
+from app.config import PROJECT_ROOT, config
+from app.logger import logger
+
+
+# Tags describing who is calling the LLM (run, agent, step, plan, call role)
+_usage_tags: ContextVar[Dict[str, Any]] = ContextVar("usage_tags", default={})
+
+
+@contextmanager
+def usage_context(**tags):
+    """Attach tags to every LLM call made inside the block.
+
+    Tags are stored in a context variable, so they follow the current asyncio
+    task and nest naturally: inner blocks override outer tags of the same name.
+    """
+    token = _usage_tags.set({**_usage_tags.get(), **tags})
+    try:
+        yield
+    finally:
+        _usage_tags.reset(token)
+
+
+def current_usage_tags() -> Dict[str, Any]:
+    """Return a copy of the tags active in the current context."""
+    return dict(_usage_tags.get())
+
+
+def get_cached_tokens(usage: Any) -> int:
+    """Extract the number of provider-cached prompt tokens from a usage object."""
+    if usage is None:
+        return 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    return getattr(details, "cached_tokens", None) or 0
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Price a call using the per-million token prices configured for its model."""
+    for settings in config.llm.values():
+        if settings.model == model:
+            return (
+                prompt_tokens * settings.input_cost_per_million
+                + completion_tokens * settings.output_cost_per_million
+            ) / 1_000_000
+    return 0.0
+
+
+def new_run_id() -> str:
+    """Generate a short identifier for a run."""
+    return uuid.uuid4().hex[:12]
+
+
+class UsageRecord(BaseModel):
+    """Accounting record for a single LLM call."""
+
+    timestamp: float = Field(default_factory=time.time)
+    model: str
+    run_id: Optional[str] = None
+    agent: Optional[str] = None
+    step: Optional[int] = None
+    plan_id: Optional[str] = None
+    plan_step: Optional[int] = None
+    call_role: Optional[str] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    cost: float = 0.0
+    latency: float = 0.0
+    success: bool = True
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+class UsageTotals(BaseModel):
+    """Aggregated usage over a group of calls."""
+
+    calls: int = 0
+    failed_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    cost: float = 0.0
+    latency: float = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, record: UsageRecord) -> None:
+        self.calls += 1
+        if not record.success:
+            self.failed_calls += 1
+        self.prompt_tokens += record.prompt_tokens
+        self.completion_tokens += record.completion_tokens
+        self.cached_tokens += record.cached_tokens
+        self.cost += record.cost
+        self.latency += record.latency
+
+
+class UsageTracker:
+    """Process-wide store of LLM usage records.
+
+    Totals are kept per run and for the whole process in O(1). Only the last
+    ``MAX_RECORDS`` records stay in memory for programmatic access, so long
+    batch runs do not grow without bound. Records are appended to a JSONL
+    file when ``log_file`` is set, by a background thread so that the event
+    loop never waits on the disk.
+    """
+
+    MAX_RECORDS = 10_000
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance.records = deque(maxlen=cls.MAX_RECORDS)
+                    cls._instance._totals = UsageTotals()
+                    cls._instance._run_totals = defaultdict(UsageTotals)
+                    cls._instance._listeners = []
+                    cls._instance.log_file = PROJECT_ROOT / "logs" / "usage.jsonl"
+                    cls._instance._pending = queue.Queue()
+                    cls._instance._writer = None
+        return cls._instance
+
+    def subscribe(self, listener: Callable[[UsageRecord], None]) -> None:
+        """Call `listener` with every new record, e.g. to attribute calls to plan steps."""
+        self._listeners.append(listener)
+
+    def configure(self, log_file: Optional[Union[str, Path]]) -> None:
+        """Set the JSONL output file; ``None`` disables file output."""
+        self.log_file = Path(log_file) if log_file else None
+
+    def record(
+        self,
+        *,
+        model: str,
+        usage: Any = None,
+        latency: float = 0.0,
+        success: bool = True,
+    ) -> UsageRecord:
+        """Record one LLM call, tagged with the current usage context."""
+        tags = current_usage_tags()
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        record = UsageRecord(
+            model=model,
+            run_id=tags.get("run_id"),
+            agent=tags.get("agent"),
+            step=tags.get("step"),
+            plan_id=tags.get("plan_id"),
+            plan_step=tags.get("plan_step"),
+            call_role=tags.get("call_role"),
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cached_tokens=get_cached_tokens(usage),
+            cost=estimate_cost(model, prompt_tokens, completion_tokens),
+            latency=latency,
+            success=success,
+        )
+
+        with self._lock:
+            self.records.append(record)
+            self._totals.add(record)
+            self._run_totals[record.run_id].add(record)
+        if self.log_file:
+            self._start_writer()
+            self._pending.put((self.log_file, json.dumps(record.model_dump())))
+        for listener in self._listeners:
+            try:
+                listener(record)
+            except Exception as e:
+                logger.warning(f"Usage listener failed: {e}")
+        return record
+
+    def _start_writer(self) -> None:
+        if self._writer is not None:
+            return
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._write_loop, name="usage-writer", daemon=True
+                )
+                self._writer.start()
+                atexit.register(self.flush)
+
+    def _write_loop(self) -> None:
+        """Append queued records to their files, a batch per file open."""
+        while True:
+            batch = [self._pending.get()]
+            while True:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            lines: Dict[Path, List[str]] = defaultdict(list)
+            for log_file, line in batch:
+                lines[log_file].append(line + "\n")
+            for log_file, file_lines in lines.items():
+                try:
+                    log_file.parent.mkdir(parents=True, exist_ok=True)
+                    with log_file.open("a", encoding="utf-8") as f:
+                        f.writelines(file_lines)
+                except OSError as e:
+                    logger.warning(f"Failed to write usage records: {e}")
+            for _ in batch:
+                self._pending.task_done()
+
+    def flush(self) -> None:
+        """Block until every queued record has been written."""
+        if self._writer is not None:
+            self._pending.join()
+
+    def totals(self, run_id: Optional[str] = None) -> UsageTotals:
+        """Return aggregated usage for a run, or for the whole process."""
+        if run_id is not None:
+            return self._run_totals.get(run_id, UsageTotals()).model_copy()
+        return self._totals.model_copy()
+
+    def summary(
+        self, run_id: Optional[str] = None, group_by: str = "agent"
+    ) -> Dict[str, UsageTotals]:
+        """Aggregate usage by a tag (agent, step, plan_step, call_role, model).
+
+        Only the records still held in memory are grouped.
+        """
+        groups: Dict[str, UsageTotals] = defaultdict(UsageTotals)
+        for record in self.get_records(run_id):
+            groups[str(getattr(record, group_by, None))].add(record)
+        return dict(groups)
+
+    def get_records(self, run_id: Optional[str] = None) -> List[UsageRecord]:
+        """Return the recorded calls still in memory, optionally restricted to a run."""
+        if run_id is None:
+            return list(self.records)
+        return [record for record in self.records if record.run_id == run_id]
+
+    def reset(self) -> None:
+        """Drop all in-memory records and totals."""
+        with self._lock:
+            self.records.clear()
+            self._totals = UsageTotals()
+            self._run_totals.clear()
+
+
+usage_tracker = UsageTracker()
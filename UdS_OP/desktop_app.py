@@ -6,7 +6,9 @@ import threading
 from typing import Optional
 
 from app.agent.udsop import udsop
+from app.cancellation import CancellationToken
 from app.logger import logger
+from app.stream import CallbackSink, EventType, event_sink_context
 
 
 class UdsopDesktopApp:
@@ -21,6 +23,7 @@ class UdsopDesktopApp:
         # Initialize the agent
         self.agent = udsop()
         self.processing = False
+        self.cancel_token: Optional[CancellationToken] = None  # token of the running task
         self.web_mode = False  # Flag to track if we're in web mode
 
         # Apply styling
@@ -158,6 +161,15 @@ class UdsopDesktopApp:
         )
         self.submit_button.pack(side=tk.RIGHT)
 
+        self.cancel_button = ttk.Button(
+            input_box_frame,
+            text="Cancel",
+            command=self._cancel_processing,
+            style="TButton",
+            state=tk.DISABLED,
+        )
+        self.cancel_button.pack(side=tk.RIGHT, padx=(0, 5))
+
         # Status bar
         self.status_var = tk.StringVar(value="Ready")
         self.status_bar = ttk.Label(
@@ -194,16 +206,20 @@ class UdsopDesktopApp:
             return
 
         self.processing = True
+        self.cancel_token = CancellationToken()
         self.status_var.set("Running browser automation...")
         self.web_button.configure(state=tk.DISABLED)
+        self.cancel_button.configure(state=tk.NORMAL)
         self._append_to_output("System: Launching browser automation...")
 
         # Use a thread to avoid blocking the UI
         threading.Thread(
-            target=self._execute_web_agent, args=(user_instruction,), daemon=True
+            target=self._execute_web_agent,
+            args=(user_instruction, self.cancel_token),
+            daemon=True,
         ).start()
 
-    def _execute_web_agent(self, task):
+    def _execute_web_agent(self, task, cancel_token: CancellationToken):
         """Execute the web browsing agent in a separate thread with the user's task"""
         try:
             # Create and run a new event loop for the thread
@@ -232,11 +248,16 @@ class UdsopDesktopApp:
                 # Create and run the browser agent with the user's task
                 async def run_browser_task():
                     agent = BrowserAgent(task=task, llm=llm, headless=False)
-                    await agent.run()
+                    with cancel_token.bind():
+                        await agent.run()
 
                 # Run the browser task
                 loop.run_until_complete(run_browser_task())
                 self.root.after(0, self._on_web_agent_success)
+            except asyncio.CancelledError:
+                self.root.after(
+                    0, lambda: self._on_web_agent_error("Browser automation was cancelled")
+                )
             except Exception as e:
                 error_msg = f"Error running web agent: {str(e)}"
                 self.root.after(0, lambda: self._on_web_agent_error(error_msg))
@@ -247,6 +268,8 @@ class UdsopDesktopApp:
         """Handle successful web agent execution"""
         self._append_to_output("System: Browser automation completed successfully.")
         self.processing = False
+        self.cancel_token = None
+        self.cancel_button.configure(state=tk.DISABLED)
         self.status_var.set("Ready")
         self.web_button.configure(state=tk.NORMAL)
         # Reset web mode after completion
@@ -257,6 +280,8 @@ class UdsopDesktopApp:
         """Handle web agent execution error"""
         self._append_to_output(f"Error: {error_msg}")
         self.processing = False
+        self.cancel_token = None
+        self.cancel_button.configure(state=tk.DISABLED)
         self.status_var.set("Ready")
         self.web_button.configure(state=tk.NORMAL)
         # Reset web mode after completion
@@ -295,8 +320,11 @@ class UdsopDesktopApp:
         # Standard processing mode
         # Disable UI during processing
         self.processing = True
+        self.cancel_token = CancellationToken()
+        self.agent.cancel_token = self.cancel_token
         self.status_var.set("Processing...")
         self.submit_button.configure(state=tk.DISABLED)
+        self.cancel_button.configure(state=tk.NORMAL)
 
         # Use a thread to avoid blocking the UI
         threading.Thread(
@@ -329,8 +357,14 @@ class UdsopDesktopApp:
             logger.info = capture_info
             logger.error = capture_error
 
+            # Stream tokens and progress events to the UI in batches
+            sink = CallbackSink(
+                lambda events: self.root.after(0, self._render_stream_events, events)
+            )
+
             # Run the agent
-            loop.run_until_complete(self.agent.run(user_input))
+            with event_sink_context(sink):
+                loop.run_until_complete(self.agent.run(user_input))
         except Exception as e:
             output_collector.add_output(f"An error occurred: {str(e)}")
         finally:
@@ -344,6 +378,25 @@ class UdsopDesktopApp:
                 0, self._update_ui_after_processing, output_collector.get_output()
             )
 
+    def _render_stream_events(self, events):
+        """Render a batch of stream events on the UI thread"""
+        for event in events:
+            if event.type == EventType.STEP_START:
+                self.status_var.set(f"Processing... step {event.step}")
+            elif event.type == EventType.TOOL_RESULT:
+                self.status_var.set(
+                    f"Processing... step {event.step}: {event.data.get('tool')} finished"
+                )
+            elif event.type == EventType.TOKEN:
+                self._append_stream_text(event.content)
+
+    def _append_stream_text(self, text: str):
+        """Append streamed text to the output area without a separator"""
+        self.output_area.configure(state=tk.NORMAL)
+        self.output_area.insert(tk.END, text)
+        self.output_area.configure(state=tk.DISABLED)
+        self.output_area.see(tk.END)
+
     def _update_ui_after_processing(self, output: str):
         """Update the UI after processing is complete"""
         # Extract only the answer part for all interactions
@@ -361,10 +414,22 @@ class UdsopDesktopApp:
         # Add to conversation history
         self._append_to_output(formatted_output)
 
+        if self.agent.stop_reason and self.agent.stop_reason.startswith("cancelled"):
+            self._append_to_output("System: The task was cancelled.")
+
         # Reset UI state
         self.processing = False
+        self.cancel_token = None
+        self.agent.cancel_token = None
         self.status_var.set("Ready")
         self.submit_button.configure(state=tk.NORMAL)
+        self.cancel_button.configure(state=tk.DISABLED)
+
+    def _cancel_processing(self):
+        """Cancel the running task; the agent stops at its next await"""
+        if self.cancel_token and self.cancel_token.cancel("cancelled from the desktop app"):
+            self.status_var.set("Cancelling...")
+            self.cancel_button.configure(state=tk.DISABLED)
 
     def _append_to_output(self, text: str):
         """Append text to the output area"""
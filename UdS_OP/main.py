@@ -1,12 +1,27 @@
 import argparse
 import asyncio
 import os
+import signal
 import sys
+from contextlib import contextmanager
 from typing import Optional
 
+from app.agent.compaction import MemoryCompactor
 from app.agent.udsop import udsop
+from app.batch import BatchRunner, load_tasks
+from app.budget import Budget
+from app.cancellation import CancellationToken
+from app.checkpoint import Checkpointer
+from app.config import config
+from app.flow.scheduler import FlowScheduler
+from app.flow.step_cache import StepCache
+from app.http_client import http_pool
 from app.logger import logger
+from app.metrics import metrics
+from app.replay import RunRecorder, RunReplayer, replay_context
+from app.tracing import tracer
 from app.tool.terminal import Terminal
+from app.usage import usage_context
 import tkinter as tk
 from tkinter import scrolledtext, ttk
 import threading
@@ -54,16 +69,68 @@ class InterpreterMode:
                 logger.error(f"❌ An error occurred: {str(e)}")
 
 
-async def main():
+async def cli_main():
+    """Command-line entry point: run a prompt, an interactive session, a batch or a resumed run."""
     parser = argparse.ArgumentParser(description="Udsop - An AI agent with Open Interpreter-like capabilities")
     parser.add_argument("--prompt", "-p", type=str, help="Input prompt to process once and exit")
     parser.add_argument("--interactive", "-i", action="store_true", help="Run in interactive mode like Open Interpreter")
     parser.add_argument("--shell", "-s", action="store_true", help="Enable system shell access")
     parser.add_argument("--debug", "-d", action="store_true", help="Enable debug logging")
+    parser.add_argument("--resume", metavar="RUN_ID", type=str, help="Resume a checkpointed run after its last completed step")
+    parser.add_argument("--no-checkpoint", action="store_true", help="Do not write run checkpoints")
+    parser.add_argument("--record", metavar="PATH", type=str, help="Record every LLM and tool call of the run to a JSONL file")
+    parser.add_argument("--replay", metavar="PATH", type=str, help="Replay a recorded run without calling the LLM or tools")
+    parser.add_argument("--replay-timing", choices=["fast", "recorded"], default="fast", help="Replay flat out or with the recorded call durations")
+    parser.add_argument("--deadline", type=float, help="Stop the run after this many seconds")
+    parser.add_argument("--max-tokens", type=int, help="Stop the run after this many LLM tokens")
+    parser.add_argument("--max-cost", type=float, help="Stop the run once the estimated LLM cost reaches this amount")
+    parser.add_argument("--tool-timeout", type=float, help="Stop any single tool call after this many seconds")
+    parser.add_argument("--step-timeout", type=float, help="Abandon a step that runs longer than this many seconds")
+    parser.add_argument("--think-timeout", type=float, help="Abandon an LLM decision that takes longer than this many seconds")
+    parser.add_argument("--batch", metavar="PATH", type=str, help="Run every task of a JSONL file and exit")
+    parser.add_argument("--batch-output", metavar="PATH", type=str, help="Results file for --batch (default: <input>.results.jsonl); existing results are skipped")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent agent sessions for --batch")
+    parser.add_argument("--retry-failed", action="store_true", help="Rerun --batch tasks whose earlier result was an error")
+    parser.add_argument("--compact-memory", action="store_true", help="Summarise old history in the background, as with [compaction] enabled = true")
+    parser.add_argument("--clear-step-cache", action="store_true", help="Delete every entry of the plan step cache and exit")
+    parser.add_argument("--trace", metavar="PATH", type=str, help="Write tracing spans to PATH (.jsonl for JSONL, otherwise Chrome trace JSON)")
     args = parser.parse_args()
 
-    # Create the udsop agent
+    if args.clear_step_cache:
+        cache = StepCache.configured()
+        logger.info(f"🧹 Deleted {cache.clear()} entries from {cache.directory}")
+        return
+
+    session = None
+    if args.replay:
+        session = RunReplayer(args.replay, timing=args.replay_timing)
+    elif args.record:
+        session = RunRecorder(args.record)
+    if args.trace:
+        tracer.configure_path(args.trace)
+    try:
+        with replay_context(session):
+            await _run(args)
+    finally:
+        tracer.shutdown()
+
+
+def _create_agent(args, checkpointer: Checkpointer) -> udsop:
+    """Create a udsop agent configured by the CLI arguments."""
     agent = udsop()
+    if not args.no_checkpoint:
+        agent.checkpointer = checkpointer
+    if any(v is not None for v in (args.deadline, args.max_tokens, args.max_cost, args.tool_timeout)):
+        agent.budget = Budget(
+            deadline=args.deadline,
+            max_tokens=args.max_tokens,
+            max_cost=args.max_cost,
+            tool_timeout=args.tool_timeout,
+        )
+    agent.step_timeout = args.step_timeout
+    agent.think_timeout = args.think_timeout
+    if args.compact_memory and agent.compactor is None:
+        agent.compactor = MemoryCompactor.configured()
 
     # Add Terminal tool if shell access is enabled
     if args.shell:
@@ -76,16 +143,37 @@ async def main():
         if not terminal_exists:
             logger.info("🐚 Enabling system shell access...")
             agent.available_tools.add_tool(Terminal())
+    return agent
+
 
+async def _run(args):
+    """Create the agent and process the request described by the CLI arguments."""
+    checkpointer = Checkpointer()
+
+    if metrics.settings.port:
+        metrics.serve()
+
+    # Open connections to the LLM endpoints before the first request
+    if http_pool.settings.prewarm and not args.replay:
+        await http_pool.prewarm()
+
+    if args.batch:
+        await _run_batch(args, checkpointer)
+        return
+
+    # Create the udsop agent
+    agent = _create_agent(args, checkpointer)
     try:
-        if args.interactive:
+        if args.resume:
+            await _resume(agent, checkpointer, args.resume)
+        elif args.interactive:
             # Run in interactive mode
             interpreter = InterpreterMode(agent)
             await interpreter.run()
         elif args.prompt:
             # Process a single prompt
             logger.info("🔍 Processing your request...")
-            await agent.run(args.prompt)
+            await _run_agent(agent, args.prompt)
             logger.info("✅ Request processing completed.")
         else:
             # Default behavior: prompt for input once
@@ -95,10 +183,88 @@ async def main():
                 return
 
             logger.info("🔍 Processing your request...")
-            await agent.run(prompt)
+            await _run_agent(agent, prompt)
             logger.info("✅ Request processing completed.")
     except KeyboardInterrupt:
         logger.warning("⚠️ Operation interrupted.")
+        if agent.checkpointer and agent.run_id:
+            logger.info(f"💾 Continue later with: --resume {agent.run_id}")
+
+
+async def _resume(agent: udsop, checkpointer: Checkpointer, run_id: str) -> Optional[str]:
+    """Continue a checkpointed run, or return its stored result if it already finished."""
+    snapshot = checkpointer.load(run_id)
+    if snapshot is None or snapshot.get("kind") != "agent":
+        logger.error(f"❌ No checkpoint found for run {run_id}")
+        return None
+    state = snapshot["state"]
+    if state.get("finished"):
+        result = state.get("result") or "No steps executed"
+        logger.info(f"✅ Run {run_id} already finished, nothing to resume.\n{result}")
+        return result
+
+    agent.restore_checkpoint(state)
+    logger.info(f"⏯️ Resuming run {run_id} after step {agent.current_step}...")
+    with usage_context(run_id=run_id):
+        result = await _run_agent(agent)
+    logger.info("✅ Request processing completed.")
+    return result
+
+
+async def _run_batch(args, checkpointer: Checkpointer) -> None:
+    """Run every task of the --batch file and write the results as they finish."""
+    tasks = load_tasks(args.batch)
+    output = args.batch_output or os.path.splitext(args.batch)[0] + ".results.jsonl"
+    runner = BatchRunner(
+        lambda: _create_agent(args, checkpointer),
+        output,
+        concurrency=args.concurrency,
+        resume=True,
+        retry_failed=args.retry_failed,
+        # A [scheduler] section shares LLM and tool capacity fairly between the tasks
+        scheduler=FlowScheduler.from_config() if config.scheduler_config else None,
+    )
+    with _cancel_on_interrupt(runner.cancel_token):
+        progress = await runner.run(tasks)
+    logger.info(f"📄 Results written to {output}")
+    if progress.cancelled or runner.cancel_token.cancelled:
+        logger.info("💾 Run the same command again to finish the remaining tasks")
+
+
+async def _run_agent(agent: udsop, prompt: Optional[str] = None) -> str:
+    """Run the agent once, cancelling it cleanly on Ctrl+C."""
+    agent.cancel_token = token = CancellationToken()
+    try:
+        with _cancel_on_interrupt(token):
+            result = await agent.run(prompt)
+    finally:
+        agent.cancel_token = None
+    if token.cancelled and agent.checkpointer and agent.run_id:
+        logger.info(f"💾 Continue later with: --resume {agent.run_id}")
+    return result
+
+
+@contextmanager
+def _cancel_on_interrupt(token: CancellationToken):
+    """Turn the first Ctrl+C into a clean cancel through `token`; a second one interrupts at once."""
+    loop = asyncio.get_running_loop()
+
+    def on_interrupt():
+        loop.remove_signal_handler(signal.SIGINT)
+        logger.warning("⚠️ Cancelling... press Ctrl+C again to abort immediately.")
+        token.cancel("interrupted by user")
+
+    try:
+        loop.add_signal_handler(signal.SIGINT, on_interrupt)
+        installed = True
+    except (NotImplementedError, RuntimeError):
+        # No loop signal handlers on this platform; Ctrl+C raises KeyboardInterrupt
+        installed = False
+    try:
+        yield token
+    finally:
+        if installed:
+            loop.remove_signal_handler(signal.SIGINT)
 
 
 class UdsopDesktopApp:
@@ -273,12 +439,16 @@ class OutputCollector:
         return "\n".join(self.output)
 
 
-def main():
-    """Main entry point for the application"""
+def desktop_main():
+    """Desktop entry point: open the Tk window"""
     root = tk.Tk()
     app = UdsopDesktopApp(root)
     root.mainloop()
 
 
 if __name__ == "__main__":
-    main()
+    # Command-line arguments select the CLI; without any the desktop window opens
+    if len(sys.argv) > 1:
+        asyncio.run(cli_main())
+    else:
+        desktop_main()
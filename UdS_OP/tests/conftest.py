@@ -0,0 +1,106 @@
+import json
+import sys
+from itertools import count
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.llm import LLM  # noqa: E402
+from app.usage import usage_tracker  # noqa: E402
+
+
+_call_ids = count(1)
+_llm_names = count(1)
+
+
+def tool_call(name: str, arguments: dict) -> SimpleNamespace:
+    """A tool call as the OpenAI client returns it."""
+    function = SimpleNamespace(name=name, arguments=json.dumps(arguments))
+    function.model_dump = lambda: {"name": function.name, "arguments": function.arguments}
+    return SimpleNamespace(id=f"call_{next(_call_ids)}", type="function", function=function)
+
+
+class StubCompletions:
+    """
+    Stand-in for `client.chat.completions` answering from a script.
+
+    Each script item is a `(content, tool_calls)` pair. Like OpenAI-compatible
+    servers, streamed responses only end with a usage chunk when the request
+    asks for it with `stream_options={"include_usage": True}`.
+    """
+
+    def __init__(self, script=(), prompt_tokens: int = 100, completion_tokens: int = 10):
+        self.script = list(script)
+        self.requests = []
+        self.usage = SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=0),
+        )
+
+    async def create(self, **params):
+        self.requests.append(params)
+        content, calls = self.script.pop(0) if self.script else ("done", None)
+        if not params.get("stream"):
+            message = SimpleNamespace(content=content, tool_calls=calls)
+            return SimpleNamespace(
+                choices=[SimpleNamespace(message=message, finish_reason="stop")],
+                usage=self.usage,
+            )
+        include_usage = (params.get("stream_options") or {}).get("include_usage")
+
+        async def chunks():
+            for index, call in enumerate(calls or []):
+                arguments = call.function.arguments
+                # Arguments arrive in fragments; only the first names the call
+                for start in range(0, len(arguments) or 1, 8):
+                    function = SimpleNamespace(
+                        name=call.function.name if start == 0 else None,
+                        arguments=arguments[start : start + 8],
+                    )
+                    delta = SimpleNamespace(
+                        content=None,
+                        tool_calls=[
+                            SimpleNamespace(
+                                index=index, id=call.id if start == 0 else None, function=function
+                            )
+                        ],
+                    )
+                    yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+            for token in content or "":
+                delta = SimpleNamespace(content=token, tool_calls=None)
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+            if include_usage:
+                yield SimpleNamespace(choices=[], usage=self.usage)
+
+        return chunks()
+
+
+@pytest.fixture
+def stub_llm():
+    """Build an `LLM` whose client answers from a script instead of the network."""
+
+    def build(script=(), **usage):
+        llm = LLM(f"stub-{next(_llm_names)}")
+        completions = StubCompletions(script, **usage)
+        llm.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        return llm, completions
+
+    return build
+
+
+@pytest.fixture(autouse=True)
+def isolated_usage(tmp_path):
+    """Keep usage records of one test out of the others and out of logs/."""
+    log_file = usage_tracker.log_file
+    usage_tracker.configure(tmp_path / "usage.jsonl")
+    usage_tracker.reset()
+    yield
+    usage_tracker.flush()
+    usage_tracker.configure(log_file)
+    usage_tracker.reset()
+
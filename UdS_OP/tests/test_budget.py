@@ -0,0 +1,129 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.agent.toolcall import ToolCallAgent
+from app.budget import Budget, budget_context
+from app.flow.planning import PlanningFlow
+from app.tool import Terminate, ToolCollection
+from app.tool.base import BaseTool
+from app.usage import usage_context, usage_tracker
+from conftest import tool_call
+
+
+class SlowTool(BaseTool):
+    name: str = "slow"
+    description: str = "Sleeps, then answers."
+    parameters: dict = {"type": "object", "properties": {"seconds": {"type": "number"}}}
+
+    async def execute(self, seconds: float = 0.0) -> str:
+        await asyncio.sleep(seconds)
+        return "finished"
+
+
+class FlakyTool(BaseTool):
+    name: str = "flaky"
+    description: str = "Times out on its own."
+    parameters: dict = {"type": "object", "properties": {}}
+
+    async def execute(self) -> str:
+        async with asyncio.timeout(0.01):
+            await asyncio.sleep(1)
+        return "unreachable"
+
+
+def _usage(prompt_tokens: int, completion_tokens: int) -> SimpleNamespace:
+    return SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+
+def _execute(name: str, budget=None, **tool_input):
+    async def call():
+        with budget_context(budget, "tools"):
+            return await ToolCollection(SlowTool(), FlakyTool()).execute(
+                name=name, tool_input=tool_input
+            )
+
+    return asyncio.run(call())
+
+
+def test_tool_runs_without_a_budget():
+    assert _execute("slow", seconds=0.01) == "finished"
+
+
+def test_tool_timeout_without_a_budget_is_a_tool_error():
+    result = _execute("flaky")
+    assert "timed out" in result.error
+    assert "time budget" not in result.error
+
+
+def test_tool_stopped_by_the_time_budget():
+    result = _execute("slow", Budget(tool_timeout=0.05), seconds=1)
+    assert result.error == "Tool slow was stopped after 0.1s (time budget)"
+
+
+def test_own_timeout_of_a_tool_is_not_blamed_on_the_budget():
+    result = _execute("flaky", Budget(tool_timeout=5))
+    assert "timed out" in result.error
+    assert "time budget" not in result.error
+
+
+def test_budget_restarts_for_each_run():
+    budget = Budget(max_tokens=150)
+    with budget_context(budget, "first"), usage_context(run_id="first"):
+        usage_tracker.record(model="m", usage=_usage(100, 50))
+        assert budget.exhausted_reason() == "token cap reached (150/150)"
+
+    with budget_context(budget, "first"):
+        assert budget.usage().total_tokens == 0
+        assert budget.exhausted_reason() is None
+        assert budget.elapsed() < 1
+
+
+def test_nested_use_keeps_the_running_budget():
+    budget = Budget(max_tokens=1000)
+    with budget_context(budget, "outer"), usage_context(run_id="outer"):
+        usage_tracker.record(model="m", usage=_usage(100, 0))
+        with budget_context(budget, "outer"):
+            assert budget.usage().total_tokens == 100
+
+
+def test_reused_agent_gets_its_full_budget_each_run(stub_llm):
+    terminate = ("", [tool_call("terminate", {"status": "success"})])
+    llm, _ = stub_llm([terminate, terminate], prompt_tokens=100, completion_tokens=10)
+    agent = ToolCallAgent(
+        llm=llm,
+        available_tools=ToolCollection(Terminate()),
+        budget=Budget(max_tokens=150),
+        max_steps=3,
+    )
+
+    for request in ("first task", "second task"):
+        asyncio.run(agent.run(request))
+        assert agent.stop_reason == "finished", request
+
+
+def test_token_cap_stops_the_agent_with_a_budget_reason(stub_llm):
+    llm, completions = stub_llm([("working", None)] * 3, prompt_tokens=100, completion_tokens=10)
+    agent = ToolCallAgent(llm=llm, budget=Budget(max_tokens=200), max_steps=5)
+
+    result = asyncio.run(agent.run("keep going"))
+
+    assert agent.stop_reason == "budget exhausted: token cap reached (220/200)"
+    assert result.endswith("Terminated: Budget exhausted (token cap reached (220/200))")
+    assert len(completions.requests) == 2
+
+
+def test_executor_out_of_its_own_budget_fails_the_step(stub_llm):
+    steps = ["Look up a", "Look up b"]
+    plan = tool_call("planning", {"command": "create", "title": "Lookups", "steps": steps})
+    planner, _ = stub_llm([("", [plan]), ("summary", None)])
+    llm, completions = stub_llm(prompt_tokens=100, completion_tokens=10)
+    executor = ToolCallAgent(llm=llm, budget=Budget(max_tokens=100), max_steps=5)
+    flow = PlanningFlow(
+        agents={"executor": executor}, llm=planner, step_cache=None, plan_library=None
+    )
+
+    asyncio.run(flow.execute("look things up"))
+
+    assert flow.stop_reason == "plan completed"
+    assert flow._failed_steps == len(steps)
+    assert len(completions.requests) == len(steps)
@@ -0,0 +1,63 @@
+import asyncio
+import json
+import sys
+
+import pytest
+
+from app.agent.toolcall import ToolCallAgent
+from app.tool import Terminate, ToolCollection
+from conftest import tool_call
+
+
+main = pytest.importorskip("main", reason="main.py needs the optional agent tool dependencies")
+
+
+def test_batch_flag_runs_the_batch_runner(stub_llm, monkeypatch, tmp_path):
+    tasks = tmp_path / "tasks.jsonl"
+    tasks.write_text(
+        "\n".join(json.dumps({"id": f"t{i}", "prompt": f"task {i}"}) for i in range(3))
+    )
+    output = tmp_path / "results.jsonl"
+    llm, _ = stub_llm([("", [tool_call("terminate", {"status": "success"})])] * 3)
+
+    async def no_prewarm():
+        return None
+
+    monkeypatch.setattr(main.http_pool, "prewarm", no_prewarm)
+    monkeypatch.setattr(
+        main,
+        "_create_agent",
+        lambda args, checkpointer: ToolCallAgent(
+            llm=llm, available_tools=ToolCollection(Terminate()), max_steps=3
+        ),
+    )
+    monkeypatch.setattr(
+        sys, "argv", ["main.py", "--batch", str(tasks), "--batch-output", str(output)]
+    )
+
+    asyncio.run(main.cli_main())
+
+    results = [json.loads(line) for line in output.read_text().splitlines()]
+    assert sorted(result["id"] for result in results) == ["t0", "t1", "t2"]
+    assert {result["status"] for result in results} == {"ok"}
+
+
+def test_resume_of_a_finished_run_returns_its_result(stub_llm, tmp_path):
+    llm, completions = stub_llm([("", [tool_call("terminate", {"status": "success"})])])
+    checkpointer = main.Checkpointer(tmp_path)
+
+    def create_agent():
+        agent = ToolCallAgent(llm=llm, available_tools=ToolCollection(Terminate()), max_steps=3)
+        agent.checkpointer = checkpointer
+        return agent
+
+    async def scenario():
+        agent = create_agent()
+        result = await agent.run("finish at once")
+        resumed = await main._resume(create_agent(), checkpointer, agent.run_id)
+        return result, resumed
+
+    result, resumed = asyncio.run(scenario())
+
+    assert resumed == result
+    assert len(completions.requests) == 1
@@ -0,0 +1,80 @@
+import asyncio
+
+from app.agent.compaction import MemoryCompactor
+from app.agent.toolcall import ToolCallAgent
+from app.config import CompactionSettings, config
+from app.prompt.compaction import SUMMARY_MESSAGE_PREFIX
+from app.schema import Function, Memory, Message, ToolCall
+
+
+def _memory(count: int) -> Memory:
+    memory = Memory(max_messages=100)
+    for i in range(count):
+        memory.add_message(Message.user_message(f"m{i}"))
+    return memory
+
+
+def test_replace_oldest_swaps_a_span_for_one_message():
+    memory = _memory(5)
+    ids = memory.ids()
+
+    assert memory.replace_oldest(ids[2], Message.user_message("summary"))
+
+    assert [m.content for m in memory.view()] == ["summary", "m3", "m4"]
+    assert memory.ids() == [ids[2], ids[3], ids[4]]
+    assert memory.to_dict_list()[0]["content"] == "summary"
+
+
+def test_replace_oldest_refuses_an_evicted_span():
+    memory = Memory(max_messages=3)
+    ids = [memory.add_message(Message.user_message(f"m{i}")) for i in range(5)]
+
+    assert not memory.replace_oldest(ids[1], Message.user_message("summary"))
+    assert [m.content for m in memory.view()] == ["m2", "m3", "m4"]
+
+
+def test_compactor_summarises_the_oldest_span_in_the_background(stub_llm):
+    llm, completions = stub_llm([("the gist", None)])
+    compactor = MemoryCompactor(llm=llm, trigger_messages=6, keep_recent=3)
+    memory = _memory(8)
+
+    async def compact():
+        assert compactor.maybe_schedule(memory)
+        assert not compactor.maybe_schedule(memory)  # one summary at a time
+        return await compactor.flush(memory)
+
+    assert asyncio.run(compact())
+    contents = [m.content for m in memory.view()]
+    assert contents == [SUMMARY_MESSAGE_PREFIX + "the gist", "m5", "m6", "m7"]
+    assert "m4" in completions.requests[0]["messages"][-1]["content"]
+    assert compactor.stats.applied == 1 and compactor.stats.messages_compacted == 5
+
+
+def test_compaction_span_keeps_tool_responses_with_their_call(stub_llm):
+    llm, _ = stub_llm([("summary", None)])
+    compactor = MemoryCompactor(llm=llm, trigger_messages=4, keep_recent=2)
+    memory = _memory(3)
+    call = ToolCall(id="c1", function=Function(name="tool", arguments="{}"))
+    memory.add_message(Message.from_tool_calls([call]))
+    memory.add_message(Message.tool_message("r1", name="tool", tool_call_id="c1"))
+    memory.add_message(Message.user_message("last"))
+
+    async def compact():
+        compactor.maybe_schedule(memory)
+        return await compactor.flush(memory)
+
+    assert asyncio.run(compact())
+    # The span grows over the tool response instead of ending after the call
+    assert [m.content for m in memory.view()] == [SUMMARY_MESSAGE_PREFIX + "summary", "last"]
+
+
+def test_compaction_section_gives_tool_call_agents_a_compactor(stub_llm, monkeypatch):
+    llm, _ = stub_llm()
+    assert ToolCallAgent(llm=llm).compactor is None
+
+    settings = CompactionSettings(enabled=True, trigger_messages=6, keep_recent=3)
+    monkeypatch.setattr(config._config, "compaction_config", settings)
+    compactor = ToolCallAgent(llm=llm).compactor
+
+    assert isinstance(compactor, MemoryCompactor)
+    assert (compactor.trigger_messages, compactor.keep_recent) == (6, 3)
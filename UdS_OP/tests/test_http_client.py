@@ -0,0 +1,48 @@
+import asyncio
+
+import httpx
+
+from app.http_client import HTTPClientPool, _InstrumentedTransport, http_pool
+from app.llm import LLM
+
+
+def test_llm_clients_share_one_http_client():
+    first, second = LLM("pool-a"), LLM("pool-b")
+    assert first.client._client is http_pool.client
+    assert second.client._client is http_pool.client
+    assert HTTPClientPool() is http_pool
+
+
+def test_transport_counts_requests_until_their_bodies_are_released():
+    transport = _InstrumentedTransport(
+        httpx.MockTransport(lambda request: httpx.Response(200, text="ok"))
+    )
+
+    async def requests():
+        async with httpx.AsyncClient(transport=transport) as client:
+            async with client.stream("GET", "https://example.test/") as response:
+                assert transport.in_flight == 1
+                await response.aread()
+            await asyncio.gather(*(client.get("https://example.test/") for _ in range(3)))
+
+    asyncio.run(requests())
+    assert transport.requests_total == 4
+    assert transport.in_flight == 0
+    assert transport.errors == 0
+
+
+def test_transport_counts_errors():
+    def refuse(request):
+        raise httpx.ConnectError("refused")
+
+    transport = _InstrumentedTransport(httpx.MockTransport(refuse))
+
+    async def request():
+        async with httpx.AsyncClient(transport=transport) as client:
+            try:
+                await client.get("https://example.test/")
+            except httpx.ConnectError:
+                pass
+
+    asyncio.run(request())
+    assert (transport.errors, transport.in_flight) == (1, 0)
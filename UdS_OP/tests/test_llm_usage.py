@@ -0,0 +1,40 @@
+import asyncio
+
+from app.usage import usage_context, usage_tracker
+from conftest import tool_call
+
+
+def test_streamed_ask_requests_and_records_usage(stub_llm):
+    llm, completions = stub_llm([("hello", None)], prompt_tokens=120, completion_tokens=7)
+
+    with usage_context(run_id="stream"):
+        answer = asyncio.run(llm.ask([{"role": "user", "content": "hi"}], stream=True))
+
+    assert answer == "hello"
+    assert completions.requests[0]["stream_options"] == {"include_usage": True}
+    totals = usage_tracker.totals("stream")
+    assert (totals.calls, totals.prompt_tokens, totals.completion_tokens) == (1, 120, 7)
+
+
+def test_streamed_tool_call_records_usage(stub_llm):
+    call = tool_call("terminate", {"status": "success"})
+    llm, completions = stub_llm([("", [call])], prompt_tokens=80, completion_tokens=20)
+
+    with usage_context(run_id="tools"):
+        message = asyncio.run(
+            llm.ask_tool([{"role": "user", "content": "hi"}], tools=[], stream=True)
+        )
+
+    assert message.tool_calls[0].function.name == "terminate"
+    assert completions.requests[0]["stream_options"] == {"include_usage": True}
+    assert usage_tracker.totals("tools").total_tokens == 100
+
+
+def test_unstreamed_calls_are_sent_without_stream_options(stub_llm):
+    llm, completions = stub_llm([("hello", None)])
+
+    with usage_context(run_id="plain"):
+        asyncio.run(llm.ask([{"role": "user", "content": "hi"}], stream=False))
+
+    assert "stream_options" not in completions.requests[0]
+    assert usage_tracker.totals("plain").total_tokens == 110
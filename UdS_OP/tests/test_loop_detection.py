@@ -0,0 +1,30 @@
+from app.agent.loop_detection import LoopDetector
+from app.agent.toolcall import ToolCallAgent
+from app.schema import Message
+from conftest import tool_call
+
+
+def test_repeats_only_count_within_the_window():
+    detector = LoopDetector(window=3)
+    call = Message.from_tool_calls([tool_call("bash", {"command": "ls"})], content="Listing")
+
+    assert detector.observe(call).exact_repeats == 0
+    signals = detector.observe(call)
+    assert signals.exact_repeats == 1 and signals.tool_call_repeats == 1
+
+    for i in range(3):
+        detector.observe(Message.assistant_message(f"Progress on part {i}"))
+    signals = detector.observe(call)
+    assert signals.exact_repeats == 0 and signals.tool_call_repeats == 0
+
+
+def test_stuck_prompt_is_added_once(stub_llm):
+    llm, _ = stub_llm()
+    agent = ToolCallAgent(llm=llm, next_step_prompt="What next?")
+
+    agent.handle_stuck_state()
+    prompt = agent.next_step_prompt
+    agent.handle_stuck_state()
+
+    assert agent.next_step_prompt == prompt
+    assert prompt.endswith("\nWhat next?") and prompt.count("Observed duplicate responses") == 1
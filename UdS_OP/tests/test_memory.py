@@ -0,0 +1,42 @@
+from app.schema import Function, Memory, Message, Role, ToolCall
+
+
+def _call(call_id: str) -> Message:
+    call = ToolCall(id=call_id, function=Function(name="tool", arguments="{}"))
+    return Message.from_tool_calls([call])
+
+
+def test_memory_keeps_the_newest_messages_with_stable_ids():
+    memory = Memory(max_messages=3)
+    ids = [memory.add_message(Message.user_message(f"m{i}")) for i in range(5)]
+
+    assert [m.content for m in memory.view()] == ["m2", "m3", "m4"]
+    assert memory.ids() == ids[2:]
+    assert memory.get_message(ids[3]).content == "m3"
+    assert memory.get_message(ids[0]) is None
+    assert [m.content for m in memory.get_recent_messages(2)] == ["m3", "m4"]
+
+
+def test_eviction_takes_tool_responses_with_their_call():
+    evicted = []
+    memory = Memory(max_messages=3, on_evict=evicted.extend)
+    memory.add_message(_call("c1"))
+    memory.add_message(Message.tool_message("r1", name="tool", tool_call_id="c1"))
+    memory.add_message(Message.tool_message("r2", name="tool", tool_call_id="c1"))
+    memory.add_message(Message.user_message("next"))
+
+    assert [m.role for m in memory.view()] == [Role.USER]
+    assert len(evicted) == 3 and evicted[0].tool_calls
+
+
+def test_payload_cache_follows_eviction_and_clear():
+    memory = Memory(max_messages=2)
+    memory.add_messages([Message.user_message("a"), Message.assistant_message("b")])
+    first = memory.to_dict_list()
+    assert memory.to_dict_list()[0] is first[0]
+
+    memory.add_message(Message.user_message("c"))
+    assert [m["content"] for m in memory.to_dict_list()] == ["b", "c"]
+
+    memory.clear()
+    assert memory.to_dict_list() == [] and memory.ids() == []
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from app.agent.toolcall import ToolCallAgent
+from app.exceptions import ToolError
+from app.flow.planning import PlanningFlow
+from app.tool import PlanningTool
+from app.tool.plan_store import MemoryPlanStore, SqlitePlanStore
+from conftest import tool_call
+
+
+def _plan(plan_id="p1", steps=("a", "b", "c")):
+    return {
+        "plan_id": plan_id,
+        "title": "Title",
+        "steps": list(steps),
+        "step_statuses": ["not_started"] * len(steps),
+        "step_notes": [""] * len(steps),
+    }
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    store = MemoryPlanStore() if request.param == "memory" else SqlitePlanStore(tmp_path / "plans.db")
+    yield store
+    store.close()
+
+
+def test_create_refuses_a_taken_id(store):
+    assert store.create(_plan())
+    assert not store.create(_plan(steps=("other",)))
+    assert store.get("p1")["steps"] == ["a", "b", "c"]
+
+
+def test_step_updates_move_the_next_pending_step(store):
+    store.create(_plan())
+    assert store.next_pending("p1") == (0, "a")
+
+    store.update_steps("p1", [(0, "completed", "done"), (1, "blocked", None)])
+
+    assert store.next_pending("p1") == (2, "c")
+    counts = store.status_counts("p1")
+    assert (counts["completed"], counts["blocked"], counts["not_started"]) == (1, 1, 1)
+    assert store.get("p1")["step_notes"] == ["done", "", ""]
+
+    store.update_steps("p1", [(0, "not_started", None)])
+    assert store.next_pending("p1") == (0, "a")
+
+
+def test_replace_and_delete(store):
+    store.create(_plan())
+    store.replace(_plan(steps=("x", "y")))
+    assert store.get("p1")["steps"] == ["x", "y"]
+    assert store.summaries() == [("p1", "Title", 0, 2)]
+    assert store.delete("p1")
+    assert not store.exists("p1")
+    assert not store.delete("p1")
+
+
+def test_sqlite_plans_are_shared_between_store_instances(tmp_path):
+    first, second = SqlitePlanStore(tmp_path / "plans.db"), SqlitePlanStore(tmp_path / "plans.db")
+    first.create(_plan())
+    second.update_steps("p1", [(0, "completed", None)])
+    assert first.next_pending("p1") == (1, "b")
+
+
+def test_planning_tool_reports_a_taken_id_as_an_error(store):
+    store.create(_plan())
+    tool = PlanningTool(store=store)
+    with pytest.raises(ToolError, match="already exists"):
+        asyncio.run(tool.execute(command="create", plan_id="p1", title="T", steps=["z"]))
+    assert tool.current_plan_id is None
+
+
+class EchoAgent(ToolCallAgent):
+    async def run(self, request=None) -> str:
+        return "done"
+
+
+def test_concurrent_flows_on_a_shared_store_get_their_own_plans(stub_llm, tmp_path):
+    store = SqlitePlanStore(tmp_path / "plans.db")
+
+    def flow(steps):
+        plan = tool_call("planning", {"command": "create", "title": "T", "steps": steps})
+        planner, _ = stub_llm([("", [plan]), ("summary", None)])
+        executor, _ = stub_llm()
+        return PlanningFlow(
+            agents={"echo": EchoAgent(llm=executor)},
+            llm=planner,
+            planning_tool=PlanningTool(store=store),
+            step_cache=None,
+            plan_library=None,
+        )
+
+    first, second = flow(["first a", "first b"]), flow(["second a"])
+
+    async def run_both():
+        await asyncio.gather(first.execute("first"), second.execute("second"))
+
+    asyncio.run(run_both())
+
+    assert first.active_plan_id != second.active_plan_id
+    assert store.get(first.active_plan_id)["steps"] == ["first a", "first b"]
+    assert store.get(second.active_plan_id)["steps"] == ["second a"]
+    assert set(store.get(second.active_plan_id)["step_statuses"]) == {"completed"}
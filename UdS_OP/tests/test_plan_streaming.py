@@ -0,0 +1,43 @@
+import asyncio
+
+from app.agent.toolcall import ToolCallAgent
+from app.flow.planning import PlanningFlow
+from app.usage import usage_tracker
+from conftest import tool_call
+
+
+STEPS = ["[SEARCH] Look up a", "[SEARCH] Look up b", "[FILE] Save the report"]
+
+
+class EchoAgent(ToolCallAgent):
+    """Executor that finishes every step at once without calling the LLM."""
+
+    async def run(self, request=None) -> str:
+        await asyncio.sleep(0)
+        return "done"
+
+
+def test_streamed_plan_is_built_and_its_tokens_are_counted(stub_llm):
+    plan = tool_call("planning", {"command": "create", "title": "Report", "steps": STEPS})
+    planner, completions = stub_llm(
+        [("", [plan]), ("summary", None)], prompt_tokens=300, completion_tokens=40
+    )
+    executor, _ = stub_llm()
+    flow = PlanningFlow(
+        agents={"echo": EchoAgent(llm=executor)},
+        llm=planner,
+        stream_plan=True,
+        step_cache=None,
+        plan_library=None,
+    )
+
+    asyncio.run(flow.execute("write a report"))
+
+    plan_data = flow.planning_tool.get_plan_data(flow.active_plan_id)
+    assert plan_data["steps"] == STEPS
+    assert set(plan_data["step_statuses"]) == {"completed"}
+    plan_request = completions.requests[0]
+    assert plan_request["stream"] and plan_request["stream_options"] == {"include_usage": True}
+    by_role = usage_tracker.summary(flow.run_id, group_by="call_role")
+    assert by_role["plan"].total_tokens == 340
+    assert usage_tracker.totals(flow.run_id).total_tokens >= 340
@@ -0,0 +1,47 @@
+import asyncio
+
+from app.agent.toolcall import ToolCallAgent
+from app.flow.planning import PlanningFlow
+from app.replay import RunRecorder, RunReplayer, replay_context
+from app.tool import Terminate, ToolCollection
+from conftest import tool_call
+
+
+STEPS = ["[SEARCH] Look up a", "[FILE] Save the report"]
+
+
+def run_flow(stub_llm, session):
+    plan = tool_call("planning", {"command": "create", "title": "Report", "steps": STEPS})
+    planner, _ = stub_llm([("", [plan]), ("summary", None)])
+    executor, executor_calls = stub_llm(
+        [("", [tool_call("terminate", {"status": "success"})])] * len(STEPS)
+    )
+    flow = PlanningFlow(
+        agents={
+            "executor": ToolCallAgent(
+                llm=executor, available_tools=ToolCollection(Terminate()), max_steps=2
+            )
+        },
+        llm=planner,
+        stream_plan=False,
+        step_cache=None,
+        plan_library=None,
+    )
+    with replay_context(session):
+        asyncio.run(flow.execute("write a report"))
+    return flow, executor_calls
+
+
+def test_planning_flow_replays_despite_a_new_plan_id(stub_llm, tmp_path):
+    path = tmp_path / "run.jsonl"
+    recorded, recorded_calls = run_flow(stub_llm, RunRecorder(path))
+    replayer = RunReplayer(path, strict=True)
+
+    replayed, replayed_calls = run_flow(stub_llm, replayer)
+
+    assert replayed.active_plan_id != recorded.active_plan_id
+    assert recorded_calls.requests and not replayed_calls.requests
+    assert replayer.divergences == []
+    assert replayer.remaining() == 0
+    plan = replayed.planning_tool.get_plan_data(replayed.active_plan_id)
+    assert set(plan["step_statuses"]) == {"completed"}
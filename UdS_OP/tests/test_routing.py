@@ -0,0 +1,119 @@
+import asyncio
+
+from app.agent.toolcall import ToolCallAgent
+from app.flow.planning import PlanningFlow
+from app.flow.routing import CapabilityRegistry, StepRouter, classify_step
+from app.tool import Terminate, ToolCollection
+from app.tool.base import BaseTool
+from conftest import tool_call
+
+
+def _registry() -> CapabilityRegistry:
+    registry = CapabilityRegistry()
+    registry.register("browser", ["browser_use", "web_search", "file_saver", "terminate"])
+    registry.register("coder", ["python_execute", "file_saver"])
+    registry.register("searcher", ["web_search"])
+    return registry
+
+
+def test_costs_come_from_the_tools_unless_given():
+    registry = _registry()
+    assert registry.profiles["browser"].cost == 11.5
+    assert "terminate" not in registry.profiles["browser"].tools
+    assert registry.register("cheap", ["browser_use"], cost=0.1).cost == 0.1
+
+
+def test_classify_by_tag_then_by_wording():
+    assert classify_step("anything", "code").tools == {"python_execute"}
+    assert classify_step("anything", "code").source == "tag"
+    assert classify_step("Calculate the average and save it to a file").tools == {
+        "python_execute",
+        "file_saver",
+    }
+    assert classify_step("Open https://example.com and click login").tools == {"browser_use"}
+    assert classify_step("Think it over").ambiguous
+
+
+def test_route_to_the_cheapest_capable_executor():
+    router = StepRouter(_registry())
+
+    async def route(text, step_type=None):
+        return await router.route(text, step_type)
+
+    assert asyncio.run(route("Search for recent papers")) == "searcher"
+    assert asyncio.run(route("Compute the totals")) == "coder"
+    assert asyncio.run(route("Browse the website")) == "browser"
+    assert asyncio.run(route("Plot the data", "browse")) == "browser"
+    # Nobody has both: the executor covering most needs, cheapest first
+    assert asyncio.run(route("Browse the website and compute statistics")) == "coder"
+    assert asyncio.run(route("Reflect on the results")) is None
+
+
+def test_ambiguous_steps_ask_the_llm_once(stub_llm):
+    llm, completions = stub_llm([("python_execute, made_up_tool", None)])
+    router = StepRouter(_registry(), llm=llm)
+
+    async def route_twice():
+        return [await router.route("Reflect on the results") for _ in range(2)]
+
+    assert asyncio.run(route_twice()) == ["coder", "coder"]
+    assert len(completions.requests) == 1
+
+
+def test_failed_llm_classification_leaves_the_step_unrouted(stub_llm, monkeypatch):
+    llm, _ = stub_llm()
+
+    async def fail(*args, **kwargs):
+        raise RuntimeError("unavailable")
+
+    monkeypatch.setattr(llm, "ask", fail)
+    router = StepRouter(_registry(), llm=llm)
+    assert asyncio.run(router.route("Reflect on the results")) is None
+
+
+def test_planning_flow_runs_each_step_on_its_routed_executor(stub_llm):
+    def tool(tool_name):
+        class Named(BaseTool):
+            name: str = tool_name
+            description: str = tool_name
+            parameters: dict = {"type": "object", "properties": {}}
+
+            async def execute(self) -> str:
+                return tool_name
+
+        return Named()
+
+    ran = []
+
+    class RecordingAgent(ToolCallAgent):
+        async def run(self, request=None) -> str:
+            ran.append(self.name)
+            return "done"
+
+    steps = ["Browse the website", "Compute the totals", "Search for reviews"]
+    plan = tool_call("planning", {"command": "create", "title": "T", "steps": steps})
+    planner, _ = stub_llm([("", [plan]), ("summary", None)])
+    executor_llm, _ = stub_llm()
+    agents = {
+        key: RecordingAgent(
+            name=key,
+            llm=executor_llm,
+            available_tools=ToolCollection(*(tool(name) for name in tools), Terminate()),
+        )
+        for key, tools in {
+            "browser": ["browser_use", "web_search"],
+            "coder": ["python_execute"],
+            "searcher": ["web_search"],
+        }.items()
+    }
+    flow = PlanningFlow(
+        agents=agents,
+        llm=planner,
+        route_steps=True,
+        step_cache=None,
+        plan_library=None,
+    )
+
+    asyncio.run(flow.execute("do it"))
+
+    assert ran == ["browser", "coder", "searcher"]
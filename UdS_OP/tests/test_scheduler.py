@@ -0,0 +1,199 @@
+import asyncio
+import json
+
+import pytest
+
+from app.agent.toolcall import ToolCallAgent
+from app.batch import BatchRunner, load_tasks
+from app.exceptions import FlowRejected
+from app.fair_share import FairResource, FlowTicket, scheduled_slot
+from app.flow.scheduler import FlowScheduler
+from app.tool import Terminate, ToolCollection
+from app.usage import usage_tracker
+from conftest import tool_call
+
+
+class GatedFlow:
+    """Flow that runs until its gate opens and records when it started."""
+
+    def __init__(self, name, started):
+        self.name = name
+        self.started = started
+        self.gate = asyncio.Event()
+
+    async def execute(self, request: str) -> str:
+        self.started.append(self.name)
+        await self.gate.wait()
+        return f"{self.name} done"
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_queued_flows_start_by_priority_when_a_slot_frees():
+    async def scenario():
+        scheduler = FlowScheduler(max_running=1, max_queued=4)
+        started = []
+        flows = {name: GatedFlow(name, started) for name in ("first", "low", "high")}
+        tasks = [
+            asyncio.create_task(scheduler.submit(flows["first"], "", name="first")),
+        ]
+        await _settle()
+        tasks.append(asyncio.create_task(scheduler.submit(flows["low"], "", priority=0)))
+        tasks.append(asyncio.create_task(scheduler.submit(flows["high"], "", priority=5)))
+        await _settle()
+        assert started == ["first"] and scheduler.queued == 2
+
+        for name in ("first", "high", "low"):
+            flows[name].gate.set()
+            await _settle()
+        results = await asyncio.gather(*tasks)
+        return started, results, scheduler.slo_report()
+
+    started, results, report = asyncio.run(scenario())
+    assert started == ["first", "high", "low"]
+    assert results == ["first done", "low done", "high done"]
+    assert report.finished == 3 and report.rejected == 0
+
+
+def test_full_queue_rejects_equal_priority_and_sheds_for_higher():
+    async def scenario():
+        scheduler = FlowScheduler(max_running=1, max_queued=1)
+        started = []
+        running, queued = GatedFlow("running", started), GatedFlow("queued", started)
+        first = asyncio.create_task(scheduler.submit(running, ""))
+        await _settle()
+        waiting = asyncio.create_task(scheduler.submit(queued, "", priority=0))
+        await _settle()
+
+        with pytest.raises(FlowRejected, match="already queued"):
+            await scheduler.submit(GatedFlow("equal", started), "", priority=0)
+
+        urgent = GatedFlow("urgent", started)
+        urgent_task = asyncio.create_task(scheduler.submit(urgent, "", priority=1))
+        await _settle()
+        with pytest.raises(FlowRejected, match="shed"):
+            await waiting
+
+        running.gate.set()
+        urgent.gate.set()
+        await asyncio.gather(first, urgent_task)
+        return started, scheduler.slo_report()
+
+    started, report = asyncio.run(scenario())
+    assert started == ["running", "urgent"]
+    assert report.rejected == 2
+
+
+def test_flow_is_refused_when_its_slo_cannot_be_met():
+    async def scenario():
+        scheduler = FlowScheduler(max_running=1)
+        scheduler._mean_run_time = 30.0
+        started = []
+        blocker = GatedFlow("blocker", started)
+        task = asyncio.create_task(scheduler.submit(blocker, ""))
+        await _settle()
+        with pytest.raises(FlowRejected, match="exceeds its SLO"):
+            await scheduler.submit(GatedFlow("hurried", started), "", slo=10)
+        blocker.gate.set()
+        await task
+
+    asyncio.run(scenario())
+
+
+def test_contended_slots_follow_the_weights():
+    async def scenario():
+        resource = FairResource("tool", capacity=1)
+        heavy, light = FlowTicket(name="heavy", weight=2), FlowTicket(name="light", weight=1)
+        grants = []
+
+        async def worker(ticket):
+            for _ in range(30):
+                async with resource.slot(ticket):
+                    grants.append(ticket.name)
+                    await asyncio.sleep(0.001)
+
+        await asyncio.gather(*(worker(t) for t in (heavy, heavy, light, light)))
+        return grants[:45]
+
+    grants = asyncio.run(scenario())
+    assert grants.count("heavy") > 1.5 * grants.count("light")
+
+
+def test_slots_are_only_taken_under_a_scheduler():
+    async def outside():
+        async with scheduled_slot("llm"):
+            return "free"
+
+    assert asyncio.run(outside()) == "free"
+
+
+def test_batch_tasks_run_through_the_scheduler(stub_llm, tmp_path):
+    tasks_file = tmp_path / "tasks.jsonl"
+    tasks_file.write_text(
+        "\n".join(
+            json.dumps({"id": f"t{i}", "prompt": f"task {i}", "priority": i, "slo": 60})
+            for i in range(4)
+        )
+    )
+    llm, _ = stub_llm([("", [tool_call("terminate", {"status": "success"})])] * 4)
+    scheduler = FlowScheduler(max_running=2)
+    runner = BatchRunner(
+        lambda: ToolCallAgent(llm=llm, available_tools=ToolCollection(Terminate()), max_steps=2),
+        tmp_path / "results.jsonl",
+        concurrency=4,
+        scheduler=scheduler,
+    )
+
+    tasks = load_tasks(tasks_file)
+    progress = asyncio.run(runner.run(tasks))
+
+    assert [task.priority for task in tasks] == [0, 1, 2, 3]
+    assert progress.succeeded == 4
+    report = scheduler.slo_report()
+    assert report.finished == 4 and report.with_slo == 4 and report.slo_met == 4
+    results = [json.loads(line) for line in (tmp_path / "results.jsonl").read_text().splitlines()]
+    # Usage is accounted to each task's run, not to a run of the scheduler's own
+    assert all(result["usage"]["prompt_tokens"] == 100 for result in results)
+    assert usage_tracker.totals(results[0]["run_id"]).calls == 1
+
+
+def test_cancelled_batch_records_tasks_still_queued(stub_llm, tmp_path):
+    llm, _ = stub_llm()
+    cleaned = []
+
+    class Agent(ToolCallAgent):
+        """Agent whose run never finishes on its own."""
+
+        async def run(self, request=None) -> str:
+            await asyncio.Event().wait()
+
+        async def cleanup(self):
+            cleaned.append(self.name)
+
+    runner = BatchRunner(
+        lambda: Agent(llm=llm),
+        tmp_path / "results.jsonl",
+        concurrency=2,
+        scheduler=FlowScheduler(max_running=1),
+    )
+    tasks = [{"id": "running", "prompt": "a"}, {"id": "queued", "prompt": "b"}]
+    (tmp_path / "tasks.jsonl").write_text("\n".join(json.dumps(task) for task in tasks))
+
+    async def scenario():
+        batch = asyncio.create_task(runner.run(load_tasks(tmp_path / "tasks.jsonl")))
+        await _settle()
+        runner.cancel("stop")
+        return await batch
+
+    progress = asyncio.run(scenario())
+
+    assert progress.cancelled == 2 and progress.failed == 0
+    results = [json.loads(line) for line in (tmp_path / "results.jsonl").read_text().splitlines()]
+    assert {result["id"]: result["status"] for result in results} == {
+        "running": "cancelled",
+        "queued": "cancelled",
+    }
+    assert len(cleaned) == 2
@@ -0,0 +1,79 @@
+import os
+import time
+
+from app.flow.step_cache import StepCache, step_dependencies
+
+
+def _key(step_text, dependency_outputs=()):
+    return StepCache.step_key("request", step_text, None, list(dependency_outputs))
+
+
+def test_step_results_are_served_until_their_inputs_change(tmp_path):
+    cache = StepCache(tmp_path)
+    first_output = StepCache.output_digest("result of step 0")
+    cache.put_step(_key("step 1", [first_output]), "step 1", "result of step 1")
+
+    assert cache.get_step(_key("step 1", [first_output])) == "result of step 1"
+    changed = StepCache.output_digest("another result of step 0")
+    assert cache.get_step(_key("step 1", [changed])) is None
+    assert cache.get_step(_key("step 1 reworded", [first_output])) is None
+
+
+def test_plans_are_kept_per_request(tmp_path):
+    cache = StepCache(tmp_path)
+    cache.put_plan("request", "Title", ["a", "b"])
+    assert cache.get_plan("request")["steps"] == ["a", "b"]
+    assert cache.get_plan("other request") is None
+
+
+def test_step_dependencies():
+    assert step_dependencies(0, "Start") == []
+    assert step_dependencies(3, "Continue") == [2]
+    assert step_dependencies(4, "Combine the results of steps 0 and 2") == [0, 2]
+    assert step_dependencies(2, "Use step 5") == [1]
+
+
+def test_expired_entries_are_misses_and_are_swept(tmp_path):
+    cache = StepCache(tmp_path, max_age=60)
+    cache.put_step("old", "step", "stale")
+    cache.put_step("new", "step", "fresh")
+    past = time.time() - 120
+    os.utime(tmp_path / "step-old.json", (past, past))
+
+    assert cache.sweep() == 1
+    assert cache.get_step("new") == "fresh"
+    assert not (tmp_path / "step-old.json").exists()
+
+    cache.max_age = 0
+    assert cache.get_step("new") is None
+
+
+def test_sweep_evicts_the_least_recently_used_beyond_max_entries(tmp_path):
+    cache = StepCache(tmp_path, max_entries=2)
+    for index, name in enumerate(("a", "b", "c")):
+        cache.put_step(name, name, name)
+        stamp = time.time() - 100 + index
+        os.utime(tmp_path / f"step-{name}.json", (stamp, stamp))
+    cache.get_step("a")  # used last
+
+    assert cache.sweep() == 1
+    assert cache.get_step("b") is None
+    assert cache.get_step("a") == "a" and cache.get_step("c") == "c"
+
+
+def test_writes_sweep_periodically(tmp_path, monkeypatch):
+    monkeypatch.setattr(StepCache, "SWEEP_EVERY", 5)
+    cache = StepCache(tmp_path, max_entries=3)
+    for index in range(11):
+        cache.put_step(f"k{index}", "step", "result")
+    # Sweeps after the 1st, 6th and 11th writes
+    assert len(list(tmp_path.glob("*.json"))) == 3
+
+
+def test_clear_deletes_every_entry(tmp_path):
+    cache = StepCache(tmp_path)
+    cache.put_step("k", "step", "result")
+    cache.put_plan("request", "Title", ["a"])
+    assert cache.clear() == 2
+    assert cache.get_step("k") is None and cache.get_plan("request") is None
+    assert StepCache(tmp_path / "missing").clear() == 0
@@ -0,0 +1,53 @@
+import json
+from collections import deque
+from types import SimpleNamespace
+
+from app.usage import UsageTracker, usage_context, usage_tracker
+
+
+def _usage(prompt_tokens=100, completion_tokens=10):
+    return SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+
+def test_totals_are_kept_per_run_and_for_the_process():
+    with usage_context(run_id="a"):
+        usage_tracker.record(model="m", usage=_usage())
+        usage_tracker.record(model="m", usage=_usage(), success=False)
+    with usage_context(run_id="b"):
+        usage_tracker.record(model="m", usage=_usage(50, 5))
+
+    run_a = usage_tracker.totals("a")
+    assert (run_a.calls, run_a.failed_calls, run_a.total_tokens) == (2, 1, 220)
+    assert usage_tracker.totals("b").total_tokens == 55
+    assert usage_tracker.totals().total_tokens == 275
+    assert usage_tracker.totals("unknown").calls == 0
+
+
+def test_records_in_memory_are_bounded_but_totals_are_not(monkeypatch):
+    monkeypatch.setattr(
+        usage_tracker, "records", deque(maxlen=3)
+    )
+    with usage_context(run_id="long"):
+        for _ in range(10):
+            usage_tracker.record(model="m", usage=_usage())
+
+    assert len(usage_tracker.get_records()) == 3
+    assert usage_tracker.totals("long").calls == 10
+    assert usage_tracker.totals().calls == 10
+
+
+def test_records_are_written_to_the_log_file(tmp_path):
+    log_file = tmp_path / "usage.jsonl"
+    usage_tracker.configure(log_file)
+    with usage_context(run_id="logged", agent="tester"):
+        for _ in range(5):
+            usage_tracker.record(model="m", usage=_usage())
+    usage_tracker.flush()
+
+    lines = [json.loads(line) for line in log_file.read_text().splitlines()]
+    assert len(lines) == 5
+    assert {line["agent"] for line in lines} == {"tester"}
+
+
+def test_tracker_is_a_singleton():
+    assert UsageTracker() is usage_tracker